@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Coste de arranque de las etapas en los dos modos de STAGE_EXECUTION (run_once_optimized.py):
+
+  - subprocess: cada etapa arranca un intérprete nuevo e importa su script y sus dependencias
+  - inprocess:  un solo intérprete importa los scripts uno tras otro; las dependencias
+                comunes (qdrant-client, llama-index, psycopg2...) solo se importan la primera vez
+
+No ejecuta las etapas (ni red ni claves): mide el tiempo hasta poder llamar a main(),
+que es lo que cada modo paga antes de empezar a trabajar.
+
+Uso: python benchmarks/bench_arranque.py [--repeticiones 3]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SCRIPTS = os.path.join(RAIZ, "scripts")
+sys.path.insert(0, SCRIPTS)
+
+from run_once_optimized import STAGES
+
+MODULOS = [os.path.splitext(stage.script)[0] for stage in STAGES]
+
+# Importa los módulos en orden y devuelve cuánto tardó cada uno (con lo ya importado en caché)
+CODIGO_EN_PROCESO = """
+import json, sys, time, importlib
+tiempos = {}
+for modulo in sys.argv[1:]:
+    inicio = time.perf_counter()
+    importlib.import_module(modulo)
+    tiempos[modulo] = time.perf_counter() - inicio
+print(json.dumps(tiempos))
+"""
+
+
+def ejecutar(argumentos):
+    inicio = time.perf_counter()
+    resultado = subprocess.run([sys.executable, *argumentos], cwd=SCRIPTS, capture_output=True, text=True)
+    if resultado.returncode != 0:
+        sys.exit(f"❌ Falló {' '.join(argumentos)}:\n{resultado.stderr}")
+    return time.perf_counter() - inicio, resultado.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se informa la mediana")
+    args = parser.parse_args()
+
+    por_subproceso = {modulo: [] for modulo in MODULOS}
+    en_proceso = {modulo: [] for modulo in MODULOS}
+    totales_en_proceso = []
+    for _ in range(args.repeticiones):
+        for modulo in MODULOS:
+            segundos, _ = ejecutar(["-c", f"import {modulo}"])
+            por_subproceso[modulo].append(segundos)
+        segundos, salida = ejecutar(["-c", CODIGO_EN_PROCESO, *MODULOS])
+        totales_en_proceso.append(segundos)
+        for modulo, t in json.loads(salida).items():
+            en_proceso[modulo].append(t)
+
+    print(f"\n{'etapa':<24} {'subprocess (s)':>15} {'inprocess (s)':>15}")
+    for modulo in MODULOS:
+        print(f"{modulo:<24} {statistics.median(por_subproceso[modulo]):>15.3f} {statistics.median(en_proceso[modulo]):>15.3f}")
+    total_subproceso = sum(statistics.median(v) for v in por_subproceso.values())
+    total_en_proceso = statistics.median(totales_en_proceso)
+    print(f"{'total':<24} {total_subproceso:>15.3f} {total_en_proceso:>15.3f}")
+    print("\nsubprocess: intérprete + importaciones por etapa; inprocess: importación incremental "
+          "(el total incluye un único arranque del intérprete).")
+
+
+if __name__ == "__main__":
+    main()
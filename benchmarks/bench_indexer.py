@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark de extremo a extremo de la indexación: PDF de FAQs -> Markdown -> Qdrant.
+
+Funciona sin red ni claves: usa el embedder local por hashing (EMBEDDING_PROVIDER=local)
+y Qdrant embebido en un directorio temporal (QDRANT_PATH), así que mide el coste propio
+del pipeline (parseo, troceado, caché, delta-sync y carga) y no la latencia de las APIs.
+
+Mide tres pasadas del indexador sobre las FAQs del PDF y `--paginas` páginas sintéticas:
+  - fría:     colección y caché de embeddings vacías
+  - sin cambios: segunda pasada idéntica (solo lectura de hashes)
+  - delta:    tras modificar un `--cambios` de las páginas
+
+Uso: python benchmarks/bench_indexer.py [--paginas 200] [--pdf data/faq_chesterton.pdf]
+"""
+
+import os
+import sys
+import io
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(RAIZ, "scripts"))
+
+PALABRAS = (
+    "comprar vender alquilar piso casa hipoteca notaría registro contrato arras tasación "
+    "impuestos plusvalía comunidad reforma certificado energético visita oferta reserva "
+    "escritura financiación banco inversión rentabilidad zona barrio precio metros"
+).split()
+
+
+def generar_pagina(rnd, i, parrafos):
+    """Página Markdown sintética con front-matter, encabezados y párrafos de longitud variable."""
+    partes = [f"---\nid: {i}\ntitle: \"Página {i}\"\nslug: pagina-{i}\n---\n\n# Página {i}\n"]
+    for p in range(parrafos):
+        if p % 4 == 0:
+            partes.append(f"## Apartado {p // 4 + 1}\n")
+        frase = " ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(40, 160)))
+        partes.append(frase.capitalize() + ".\n")
+    return "\n".join(partes)
+
+
+def escribir_paginas(carpeta, num_paginas, semilla=0):
+    os.makedirs(carpeta, exist_ok=True)
+    rnd = random.Random(semilla)
+    for i in range(num_paginas):
+        with open(os.path.join(carpeta, f"pagina-{i}.md"), "w", encoding="utf-8") as f:
+            f.write(generar_pagina(rnd, i, rnd.randint(2, 30)))
+
+
+def modificar_paginas(carpeta, proporcion, semilla=1):
+    rnd = random.Random(semilla)
+    rutas = sorted(os.listdir(carpeta))
+    elegidas = rnd.sample(rutas, max(1, int(len(rutas) * proporcion)))
+    for nombre in elegidas:
+        with open(os.path.join(carpeta, nombre), "a", encoding="utf-8") as f:
+            f.write("\nPárrafo añadido " + " ".join(rnd.choice(PALABRAS) for _ in range(30)) + ".\n")
+    return len(elegidas)
+
+
+def cronometrar(funcion, verbose):
+    salida = io.StringIO()
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else salida):
+        funcion()
+    return time.perf_counter() - inicio, salida.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=os.path.join(RAIZ, "data", "faq_chesterton.pdf"))
+    parser.add_argument("--paginas", type=int, default=200, help="Páginas sintéticas además de las FAQs")
+    parser.add_argument("--cambios", type=float, default=0.1, help="Proporción de páginas modificadas en la pasada delta")
+    parser.add_argument("--dimensiones", type=int, default=512)
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de los scripts")
+    args = parser.parse_args()
+
+    pdf = os.path.abspath(args.pdf)
+    with tempfile.TemporaryDirectory(prefix="bench_indexer_") as tmp:
+        # La configuración de los scripts se lee al importarlos: fijarla antes
+        os.environ.update({
+            "EMBEDDING_PROVIDER": "local",
+            "EMBEDDING_DIMENSIONS": str(args.dimensiones),
+            "QDRANT_PATH": os.path.join(tmp, "qdrant"),
+            "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embedding_cache.sqlite"),
+        })
+        os.chdir(tmp)
+
+        import faq_to_md
+        import chesterton_qdrant
+
+        resultados = []
+        t, _ = cronometrar(lambda: faq_to_md.extract_and_save_faqs(pdf, "faqs_markdown"), args.verbose)
+        num_faqs = len(os.listdir("faqs_markdown")) if os.path.isdir("faqs_markdown") else 0
+        resultados.append((f"PDF -> Markdown ({num_faqs} FAQs)", t))
+
+        t, _ = cronometrar(lambda: escribir_paginas(os.path.join("pages", "pages"), args.paginas), args.verbose)
+        resultados.append((f"Generar {args.paginas} páginas sintéticas", t))
+
+        t, salida = cronometrar(chesterton_qdrant.main, args.verbose)
+        resultados.append(("Indexación fría", t))
+        if "❌" in salida:
+            print(salida)
+            sys.exit(1)
+
+        t, _ = cronometrar(chesterton_qdrant.main, args.verbose)
+        resultados.append(("Indexación sin cambios", t))
+
+        modificadas = modificar_paginas(os.path.join("pages", "pages"), args.cambios)
+        t, _ = cronometrar(chesterton_qdrant.main, args.verbose)
+        resultados.append((f"Indexación delta ({modificadas} páginas)", t))
+
+        client = chesterton_qdrant.QdrantClient(path=os.environ["QDRANT_PATH"])
+        puntos = client.count(chesterton_qdrant.COLLECTION).count
+        client.close()
+        os.chdir(RAIZ)
+
+    print(f"\n{'etapa':<40} {'segundos':>10}")
+    for nombre, segundos in resultados:
+        print(f"{nombre:<40} {segundos:>10.3f}")
+    print(f"\nPuntos en la colección: {puntos}")
+
+
+if __name__ == "__main__":
+    main()
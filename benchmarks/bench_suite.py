@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks sin red ni servicios externos: rendimiento y pico de memoria de cada etapa
+sobre datos sintéticos, con resultados guardados para comparar entre ejecuciones.
+
+Casos:
+  xml_memoria_<tamaño>    procesar_xml_e_insertar con el feed entero en memoria
+  xml_streaming_<tamaño>  procesar_inmuebles + iterar_inmuebles_stream (el modo por defecto)
+  wp_fetch                fetch_wp_items de posts y pages contra el WordPress local (wp_local.py)
+  wp_markdown             convert_items (HTML -> Markdown) de esos mismos objetos
+  faq                     extract_and_save_faqs del PDF de FAQs (`--repeticiones` veces)
+  indexador               chesterton_qdrant.main en frío: FAQs + páginas sintéticas, embedder
+                          local por hashing y Qdrant embebido (QDRANT_PATH)
+  indexador_sin_cambios   segunda pasada idéntica del indexador (delta-sync sin cambios)
+
+Los feeds se generan con generar_feed.py (1k, 10k, 100k inmuebles con fotos, operaciones y
+superficies). Con DB_URL los casos xml escriben de verdad en tablas temporales de la sesión
+(pg_temp) y todo se revierte al final; sin DB_URL las filas se descartan y el caso mide solo
+descarga, parseo, extracción y hash (el resultado lo indica con "db": false).
+
+Cada caso se ejecuta en un subproceso propio, así que el pico de RSS (ru_maxrss) es el de ese
+caso y no arrastra memoria de los anteriores. Con --tracemalloc se mide además el pico de memoria
+de Python (más preciso, pero ralentiza el caso). El WordPress local corre en el proceso principal,
+fuera del medido, y sin límite de peticiones por segundo: se mide el cliente, no el TokenBucket.
+
+Uso:
+  python benchmarks/bench_suite.py [--tamanos 1k 10k 100k] [--casos xml_streaming faq ...]
+  python benchmarks/bench_suite.py --comparar benchmarks/results/ANTERIOR.json
+  python benchmarks/bench_suite.py --comparar benchmarks/results/A.json benchmarks/results/B.json
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BENCH)
+sys.path.insert(0, os.path.join(RAIZ, "scripts"))
+sys.path.insert(0, BENCH)
+
+RESULTADOS_DIR = os.path.join(BENCH, "results")
+PDF_FAQS = os.path.join(RAIZ, "data", "faq_chesterton.pdf")
+# Casos que se ejecutan una vez por tamaño de feed
+CASOS_POR_TAMANO = ("xml_memoria", "xml_streaming")
+# Por debajo de esta diferencia (MB) un cambio de memoria se considera ruido al comparar
+RUIDO_MEMORIA_MB = 10
+
+
+def pico_rss_mb():
+    """Pico de memoria residente del proceso hasta ahora, en MB."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+@contextlib.contextmanager
+def silencio():
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+def medir(funcion, usar_tracemalloc=False):
+    """Ejecuta `funcion()` sin mostrar su salida y devuelve (medición, resultado)."""
+    gc.collect()
+    rss_inicial = pico_rss_mb()
+    if usar_tracemalloc:
+        tracemalloc.start()
+    with silencio():
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+    pico_python = None
+    if usar_tracemalloc:
+        pico_python = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    pico = pico_rss_mb()
+    medicion = {
+        "segundos": round(segundos, 4),
+        "pico_rss_mb": round(pico, 1),
+        "incremento_rss_mb": round(pico - rss_inicial, 1),
+        "pico_python_mb": round(pico_python, 1) if pico_python is not None else None,
+    }
+    return medicion, resultado
+
+
+def resultado_caso(medicion, elementos, unidad, **extra):
+    por_segundo = elementos / medicion["segundos"] if medicion["segundos"] > 0 else None
+    return dict(medicion, elementos=elementos, unidad=unidad,
+                por_segundo=round(por_segundo, 1) if por_segundo is not None else None, **extra)
+
+
+# --- Casos (se ejecutan dentro del subproceso) ---
+
+class EscritorDescarte:
+    """Escritor de xml_to_db que no escribe nada: sin DB_URL el caso mide todo salvo la base de datos."""
+
+    def escribir(self, propiedad_data, propiedad_min_data, fotos):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+@contextlib.contextmanager
+def escritor_xml():
+    """(cursor, escritor) contra pg_temp si hay DB_URL (revirtiendo al salir), o (None, EscritorDescarte)."""
+    import xml_to_db
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        yield None, EscritorDescarte()
+        return
+    import psycopg2
+    conn = psycopg2.connect(db_url)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET search_path TO pg_temp;")
+        with silencio():
+            xml_to_db.crear_esquema_db(cursor, recrear=True)
+        yield cursor, xml_to_db.crear_escritor(cursor)
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+def caso_xml_memoria(config):
+    import xml_to_db
+    with open(config["feed"], "rb") as f:
+        xml_content = f.read()
+    with escritor_xml() as (cursor, escritor):
+        medicion, resumen = medir(lambda: xml_to_db.procesar_xml_e_insertar(cursor, xml_content, escritor=escritor),
+                                  config["tracemalloc"])
+    return resultado_caso(medicion, resumen["insertados"], "inmuebles", db=cursor is not None,
+                          mb_feed=round(len(xml_content) / 1e6, 1))
+
+
+def caso_xml_streaming(config):
+    import xml_to_db
+
+    def procesar():
+        with open(config["feed"], "rb") as f:
+            trozos = iter(lambda: f.read(xml_to_db.XML_CHUNK_SIZE), b"")
+            return xml_to_db.procesar_inmuebles(cursor, xml_to_db.iterar_inmuebles_stream(trozos), escritor=escritor)
+
+    with escritor_xml() as (cursor, escritor):
+        medicion, resumen = medir(procesar, config["tracemalloc"])
+    return resultado_caso(medicion, resumen["insertados"], "inmuebles", db=cursor is not None,
+                          mb_feed=round(os.path.getsize(config["feed"]) / 1e6, 1))
+
+
+def _wp_sin_limite():
+    import wp_chesterton
+    return wp_chesterton.TokenBucket(1e9, 1_000_000)
+
+
+def caso_wp_fetch(config):
+    import wp_chesterton
+    api_base = config["wp_url"].rstrip("/") + "/wp-json/wp/v2"
+    session = wp_chesterton.create_session()
+    rate_limiter = _wp_sin_limite()
+
+    def descargar():
+        return [wp_chesterton.fetch_wp_items(api_base, endpoint, session=session, rate_limiter=rate_limiter)
+                for endpoint in ("posts", "pages")]
+
+    medicion, listas = medir(descargar, config["tracemalloc"])
+    return resultado_caso(medicion, sum(len(items) for items in listas), "objetos")
+
+
+def caso_wp_markdown(config):
+    import wp_chesterton
+    from concurrent.futures import ProcessPoolExecutor
+    api_base = config["wp_url"].rstrip("/") + "/wp-json/wp/v2"
+    with silencio():
+        items = wp_chesterton.fetch_wp_items(api_base, "pages", rate_limiter=_wp_sin_limite())
+    carpeta = os.path.join(config["tmp"], "pages")
+    workers = wp_chesterton.WP_CONVERT_WORKERS
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        medicion, _ = medir(lambda: wp_chesterton.convert_items(items, carpeta, pool), config["tracemalloc"])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    # El pico de RSS es el del proceso principal; los procesos de conversión no se suman
+    return resultado_caso(medicion, len(items), "objetos", procesos=workers)
+
+
+def caso_faq(config):
+    import faq_to_md
+    carpeta = os.path.join(config["tmp"], "faqs_markdown")
+
+    def extraer():
+        for _ in range(config["repeticiones"]):
+            faq_to_md.extract_and_save_faqs(config["pdf"], carpeta)
+
+    medicion, _ = medir(extraer, config["tracemalloc"])
+    num_faqs = len(os.listdir(carpeta)) if os.path.isdir(carpeta) else 0
+    return resultado_caso(medicion, num_faqs * config["repeticiones"], "faqs", repeticiones=config["repeticiones"])
+
+
+def _preparar_indexador(config):
+    """Configura el indexador en local (se lee al importarlo) y deja FAQs y páginas en disco."""
+    tmp = config["tmp"]
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "local",
+        "EMBEDDING_DIMENSIONS": str(config["dimensiones"]),
+        "QDRANT_PATH": os.path.join(tmp, "qdrant"),
+        "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embedding_cache.sqlite"),
+        "SPARSE_IDF_PATH": os.path.join(tmp, "sparse_idf.json"),
+        "METRICS_DIR": os.path.join(tmp, "metrics"),
+        "INDEXER_SOURCE": "disk",
+    })
+    os.chdir(tmp)
+    import faq_to_md
+    from bench_indexer import escribir_paginas
+    with silencio():
+        faq_to_md.extract_and_save_faqs(config["pdf"], "faqs_markdown")
+    escribir_paginas(os.path.join("pages", "pages"), config["paginas"])
+    import chesterton_qdrant
+    return chesterton_qdrant
+
+
+def _resultado_indexador(medicion):
+    import metrics
+    contadores = metrics.registro("chesterton_qdrant").informe()["counters"]
+    documentos = sum(s["value"] for s in contadores.get("index_documents", []))
+    fragmentos = sum(s["value"] for s in contadores.get("index_chunks", []))
+    cargados = sum(s["value"] for s in contadores.get("qdrant_points_upserted", []))
+    return resultado_caso(medicion, documentos, "documentos", fragmentos=fragmentos, puntos_cargados=cargados)
+
+
+def caso_indexador(config):
+    chesterton_qdrant = _preparar_indexador(config)
+    medicion, _ = medir(chesterton_qdrant.main, config["tracemalloc"])
+    return _resultado_indexador(medicion)
+
+
+def caso_indexador_sin_cambios(config):
+    chesterton_qdrant = _preparar_indexador(config)
+    with silencio():
+        chesterton_qdrant.main()
+    medicion, _ = medir(chesterton_qdrant.main, config["tracemalloc"])
+    return _resultado_indexador(medicion)
+
+
+CASOS = {
+    "xml_memoria": caso_xml_memoria,
+    "xml_streaming": caso_xml_streaming,
+    "wp_fetch": caso_wp_fetch,
+    "wp_markdown": caso_wp_markdown,
+    "faq": caso_faq,
+    "indexador": caso_indexador,
+    "indexador_sin_cambios": caso_indexador_sin_cambios,
+}
+
+
+def ejecutar_caso_interno(nombre, config):
+    """Punto de entrada del subproceso: ejecuta un caso y escribe su resultado en config['salida']."""
+    resultado = CASOS[config["tipo"]](config)
+    resultado = dict({"caso": nombre}, **resultado)
+    with open(config["salida"], "w", encoding="utf-8") as f:
+        json.dump(resultado, f)
+
+
+# --- Orquestación (proceso principal) ---
+
+def ejecutar_en_subproceso(nombre, config, timeout):
+    salida = os.path.join(config["tmp"], "resultado.json")
+    os.makedirs(config["tmp"], exist_ok=True)
+    comando = [sys.executable, os.path.abspath(__file__), "--caso-interno", nombre,
+               "--config", json.dumps(dict(config, salida=salida))]
+    try:
+        proceso = subprocess.run(comando, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"caso": nombre, "error": f"tiempo límite de {timeout}s excedido"}
+    if proceso.returncode != 0 or not os.path.exists(salida):
+        detalle = (proceso.stderr or proceso.stdout).strip().splitlines()
+        return {"caso": nombre, "error": detalle[-1] if detalle else f"código {proceso.returncode}"}
+    with open(salida, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir_resultados(casos):
+    print(f"\n{'caso':<26} {'segundos':>10} {'elementos':>10} {'por segundo':>12} {'pico RSS MB':>12} {'+RSS MB':>9}")
+    for caso in casos:
+        if "error" in caso:
+            print(f"{caso['caso']:<26} ❌ {caso['error']}")
+            continue
+        por_segundo = f"{caso['por_segundo']:.0f}" if caso.get("por_segundo") is not None else "-"
+        print(f"{caso['caso']:<26} {caso['segundos']:>10.3f} {caso['elementos']:>10} {por_segundo:>12} "
+              f"{caso['pico_rss_mb']:>12.1f} {caso['incremento_rss_mb']:>9.1f}")
+
+
+def comparar(base, actual, umbral):
+    """
+    Compara dos ejecuciones caso a caso y devuelve la lista de regresiones: casos que van más de
+    `umbral` (proporción) más lentos o cuyo incremento de memoria crece más de `umbral` (y de
+    RUIDO_MEMORIA_MB).
+    """
+    casos_base = {caso["caso"]: caso for caso in base["casos"]}
+    print(f"\nComparando con {base.get('commit') or '?'} ({base.get('fecha', '?')}):")
+    if base.get("db") != actual.get("db"):
+        print("⚠️  Una ejecución escribió en PostgreSQL y la otra no: los casos xml no son comparables.")
+    if base.get("parametros", {}).get("tracemalloc") != actual.get("parametros", {}).get("tracemalloc"):
+        print("⚠️  Solo una de las ejecuciones usó --tracemalloc, que ralentiza todos los casos.")
+    print(f"{'caso':<26} {'s antes':>10} {'s ahora':>10} {'tiempo':>8} {'+RSS antes':>11} {'+RSS ahora':>11}")
+    regresiones = []
+    for caso in actual["casos"]:
+        anterior = casos_base.get(caso["caso"])
+        if anterior is None or "error" in anterior or "error" in caso:
+            print(f"{caso['caso']:<26} {'(sin comparación)':>10}")
+            continue
+        # Por elemento, por si el tamaño de la prueba ha cambiado entre ejecuciones
+        coste_antes = anterior["segundos"] / max(1, anterior["elementos"])
+        coste_ahora = caso["segundos"] / max(1, caso["elementos"])
+        cambio = coste_ahora / coste_antes - 1 if coste_antes > 0 else 0.0
+        memoria_antes, memoria_ahora = anterior["incremento_rss_mb"], caso["incremento_rss_mb"]
+        peor_tiempo = cambio > umbral
+        peor_memoria = (memoria_ahora - memoria_antes > RUIDO_MEMORIA_MB
+                        and memoria_ahora > memoria_antes * (1 + umbral))
+        marca = " ⚠️" if peor_tiempo or peor_memoria else ""
+        if marca:
+            regresiones.append(caso["caso"])
+        print(f"{caso['caso']:<26} {anterior['segundos']:>10.3f} {caso['segundos']:>10.3f} {cambio:>+8.0%} "
+              f"{memoria_antes:>11.1f} {memoria_ahora:>11.1f}{marca}")
+    return regresiones
+
+
+def cargar(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", nargs="+", default=["1k", "10k"], help="Tamaños de feed: 1k, 10k, 100k o un número")
+    parser.add_argument("--casos", nargs="+", default=list(CASOS), choices=list(CASOS))
+    parser.add_argument("--wp-items", type=int, default=500, help="Objetos por endpoint en el WordPress local")
+    parser.add_argument("--wp-latencia-ms", type=float, default=0, help="Latencia añadida por petición al WordPress local")
+    parser.add_argument("--paginas", type=int, default=200, help="Páginas sintéticas del indexador además de las FAQs")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Pasadas del caso faq")
+    parser.add_argument("--dimensiones", type=int, default=512)
+    parser.add_argument("--pdf", default=PDF_FAQS)
+    parser.add_argument("--tracemalloc", action="store_true", help="Medir también el pico de memoria de Python")
+    parser.add_argument("--timeout", type=int, default=3600, help="Segundos máximos por caso")
+    parser.add_argument("--salida", help=f"Archivo de resultados (por defecto, uno nuevo en {os.path.relpath(RESULTADOS_DIR)})")
+    parser.add_argument("--no-guardar", action="store_true")
+    parser.add_argument("--comparar", nargs="+", metavar="RESULTADOS.json",
+                        help="Comparar con una ejecución anterior (o dos archivos entre sí, sin ejecutar nada)")
+    parser.add_argument("--umbral", type=float, default=0.15, help="Empeoramiento a partir del cual se marca una regresión")
+    parser.add_argument("--caso-interno", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso_interno:
+        ejecutar_caso_interno(args.caso_interno, json.loads(args.config))
+        return
+
+    if args.comparar and len(args.comparar) > 2:
+        parser.error("--comparar admite uno o dos archivos")
+    if args.comparar and len(args.comparar) == 2:
+        regresiones = comparar(cargar(args.comparar[0]), cargar(args.comparar[1]), args.umbral)
+        sys.exit(1 if regresiones else 0)
+
+    from generar_feed import num_inmuebles, escribir_feed
+    from wp_local import ServidorWordPress, generar_items
+
+    if not os.getenv("DB_URL"):
+        print("DB_URL no configurada: los casos xml descartan las filas en lugar de escribirlas en PostgreSQL.")
+
+    casos = []
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as tmp, contextlib.ExitStack() as pila:
+        base = {"tracemalloc": args.tracemalloc, "pdf": os.path.abspath(args.pdf), "repeticiones": args.repeticiones,
+                "paginas": args.paginas, "dimensiones": args.dimensiones}
+        pendientes = []
+        for tipo in args.casos:
+            if tipo in CASOS_POR_TAMANO:
+                for tamano in args.tamanos:
+                    pendientes.append((f"{tipo}_{tamano}", dict(base, tipo=tipo, tamano=tamano)))
+            else:
+                pendientes.append((tipo, dict(base, tipo=tipo)))
+
+        feeds = {}
+        for nombre, config in pendientes:
+            tamano = config.get("tamano")
+            if not tamano:
+                continue
+            if tamano not in feeds:
+                feeds[tamano] = os.path.join(tmp, f"feed_{tamano}.xml")
+                print(f"Generando feed de {tamano} inmuebles...")
+                escribir_feed(feeds[tamano], num_inmuebles(tamano))
+            config["feed"] = feeds[tamano]
+
+        wp_url = None
+        if any(config["tipo"].startswith("wp_") for _, config in pendientes):
+            datos = {endpoint: generar_items(endpoint, args.wp_items) for endpoint in ("posts", "pages")}
+            wp_url = pila.enter_context(ServidorWordPress(datos, latencia_ms=args.wp_latencia_ms)).url
+
+        for nombre, config in pendientes:
+            print(f"▶️  {nombre}...")
+            casos.append(ejecutar_en_subproceso(nombre, dict(config, tmp=os.path.join(tmp, nombre), wp_url=wp_url), args.timeout))
+
+    ahora = datetime.now()
+    commit = commit_actual()
+    ejecucion = {
+        "fecha": ahora.isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "db": bool(os.getenv("DB_URL")),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("caso_interno", "config", "comparar", "salida", "no_guardar")},
+        "casos": casos,
+    }
+    imprimir_resultados(casos)
+
+    if not args.no_guardar:
+        salida = args.salida or os.path.join(RESULTADOS_DIR, f"{ahora:%Y%m%d-%H%M%S}{'_' + commit if commit else ''}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+        with open(salida, "w", encoding="utf-8") as f:
+            json.dump(ejecucion, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados guardados en {salida}")
+
+    regresiones = comparar(cargar(args.comparar[0]), ejecucion, args.umbral) if args.comparar else []
+    fallidos = [caso["caso"] for caso in casos if "error" in caso]
+    sys.exit(1 if regresiones or fallidos else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del coste por fila de los upserts de xml_to_db.py.
+
+Compara, sobre un feed sintético (10.000 inmuebles por defecto):
+  - compuesto_por_fila: el SQL se compone con psycopg2.sql en cada inmueble (comportamiento original)
+  - precompuesto:       el SQL se compone y renderiza una vez por ejecución
+  - preparado:          PREPARE una vez en el servidor y EXECUTE por inmueble
+  - lotes:              execute_values a tablas staging + merge por lotes (referencia)
+
+Sin DB_URL solo se mide la parte Python (composición de sentencias). Con DB_URL las
+tablas se crean en el esquema temporal de la sesión (pg_temp) y todo se revierte al
+final, así que no se toca ningún dato real.
+
+Uso: python benchmarks/bench_upsert_xml.py [--inmuebles 10000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import psycopg2  # noqa: E402
+
+import xml_to_db  # noqa: E402
+from xml_to_db import (  # noqa: E402
+    COLUMNAS_MIN, EscritorFilas, EscritorFilasPreparadas, CargadorLotes,
+    extraer_inmueble, calcular_hash_contenido, sql_upsert, crear_esquema_db, obtener_texto_safe,
+)
+from generar_feed import generar_feed_xml  # noqa: E402
+
+
+class EscritorComponiendoPorFila(EscritorFilas):
+    """
+    Reproduce el comportamiento original: compone el upsert de nuevo en cada fila. Las
+    características se sincronizan igual que en las demás variantes, para comparar solo el upsert.
+    """
+
+    def escribir(self, propiedad_data, propiedad_min_data, fotos):
+        self.cursor.execute(sql_upsert('propiedades', list(propiedad_data.keys())), propiedad_data)
+        self.cursor.execute(sql_upsert('propiedades_min', list(propiedad_min_data.keys())), propiedad_min_data)
+        self._anotar_caracteristicas(propiedad_data['referencia'])
+        if fotos is not None:
+            ref = propiedad_data['referencia']
+            self.cursor.execute("DELETE FROM fotos WHERE propiedad_referencia = %s;", (ref,))
+            for orden, url_foto in enumerate(fotos):
+                self.cursor.execute("INSERT INTO fotos (propiedad_referencia, url_foto, orden) VALUES (%s, %s, %s);", (ref, url_foto, orden))
+
+
+VARIANTES = {
+    "compuesto_por_fila": EscritorComponiendoPorFila,
+    "precompuesto": EscritorFilas,
+    "preparado": EscritorFilasPreparadas,
+    "lotes": CargadorLotes,
+}
+
+
+def preparar_filas(num_inmuebles):
+    """Extrae los inmuebles del feed sintético una sola vez, para medir solo la escritura."""
+    root = ET.fromstring(generar_feed_xml(num_inmuebles))
+    filas = []
+    for inmueble in root.findall('Inmueble'):
+        propiedad_data = extraer_inmueble(inmueble)
+        fotos = [obtener_texto_safe(f) for f in inmueble.find('Fotos').findall('Foto')]
+        propiedad_data['hash_contenido'] = calcular_hash_contenido(propiedad_data, fotos)
+        filas.append((propiedad_data, {c: propiedad_data[c] for c in COLUMNAS_MIN}, fotos))
+    return filas
+
+
+def medir_composicion(filas):
+    """Coste Python de componer los dos upserts por fila, frente a reutilizarlos."""
+    inicio = time.perf_counter()
+    for propiedad_data, propiedad_min_data, _ in filas:
+        sql_upsert('propiedades', list(propiedad_data.keys()))
+        sql_upsert('propiedades_min', list(propiedad_min_data.keys()))
+    return (time.perf_counter() - inicio) / len(filas)
+
+
+def medir_variante(conn, nombre, filas):
+    cursor = conn.cursor()
+    try:
+        # Todo en el esquema temporal de la sesión y dentro de una transacción que se revierte
+        cursor.execute("SET search_path TO pg_temp;")
+        crear_esquema_db(cursor, recrear=True)
+        escritor = VARIANTES[nombre](cursor)
+        inicio = time.perf_counter()
+        for propiedad_data, propiedad_min_data, fotos in filas:
+            escritor.escribir(propiedad_data, propiedad_min_data, fotos)
+        escritor.cerrar()
+        return (time.perf_counter() - inicio) / len(filas)
+    finally:
+        conn.rollback()
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inmuebles", type=int, default=10_000)
+    parser.add_argument("--variantes", nargs="+", default=list(VARIANTES), choices=list(VARIANTES))
+    args = parser.parse_args()
+
+    print(f"Generando y extrayendo un feed sintético de {args.inmuebles} inmuebles...")
+    filas = preparar_filas(args.inmuebles)
+
+    coste = medir_composicion(filas)
+    print(f"Composición del SQL por fila (Python): {coste * 1e6:.1f} µs/fila (0 µs si se precompone)")
+
+    db_url = os.getenv("DB_URL") or xml_to_db.DB_URL
+    if not db_url:
+        print("DB_URL no configurada: se omite la medición contra PostgreSQL.")
+        return
+
+    conn = psycopg2.connect(db_url)
+    try:
+        resultados = {nombre: medir_variante(conn, nombre, filas) for nombre in args.variantes}
+    finally:
+        conn.close()
+
+    base = resultados.get("compuesto_por_fila")
+    print(f"\n{'variante':<20} {'µs/fila':>10} {'filas/s':>10} {'vs original':>12}")
+    for nombre, segundos in resultados.items():
+        relativo = f"{base / segundos:.2f}x" if base else "-"
+        print(f"{nombre:<20} {segundos * 1e6:>10.1f} {1 / segundos:>10.0f} {relativo:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Generador de feeds sintéticos de Mobilia para benchmarks.
+Produce <Inmueble> con todas las etiquetas de la especificación de columnas de
+xml_to_db.py, incluidas fotos, operaciones y superficies, de forma determinista.
+"""
+
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from xml_to_db import COLUMNAS  # noqa: E402
+
+PALABRAS = (
+    "piso luminoso exterior reformado terraza vistas mar centro nave industrial local "
+    "comercial oficina diáfana ático dúplex chalet parcela jardín piscina garaje trastero "
+    "ascensor calefacción aire acondicionado cocina equipada armarios empotrados"
+).split()
+POBLACIONES = ["Madrid", "Marbella", "Málaga", "Valencia", "Alicante", "Barcelona", "Sevilla", "Estepona"]
+TIPOS_OPERACION = ["Venta", "Alquiler"]
+# Tamaños de referencia de la suite de benchmarks
+TAMANOS = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+# Etiquetas contenedoras con su estructura anidada; el resto se genera según el tipo de la columna
+ETIQUETAS_ANIDADAS = {"Operaciones", "Superficies", "Grupos", "Fotos360", "Videos", "Archivos"}
+
+
+def _texto(rnd, min_palabras, max_palabras):
+    return " ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(min_palabras, max_palabras)))
+
+
+def _valor(rnd, columna, i):
+    if columna.nombre == "id":
+        return str(i + 1)
+    if columna.nombre == "referencia":
+        return f"REF{i:07d}"
+    if columna.nombre == "latitud":
+        return f"{rnd.uniform(36.0, 43.5):.6f}".replace(".", ",")
+    if columna.nombre == "longitud":
+        return f"{rnd.uniform(-9.0, 3.0):.6f}".replace(".", ",")
+    if columna.nombre == "poblacion":
+        return rnd.choice(POBLACIONES)
+    if columna.nombre == "descripcion_ampliada":
+        return _texto(rnd, 80, 200)
+    if columna.nombre == "descripcion":
+        return _texto(rnd, 20, 60)
+    if columna.tipo == "BOOLEAN":
+        return rnd.choice("01")
+    if columna.tipo == "INTEGER":
+        return str(rnd.randint(0, 10))
+    if columna.tipo == "NUMERIC":
+        return f"{rnd.uniform(10, 2000):.2f}".replace(".", ",")
+    if columna.tipo.startswith("TIMESTAMP"):
+        fecha = datetime(2020, 1, 1) + timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60))
+        return fecha.strftime("%d-%m-%Y %H:%M:%S")
+    return _texto(rnd, 1, 6)
+
+
+def _anidado(rnd, etiqueta):
+    if etiqueta == "Operaciones":
+        ops = "".join(
+            f"<Operacion><Tipo>{tipo}</Tipo><Precio>{rnd.randint(50, 3000) * 1000 if tipo == 'Venta' else rnd.randint(5, 60) * 100}</Precio></Operacion>"
+            for tipo in rnd.sample(TIPOS_OPERACION, rnd.randint(1, 2))
+        )
+        return f"<Operaciones>{ops}</Operaciones>"
+    if etiqueta == "Superficies":
+        sups = "".join(
+            f"<Superficie><Nombre>{escape(_texto(rnd, 1, 2))}</Nombre><Superficie>{rnd.randint(5, 300)}</Superficie>"
+            f"<Altura>{rnd.randint(2, 8)}</Altura><Observaciones>{escape(_texto(rnd, 0, 5))}</Observaciones></Superficie>"
+            for _ in range(rnd.randint(0, 4))
+        )
+        return f"<Superficies>{sups}</Superficies>"
+    hijo = {"Grupos": "Grupo", "Fotos360": "Foto360", "Videos": "Video", "Archivos": "Archivo"}[etiqueta]
+    items = "".join(f"<{hijo}>https://example.com/{hijo.lower()}/{rnd.randint(1, 10**6)}</{hijo}>" for _ in range(rnd.randint(0, 2)))
+    return f"<{etiqueta}>{items}</{etiqueta}>"
+
+
+def generar_inmueble(i, fotos_por_inmueble=8, semilla=0):
+    """Devuelve los bytes de un <Inmueble> sintético. Mismo (i, semilla) -> mismo resultado."""
+    rnd = random.Random(semilla * 1_000_003 + i)
+    partes = ["<Inmueble>"]
+    for columna in COLUMNAS:
+        if not columna.etiqueta:
+            continue
+        if columna.etiqueta in ETIQUETAS_ANIDADAS:
+            partes.append(_anidado(rnd, columna.etiqueta))
+        else:
+            partes.append(f"<{columna.etiqueta}>{escape(_valor(rnd, columna, i))}</{columna.etiqueta}>")
+    fotos = "".join(
+        f"<Foto>https://example.com/fotos/REF{i:07d}/{n}.jpg</Foto>" for n in range(fotos_por_inmueble)
+    )
+    partes.append(f"<Fotos>{fotos}</Fotos>")
+    partes.append("</Inmueble>\n")
+    return "".join(partes).encode("utf-8")
+
+
+def iterar_feed_xml(num_inmuebles, fotos_por_inmueble=8, semilla=0):
+    """Genera el feed trozo a trozo (un inmueble por trozo) sin materializarlo entero en memoria."""
+    yield b'<?xml version="1.0" encoding="utf-8"?>\n<Inmuebles>\n'
+    for i in range(num_inmuebles):
+        yield generar_inmueble(i, fotos_por_inmueble, semilla)
+    yield b"</Inmuebles>\n"
+
+
+def generar_feed_xml(num_inmuebles, fotos_por_inmueble=8, semilla=0):
+    """Devuelve el feed completo como bytes."""
+    return b"".join(iterar_feed_xml(num_inmuebles, fotos_por_inmueble, semilla))
+
+
+def num_inmuebles(tamano):
+    """Número de inmuebles de un tamaño: '1k', '10k', '100k' o un entero."""
+    if tamano in TAMANOS:
+        return TAMANOS[tamano]
+    try:
+        return int(tamano)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Tamaño no válido: {tamano} (usa {', '.join(TAMANOS)} o un número)")
+
+
+def escribir_feed(ruta, num_inmuebles, fotos_por_inmueble=8, semilla=0):
+    """Escribe el feed en disco y devuelve su tamaño en bytes."""
+    tamano = 0
+    with open(ruta, "wb") as f:
+        for trozo in iterar_feed_xml(num_inmuebles, fotos_por_inmueble, semilla):
+            f.write(trozo)
+            tamano += len(trozo)
+    return tamano
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un feed XML sintético de Mobilia.")
+    parser.add_argument("num_inmuebles", type=num_inmuebles, help=f"Número de inmuebles o {', '.join(TAMANOS)}")
+    parser.add_argument("salida")
+    parser.add_argument("--fotos", type=int, default=8, help="Fotos por inmueble")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+    tamano = escribir_feed(args.salida, args.num_inmuebles, args.fotos, args.semilla)
+    print(f"Feed con {args.num_inmuebles} inmuebles escrito en {args.salida} ({tamano / 1e6:.1f} MB)")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita la API REST de WordPress (/wp-json/wp/v2/posts y /pages) con
+contenido sintético, para ejecutar wp_chesterton.py y los benchmarks sin red.
+
+Reproduce lo que usa el scraper:
+  - paginación con per_page (máx. 100) y page, cabeceras X-WP-Total y X-WP-TotalPages,
+    y 400 rest_post_invalid_page_number al pasar de la última página
+  - filtros _fields, include y modified_after
+  - ETag y respuesta 304 a If-None-Match
+  - latencia artificial opcional por petición
+
+Uso: python benchmarks/wp_local.py --items 500 --puerto 8080
+     WORDPRESS_SITE_URL=http://127.0.0.1:8080 python scripts/wp_chesterton.py
+"""
+
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+PREFIJO_API = "/wp-json/wp/v2/"
+MAX_PER_PAGE = 100
+
+PALABRAS = (
+    "inmobiliaria vivienda compra venta alquiler hipoteca notaría tasación reforma barrio "
+    "terraza piscina jardín inversión rentabilidad contrato arras escritura comunidad "
+    "certificado energético financiación oferta visita costa centro luminoso exterior"
+).split()
+
+
+def _frase(rnd, minimo, maximo):
+    return " ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(minimo, maximo))).capitalize() + "."
+
+
+def generar_html(rnd, bloques):
+    """HTML parecido al de un tema de WordPress: encabezados, párrafos con enlaces, listas, imágenes y tablas."""
+    partes = []
+    for b in range(bloques):
+        tipo = b % 5
+        if tipo == 0:
+            partes.append(f"<h2>{_frase(rnd, 2, 6)}</h2>")
+        elif tipo == 1:
+            partes.append(
+                f'<p>{_frase(rnd, 20, 80)} <a href="https://example.com/{rnd.randint(1, 999)}">{_frase(rnd, 1, 3)}</a> '
+                f"<strong>{_frase(rnd, 2, 5)}</strong> {_frase(rnd, 10, 40)}</p>"
+            )
+        elif tipo == 2:
+            items = "".join(f"<li>{_frase(rnd, 3, 12)}</li>" for _ in range(rnd.randint(2, 8)))
+            partes.append(f"<ul>{items}</ul>")
+        elif tipo == 3:
+            partes.append(
+                f'<figure class="wp-block-image"><img src="https://example.com/img/{rnd.randint(1, 10**6)}.jpg" '
+                f'alt="{_frase(rnd, 2, 5)}"/><figcaption>{_frase(rnd, 3, 8)}</figcaption></figure>'
+            )
+        else:
+            filas = "".join(
+                f"<tr><td>{_frase(rnd, 1, 3)}</td><td>{rnd.randint(50, 3000) * 1000} €</td></tr>"
+                for _ in range(rnd.randint(2, 5))
+            )
+            partes.append(f"<table><tbody>{filas}</tbody></table>")
+    return "\n".join(partes)
+
+
+def generar_items(endpoint, num_items, semilla=0):
+    """Objetos de WordPress sintéticos y deterministas (mismo endpoint, número y semilla -> mismos datos)."""
+    items = []
+    base = datetime(2022, 1, 1)
+    for i in range(num_items):
+        rnd = random.Random(f"{endpoint}-{semilla}-{i}")
+        fecha = base + timedelta(hours=rnd.randint(0, 3 * 365 * 24))
+        modificado = fecha + timedelta(hours=rnd.randint(0, 24 * 90))
+        slug = f"{endpoint[:-1]}-{i + 1}"
+        items.append({
+            "id": i + 1,
+            "slug": slug,
+            "date": fecha.strftime("%Y-%m-%dT%H:%M:%S"),
+            "modified": modificado.strftime("%Y-%m-%dT%H:%M:%S"),
+            "link": f"https://example.com/{slug}/",
+            "title": {"rendered": _frase(rnd, 3, 9)},
+            "content": {"rendered": generar_html(rnd, rnd.randint(3, 40))},
+        })
+    return items
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo=b"", cabeceras=None):
+        self.send_response(estado)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        if cuerpo:
+            self.wfile.write(cuerpo)
+
+    def _error(self, estado, codigo):
+        self._responder(estado, json.dumps({"code": codigo, "data": {"status": estado}}).encode(),
+                        {"Content-Type": "application/json; charset=UTF-8"})
+
+    def do_GET(self):
+        servidor = self.server
+        if servidor.latencia:
+            time.sleep(servidor.latencia)
+        url = urlparse(self.path)
+        if not url.path.startswith(PREFIJO_API):
+            return self._error(404, "rest_no_route")
+        endpoint = url.path[len(PREFIJO_API):].strip("/")
+        if endpoint not in servidor.datos:
+            return self._error(404, "rest_no_route")
+        consulta = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with servidor.lock:
+            servidor.peticiones += 1
+
+        items = servidor.datos[endpoint]
+        if "modified_after" in consulta:
+            items = [item for item in items if item["modified"] > consulta["modified_after"]]
+        if "include" in consulta:
+            ids = {int(i) for i in consulta["include"].split(",") if i.strip().isdigit()}
+            items = [item for item in items if item["id"] in ids]
+
+        try:
+            per_page = int(consulta.get("per_page", 10))
+            page = int(consulta.get("page", 1))
+        except ValueError:
+            return self._error(400, "rest_invalid_param")
+        if not 1 <= per_page <= MAX_PER_PAGE or page < 1:
+            return self._error(400, "rest_invalid_param")
+        total_paginas = max(1, math.ceil(len(items) / per_page))
+        if page > total_paginas:
+            return self._error(400, "rest_post_invalid_page_number")
+
+        pagina = items[(page - 1) * per_page:page * per_page]
+        if "_fields" in consulta:
+            campos = consulta["_fields"].split(",")
+            pagina = [{c: item[c] for c in campos if c in item} for item in pagina]
+        cuerpo = json.dumps(pagina).encode("utf-8")
+        etag = '"' + hashlib.md5(cuerpo).hexdigest() + '"'
+        cabeceras = {
+            "Content-Type": "application/json; charset=UTF-8",
+            "X-WP-Total": str(len(items)),
+            "X-WP-TotalPages": str(total_paginas),
+            "ETag": etag,
+        }
+        if self.headers.get("If-None-Match") == etag:
+            return self._responder(304, cabeceras={"ETag": etag})
+        self._responder(200, cuerpo, cabeceras)
+
+
+class ServidorWordPress(ThreadingHTTPServer):
+    """
+    Servidor en un hilo propio. `datos` es {endpoint: [objetos]} y se puede modificar entre
+    peticiones; `peticiones` cuenta las recibidas. Se usa como gestor de contexto.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, datos, puerto=0, latencia_ms=0):
+        super().__init__(("127.0.0.1", puerto), _Manejador)
+        self.datos = datos
+        self.latencia = latencia_ms / 1000
+        self.peticiones = 0
+        self.lock = threading.Lock()
+        self.hilo = None
+
+    @property
+    def url(self):
+        """Valor para WORDPRESS_SITE_URL."""
+        return f"http://127.0.0.1:{self.server_port}"
+
+    @property
+    def api_base(self):
+        return self.url + PREFIJO_API.rstrip("/")
+
+    def __enter__(self):
+        self.hilo = threading.Thread(target=self.serve_forever, name="wp-local", daemon=True)
+        self.hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500, help="Objetos por endpoint")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--latencia-ms", type=float, default=0, help="Latencia añadida a cada petición")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    datos = {endpoint: generar_items(endpoint, args.items, args.semilla) for endpoint in ("posts", "pages")}
+    with ServidorWordPress(datos, args.puerto, args.latencia_ms) as servidor:
+        print(f"WordPress local en {servidor.url} ({args.items} posts y {args.items} páginas). Ctrl+C para terminar.")
+        try:
+            servidor.hilo.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ Ejecuta el microservicio en modo único.
 
 import os
 import sys
-import subprocess
+import runpy
 import logging
 
 # Configurar logging
@@ -23,12 +23,13 @@ def main():
     logger.info("🚀 Iniciando Microservicio Chesterton")
     logger.info("📋 Modo: Ejecución única optimizada")
     
-    # Ejecutar el script optimizado
+    # Ejecutar el script optimizado en este mismo intérprete (sin un subproceso intermedio);
+    # su sys.exit() termina el proceso con el código de la ejecución
     script_path = "scripts/run_once_optimized.py"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
     
     try:
-        result = subprocess.run([sys.executable, script_path])
-        sys.exit(result.returncode)
+        runpy.run_path(script_path, run_name="__main__")
         
     except Exception as e:
         logger.error(f"❌ Error ejecutando {script_path}: {e}")
@@ -0,0 +1,21 @@
+import os
+import uuid
+
+
+def write_atomic(path, text):
+    """
+    Escribe `text` en `path` a través de un fichero temporal en el mismo directorio y un
+    rename, así que quien lea nunca ve un fichero a medias. El temporal se crea con open(),
+    de modo que el fichero final tiene los permisos que marca la umask del proceso.
+    """
+    directory, name = os.path.split(path)
+    # Nombre único por escritura: varios hilos o procesos pueden escribir el mismo fichero a la vez
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp_path, "x", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
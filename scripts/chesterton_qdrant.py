@@ -2,15 +2,31 @@ import os
 import yaml
 import glob
 import uuid
+import json
+import time
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 # llama-index imports
 from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
 from llama_index.embeddings.openai import OpenAIEmbedding
 
+from embedding_cache import EmbeddingCache, text_hash
+from embedding_scheduler import EmbeddingScheduler
+import metrics
+from sparse_bm25 import document_vector, IDFTable
+from chunking import chunk_markdown, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
 # qdrant imports
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import VectorParams, Distance, PointStruct
+from qdrant_client.local.qdrant_local import QdrantLocal
+from qdrant_client.http.models import (
+    VectorParams, VectorParamsDiff, Distance, PointStruct, PointIdsList, HnswConfigDiff, Disabled,
+    SparseVectorParams, SparseVector,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig,
+)
 
 # Cargar variables de entorno
 load_dotenv()
@@ -21,16 +37,57 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Qdrant embebido en disco (modo local de qdrant-client); QDRANT_URL=":memory:" lo deja en memoria
+QDRANT_PATH = os.getenv("QDRANT_PATH")
 COLLECTION = os.getenv("QDRANT_COLLECTION", "chesterton")
+# Colección auxiliar con un punto de control por colección indexada (versión del índice e IDF),
+# para no mezclar puntos que no son documentos con los resultados de búsqueda
+META_COLLECTION = os.getenv("QDRANT_META_COLLECTION", "chesterton_meta")
 
 # Configuración del modelo de embeddings
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
 
-# Límite de caracteres conservador
+# Límite de caracteres conservador (salvaguarda: los fragmentos ya quedan muy por debajo)
 MAX_CHARS_LIMIT = 24000
 
+# Carga en Qdrant: puntos por petición, peticiones en paralelo y reintentos por lote
+QDRANT_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", "64"))
+QDRANT_PARALLEL = int(os.getenv("QDRANT_PARALLEL", "4"))
+QDRANT_MAX_RETRIES = int(os.getenv("QDRANT_MAX_RETRIES", "3"))
+# Usar gRPC si el clúster lo expone (si no responde se usa REST)
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() in ("1", "true", "yes")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+
+# Opciones de la colección: cuantización ("scalar" = int8, "binary", "none" para desactivarla;
+# vacío = no tocar), vectores en disco y parámetros del grafo HNSW (vacío = valores de Qdrant)
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "").lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() in ("1", "true", "yes")
+QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "").lower()
+QDRANT_HNSW_M = os.getenv("QDRANT_HNSW_M")
+QDRANT_HNSW_EF_CONSTRUCT = os.getenv("QDRANT_HNSW_EF_CONSTRUCT")
+
+# Vector disperso BM25 (búsqueda híbrida) y tabla IDF del corpus para ponderar las consultas
+SPARSE_VECTORS = os.getenv("SPARSE_VECTORS", "true").lower() in ("1", "true", "yes")
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+SPARSE_IDF_PATH = os.getenv("SPARSE_IDF_PATH", "output/sparse_idf.json")
+
+# Caché persistente de embeddings (se guarda en el volumen output/ por defecto)
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "output/embedding_cache.sqlite")
+# Borrar de la caché las entradas que ya no corresponden a ningún documento
+EMBEDDING_CACHE_EVICT = os.getenv("EMBEDDING_CACHE_EVICT", "true").lower() in ("1", "true", "yes")
+
+# Origen de los documentos: "disk" (los Markdown que escriben faq_to_md.py y wp_chesterton.py)
+# o "pipeline" (los extractores se ejecutan aquí y sus registros llegan en memoria, sin disco)
+INDEXER_SOURCE = os.getenv("INDEXER_SOURCE", "disk").lower()
+# Modo pipeline: registros en cola como máximo, fragmentos por lote de embeddings y carga,
+# y si los extractores escriben también los Markdown (solo para depurar)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "256"))
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "256"))
+PIPELINE_WRITE_MARKDOWN = os.getenv("PIPELINE_WRITE_MARKDOWN", "false").lower() in ("1", "true", "yes")
+
 # Configurar las API keys
 if GOOGLE_API_KEY:
     os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
@@ -38,7 +95,7 @@ if OPENAI_API_KEY:
     os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
 # --- 2) FUNCIONES AUXILIARES ---
-# ... (funciones get_embedder, truncate_vector, parse_md_file sin cambios)
+# ... (funciones get_embedder, postprocess_vectors, parse_md_file)
 def get_embedder():
     """Crea y retorna el embedder configurado."""
     if EMBEDDING_PROVIDER == "google":
@@ -52,15 +109,222 @@ def get_embedder():
             raise ValueError("OPENAI_API_KEY no está configurada")
         print(f"🔧 Usando OpenAI Embeddings con modelo: {EMBEDDING_MODEL}")
         return OpenAIEmbedding(model=EMBEDDING_MODEL)
+
+    elif EMBEDDING_PROVIDER == "local":
+        # Sin red ni API key: embeddings deterministas por hashing (pruebas y benchmarks)
+        from local_embedding import HashingEmbedding
+        print(f"🔧 Usando embeddings locales por hashing ({EMBEDDING_DIMENSIONS} dimensiones)")
+        return HashingEmbedding(dimensions=EMBEDDING_DIMENSIONS)
     
     else:
         raise ValueError(f"Proveedor de embeddings no soportado: {EMBEDDING_PROVIDER}")
 
-def truncate_vector(vector, target_dimensions):
-    """Trunca un vector a las dimensiones especificadas."""
-    if len(vector) <= target_dimensions:
-        return vector
-    return vector[:target_dimensions]
+def postprocess_vectors(vectors, target_dimensions):
+    """
+    Trunca un lote de vectores a `target_dimensions` (modelos Matryoshka: las primeras
+    componentes son las más informativas) y los renormaliza a norma L2 = 1, todo en una
+    operación vectorizada. Devuelve una matriz float32 de (n, target_dimensions).
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2:
+        return np.empty((0, target_dimensions), dtype=np.float32)
+    matrix = matrix[:, :target_dimensions]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+def quantization_config():
+    """Configuración de cuantización según QDRANT_QUANTIZATION (None = no indicada)."""
+    if QDRANT_QUANTIZATION == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM))
+    if QDRANT_QUANTIZATION == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM))
+    if QDRANT_QUANTIZATION == "none":
+        return Disabled.DISABLED
+    if QDRANT_QUANTIZATION:
+        raise ValueError(f"QDRANT_QUANTIZATION no soportado: {QDRANT_QUANTIZATION} (usa scalar, binary o none)")
+    return None
+
+def hnsw_config():
+    """Parámetros HNSW indicados por entorno, o None si no se ha indicado ninguno."""
+    if not QDRANT_HNSW_M and not QDRANT_HNSW_EF_CONSTRUCT:
+        return None
+    return HnswConfigDiff(
+        m=int(QDRANT_HNSW_M) if QDRANT_HNSW_M else None,
+        ef_construct=int(QDRANT_HNSW_EF_CONSTRUCT) if QDRANT_HNSW_EF_CONSTRUCT else None,
+    )
+
+def collection_kwargs():
+    """Argumentos de create_collection para la colección de documentos."""
+    quantization = quantization_config()
+    return {
+        "vectors_config": VectorParams(
+            size=EMBEDDING_DIMENSIONS,
+            distance=Distance.COSINE,
+            on_disk=QDRANT_ON_DISK in ("1", "true", "yes") if QDRANT_ON_DISK else None,
+        ),
+        "hnsw_config": hnsw_config(),
+        "quantization_config": None if quantization is Disabled.DISABLED else quantization,
+        "sparse_vectors_config": {SPARSE_VECTOR_NAME: SparseVectorParams()} if SPARSE_VECTORS else None,
+    }
+
+def ensure_collection(client, collection, **kwargs):
+    """
+    Crea la colección si no existe (un 409 se considera correcto) y, si ya existía, le
+    aplica las opciones de entorno. Devuelve True si se ha creado.
+    """
+    try:
+        client.create_collection(collection_name=collection, **kwargs)
+        print(f"✅ Colección '{collection}' creada con éxito.")
+        return True
+    except Exception as e:
+        raw = getattr(e, "body", None) or str(e)
+        msg = raw.decode("utf-8", "ignore") if isinstance(raw, (bytes, bytearray)) else str(raw)
+        msg = msg.lower()
+        if getattr(e, "status_code", None) == 409 or "already exists" in msg or "conflict" in msg:
+            print(f"👍 La colección '{collection}' ya existía. OK.")
+            apply_collection_options(client, collection)
+            return False
+        print(f"❌ Error al comprobar la colección: {e}")
+        raise
+
+def collection_option_changes(config):
+    """
+    Opciones de entorno (cuantización, disco y HNSW) que difieren de `config`, la configuración
+    actual de la colección, como argumentos de update_collection. Vacío si ya coincide todo.
+    """
+    changes = {}
+    if QDRANT_ON_DISK:
+        on_disk = QDRANT_ON_DISK in ("1", "true", "yes")
+        vectors = config.params.vectors
+        vectors = vectors.get("") if isinstance(vectors, dict) else vectors
+        if bool(getattr(vectors, "on_disk", None)) != on_disk:
+            changes["vectors_config"] = {"": VectorParamsDiff(on_disk=on_disk)}
+    hnsw = hnsw_config()
+    if hnsw and any(value is not None and getattr(config.hnsw_config, field) != value for field, value in hnsw):
+        changes["hnsw_config"] = hnsw
+    quantization = quantization_config()
+    if quantization is Disabled.DISABLED:
+        if config.quantization_config is not None:
+            changes["quantization_config"] = quantization
+    elif quantization and config.quantization_config != quantization:
+        changes["quantization_config"] = quantization
+    return changes
+
+def apply_collection_options(client, collection):
+    """
+    Aplica a una colección ya existente las opciones de cuantización, disco y HNSW
+    indicadas por entorno, solo si difieren de las actuales: cada cambio hace que Qdrant
+    reconstruya los índices en segundo plano.
+    """
+    if is_local_client(client):
+        # El modo local no usa HNSW ni cuantización: no hay nada que aplicar
+        return
+    changes = collection_option_changes(client.get_collection(collection).config)
+    if changes:
+        client.update_collection(collection_name=collection, **changes)
+        print(f"⚙️  Opciones de la colección '{collection}' actualizadas: {', '.join(changes)}.")
+
+def ensure_sparse_vectors(client, collection):
+    """
+    Comprueba que la colección tiene el vector disperso (y si no, intenta añadirlo).
+    Devuelve False si no se puede: entonces solo se indexa el vector denso.
+    """
+    if not SPARSE_VECTORS:
+        return False
+    def configured():
+        return SPARSE_VECTOR_NAME in (client.get_collection(collection).config.params.sparse_vectors or {})
+    if configured():
+        return True
+    try:
+        client.update_collection(collection_name=collection, sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams()})
+    except Exception as e:
+        print(f"⚠️  No se pudo añadir el vector disperso: {e}")
+    if configured():
+        print(f"⚙️  Vector disperso '{SPARSE_VECTOR_NAME}' añadido a la colección '{collection}'.")
+        return True
+    print(f"⚠️  La colección '{collection}' no tiene el vector disperso '{SPARSE_VECTOR_NAME}'; se indexa solo el denso. Recréala para activar la búsqueda híbrida.")
+    return False
+
+def get_qdrant_client():
+    """
+    Crea el cliente de Qdrant, por gRPC si está disponible y por REST en otro caso.
+    Con QDRANT_PATH o QDRANT_URL=":memory:" usa el modo local de qdrant-client, sin servidor.
+    """
+    if QDRANT_PATH:
+        print(f"🔌 Usando Qdrant local en '{QDRANT_PATH}'.")
+        return QdrantClient(path=QDRANT_PATH)
+    if QDRANT_URL == ":memory:":
+        print("🔌 Usando Qdrant local en memoria.")
+        return QdrantClient(":memory:")
+    if QDRANT_PREFER_GRPC:
+        grpc_kwargs = dict(url=QDRANT_URL, api_key=QDRANT_API_KEY, prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT)
+        # Timeout corto solo para la comprobación: el cliente que se devuelve usa el normal
+        sonda = None
+        try:
+            sonda = QdrantClient(**grpc_kwargs, timeout=10)
+            sonda.get_collections()
+        except Exception as e:
+            print(f"⚠️  gRPC no disponible ({e.__class__.__name__}); usando REST.")
+        else:
+            print(f"🔌 Conectado a Qdrant por gRPC (puerto {QDRANT_GRPC_PORT}).")
+            return QdrantClient(**grpc_kwargs)
+        finally:
+            if sonda is not None:
+                sonda.close()
+    return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+def is_local_client(client):
+    """True si el cliente es el modo local de qdrant-client (QDRANT_PATH o ":memory:"), sin servidor."""
+    return isinstance(getattr(client, "_client", None), QdrantLocal)
+
+def upsert_points_batched(client, collection, points, batch_size=QDRANT_BATCH_SIZE, parallel=QDRANT_PARALLEL, max_retries=QDRANT_MAX_RETRIES):
+    """
+    Sube los puntos en lotes de `batch_size`, con hasta `parallel` peticiones simultáneas.
+    Cada lote se reintenta por separado con espera exponencial, así que un fallo puntual
+    no obliga a repetir toda la carga. Lanza una excepción si algún lote agota sus reintentos.
+    """
+    if is_local_client(client):
+        # El modo local no protege sus estructuras con locks: los upserts concurrentes se pisan
+        parallel = 1
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+
+    def upload(batch):
+        for attempt in range(max_retries):
+            attempt_start = time.perf_counter()
+            try:
+                client.upsert(collection_name=collection, points=batch, wait=True)
+                metrics.observar("qdrant_upsert_seconds", time.perf_counter() - attempt_start, collection=collection, resultado="ok")
+                return len(batch)
+            except Exception as e:
+                metrics.observar("qdrant_upsert_seconds", time.perf_counter() - attempt_start, collection=collection, resultado="error")
+                if attempt == max_retries - 1:
+                    metrics.incrementar("qdrant_upsert_failed_batches", collection=collection)
+                    raise
+                metrics.incrementar("qdrant_upsert_retries", collection=collection)
+                delay = 2 ** attempt
+                print(f"⚠️  Lote de {len(batch)} puntos falló (intento {attempt + 1}/{max_retries}): {e}. Reintentando en {delay}s...")
+                time.sleep(delay)
+
+    start = time.perf_counter()
+    uploaded = 0
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        upload = metrics.vincular(upload)
+        futures = [executor.submit(upload, batch) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                uploaded += future.result()
+            except Exception as e:
+                errors.append(e)
+
+    elapsed = time.perf_counter() - start
+    metrics.incrementar("qdrant_points_upserted", uploaded, collection=collection)
+    rate = uploaded / elapsed if elapsed > 0 else float("inf")
+    print(f"📈 {uploaded} puntos en {len(batches)} lotes en {elapsed:.1f}s ({rate:.0f} puntos/s).")
+    if errors:
+        raise RuntimeError(f"{len(errors)} de {len(batches)} lotes fallaron tras {max_retries} intentos: {errors[0]}") from errors[0]
+    return uploaded
 
 def parse_md_file(path):
     """Parsea un archivo Markdown con front-matter YAML."""
@@ -85,85 +349,328 @@ def parse_md_file(path):
     meta["source_path"] = path
     return content, meta
 
+def embed_documents(embedder, texts, cache=None):
+    """
+    Devuelve los vectores (truncados a EMBEDDING_DIMENSIONS y normalizados) de `texts`, en orden.
+    Con `cache` solo se envían al proveedor los textos que no estén ya en la caché.
+    Los textos cuyo lote agotó los reintentos quedan como None.
+    """
+    hashes = [text_hash(t) for t in texts]
+    vectors = cache.get_many(hashes) if cache else {}
+
+    pending = {}
+    for h, text in zip(hashes, texts):
+        if h not in vectors:
+            pending.setdefault(h, text)
+
+    metrics.incrementar("embedding_cache_hits", len(vectors))
+    metrics.incrementar("embedding_cache_misses", len(pending))
+    if cache:
+        print(f"🗃️  Caché de embeddings: {cache.hits} aciertos, {cache.misses} fallos ({cache.hit_rate:.0%} de aciertos)")
+
+    if pending:
+        print(f"🧠 Generando embeddings para {len(pending)} fragmentos...")
+        scheduler = EmbeddingScheduler(embedder, EMBEDDING_PROVIDER)
+        new_embeddings = scheduler.embed(pending.values())
+        embedded = [(h, emb) for h, emb in zip(pending, new_embeddings) if emb is not None]
+        matrix = postprocess_vectors([emb for _, emb in embedded], EMBEDDING_DIMENSIONS)
+        new_vectors = {h: row for (h, _), row in zip(embedded, matrix.tolist())}
+        vectors.update(new_vectors)
+        if cache and new_vectors:
+            cache.put_many(new_vectors)
+    else:
+        print("🧠 Todos los embeddings estaban en caché; no se llama a la API.")
+
+    return [vectors.get(h) for h in hashes]
+
+def content_hash(text, payload, sparse=False):
+    """
+    Huella del punto tal y como se indexaría: configuración de embeddings, texto
+    embebido, payload y si lleva vector disperso. Si no cambia, el punto guardado en
+    Qdrant sigue siendo válido.
+    """
+    data = json.dumps(
+        [EMBEDDING_PROVIDER, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text, payload] + ([SPARSE_VECTOR_NAME] if sparse else []),
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def fetch_existing_hashes(client, collection, page_size=1000, owner_field="metadata.source_path"):
+    """
+    Recorre la colección sin vectores y con solo los campos de control del payload.
+    Devuelve {id: (content_hash, owner)}, donde `owner` es el valor de `owner_field`
+    (el campo que identifica el origen del punto; None en puntos ajenos al indexador).
+    """
+    existing = {}
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection,
+            limit=page_size,
+            offset=offset,
+            with_payload=["content_hash", owner_field],
+            with_vectors=False,
+        )
+        for record in records:
+            payload = record.payload or {}
+            owner = payload
+            for key in owner_field.split("."):
+                owner = owner.get(key) if isinstance(owner, dict) else None
+            existing[str(record.id)] = (payload.get("content_hash"), owner)
+        if offset is None:
+            return existing
+
+# Punto de control con la versión del índice, en META_COLLECTION: el módulo de búsqueda la
+# consulta para invalidar su caché cuando el indexador termina una ejecución con cambios
+def index_marker_id(collection):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"chesterton:index-version:{collection}"))
+
+# Versiones anteriores guardaban el punto de control dentro de la colección de búsqueda
+LEGACY_INDEX_MARKER_ID = str(uuid.uuid5(uuid.NAMESPACE_URL, "chesterton:index-version"))
+
+def ensure_meta_collection(client):
+    """Crea META_COLLECTION si no existe: un vector de dimensión 1, solo para poder guardar puntos."""
+    if META_COLLECTION not in {c.name for c in client.get_collections().collections}:
+        client.create_collection(collection_name=META_COLLECTION, vectors_config=VectorParams(size=1, distance=Distance.COSINE))
+
+def read_index_marker(client, collection, fields=True):
+    """Payload del punto de control de `collection` (solo `fields` si es una lista), o None si no hay."""
+    if META_COLLECTION not in {c.name for c in client.get_collections().collections}:
+        return None
+    records = client.retrieve(META_COLLECTION, ids=[index_marker_id(collection)], with_payload=fields, with_vectors=False)
+    return (records[0].payload or {}) if records else None
+
+def write_index_marker(client, collection, extra=None):
+    """
+    Escribe (o renueva) el punto de control de `collection` con una versión nueva del índice.
+    `extra` se añade al payload (p. ej. la tabla IDF que necesita la búsqueda híbrida).
+    """
+    ensure_meta_collection(client)
+    version = uuid.uuid4().hex
+    payload = {"collection": collection, "version": version, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **(extra or {})}
+    point = PointStruct(id=index_marker_id(collection), vector=[1.0], payload=payload)
+    client.upsert(collection_name=META_COLLECTION, points=[point], wait=True)
+    # Si quedaba el punto de control antiguo entre los documentos, se retira
+    if client.retrieve(collection, ids=[LEGACY_INDEX_MARKER_ID], with_payload=False, with_vectors=False):
+        client.delete(collection_name=collection, points_selector=PointIdsList(points=[LEGACY_INDEX_MARKER_ID]), wait=True)
+    return version
+
+def chunk_document(content, meta, sparse):
+    """Divide un documento (contenido, metadatos) en [(point_id, texto a embeber, payload)], uno por fragmento."""
+    question = meta.get("question", "")
+    path = meta["source_path"]
+    points = []
+
+    # Un punto por fragmento: id determinista a partir de la ruta y el índice del fragmento
+    chunks = chunk_markdown(content, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS) or [{"text": content, "heading_path": [], "start": 0, "end": len(content)}]
+    for index, chunk in enumerate(chunks):
+        combined_text = f"Pregunta: {question}\nRespuesta: {chunk['text']}" if question else chunk["text"]
+
+        if len(combined_text) > MAX_CHARS_LIMIT:
+            print(f"⚠️  Fragmento {index} de '{path}' demasiado largo ({len(combined_text)} caracteres). Truncando a {MAX_CHARS_LIMIT} caracteres.")
+            combined_text = combined_text[:MAX_CHARS_LIMIT]
+
+        chunk_meta = dict(meta, chunk={
+            "index": index,
+            "count": len(chunks),
+            "heading_path": chunk["heading_path"],
+            "start": chunk["start"],
+            "end": chunk["end"],
+        })
+        payload = {"content": chunk["text"], "metadata": chunk_meta}
+        payload["content_hash"] = content_hash(combined_text, payload, sparse)
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{path}#{index}"))
+        points.append((point_id, combined_text, payload))
+    return points
+
+def disk_records():
+    """Documentos de los Markdown en disco. Devuelve (iterable de (contenido, metadatos), nº de archivos)."""
+    print("Buscando archivos Markdown en 'faqs_markdown/' y 'pages/'...")
+    paths = (
+        glob.glob("faqs_markdown/*.md", recursive=True) +
+        glob.glob("pages/**/*.md", recursive=True)
+    )
+    if paths:
+        print(f"📂 Encontrados {len(paths)} archivos.")
+    return (parse_md_file(path) for path in paths), len(paths)
+
+def pipeline_records():
+    """
+    Documentos que producen los extractores en memoria: las FAQs del PDF y las páginas de
+    WordPress, cada extractor en su hilo (ver RecordStream). Son los mismos documentos, con
+    las mismas rutas e ids de punto, que se indexan desde disco.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import faq_to_md
+    import wp_chesterton
+    from record_stream import RecordStream
+
+    def faqs():
+        if PIPELINE_WRITE_MARKDOWN:
+            os.makedirs(faq_to_md.OUTPUT_DIR, exist_ok=True)
+        full_text = faq_to_md.read_pdf_text(faq_to_md.PDF_FILENAME)
+        for answer, meta in faq_to_md.iter_faqs(full_text, os.path.basename(faq_to_md.PDF_FILENAME), faq_to_md.OUTPUT_DIR):
+            if PIPELINE_WRITE_MARKDOWN:
+                faq_to_md.write_faq_markdown(answer, meta)
+            yield answer, meta
+
+    def pages():
+        session = wp_chesterton.create_session()
+        rate_limiter = wp_chesterton.TokenBucket(wp_chesterton.WP_RATE_LIMIT, wp_chesterton.WP_RATE_BURST)
+        # El proceso ya tiene otros hilos (productores, cliente de Qdrant): spawn en lugar de fork
+        pool = None
+        if wp_chesterton.WP_CONVERT_WORKERS > 1:
+            pool = ProcessPoolExecutor(max_workers=wp_chesterton.WP_CONVERT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            yield from wp_chesterton.iter_wp_records(wp_chesterton.wp_api_base(), "pages", "pages", session, rate_limiter,
+                                                     pool, PIPELINE_WRITE_MARKDOWN)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    print("🚰 Modo pipeline: extrayendo FAQs y páginas de WordPress e indexándolas a medida que llegan...")
+    return RecordStream({"faqs": faqs, "pages": pages}, PIPELINE_QUEUE_SIZE)
+
 # --- 3) FUNCIÓN PRINCIPAL ---
 
+@metrics.etapa("chesterton_qdrant")
 def main():
     # ... (verificación de configuración sin cambios)
 
     try:
         embedder = get_embedder()
-        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        client = get_qdrant_client()
         
         # --- LÓGICA DE CREACIÓN DE COLECCIÓN ---
-        try:
-            client.create_collection(
-                collection_name=COLLECTION,
-                vectors_config=VectorParams(size=EMBEDDING_DIMENSIONS, distance=Distance.COSINE)
-            )
-            print(f"✅ Colección '{COLLECTION}' creada con éxito.")
-        except Exception as e:
-            raw = getattr(e, "body", None) or str(e)
-            msg = raw.decode("utf-8", "ignore") if isinstance(raw, (bytes, bytearray)) else str(raw)
-            msg = msg.lower()
-            if getattr(e, "status_code", None) == 409 or "already exists" in msg or "conflict" in msg:
-                print(f"👍 La colección '{COLLECTION}' ya existía. OK.")
-            else:
-                print(f"❌ Error al comprobar la colección: {e}")
-                raise
+        ensure_collection(client, COLLECTION, **collection_kwargs())
+
+        sparse = ensure_sparse_vectors(client, COLLECTION)
 
     except Exception as e:
         print(f"❌ Error de configuración inicial: {e}")
         return
 
-    # Buscar archivos
-    print("Buscando archivos Markdown en 'faqs_markdown/' y 'pages/'...")
-    paths = (
-        glob.glob("faqs_markdown/*.md", recursive=True) +
-        glob.glob("pages/**/*.md", recursive=True)
-    )
-    if not paths:
-        print("✅ No se encontraron archivos para procesar.")
+    # Documentos a indexar. En modo pipeline se embeben y cargan por lotes mientras siguen llegando;
+    # desde disco, en una sola tanda
+    stream = None
+    if INDEXER_SOURCE == "pipeline":
+        records = stream = pipeline_records()
+        batch_size = PIPELINE_BATCH_SIZE
+    elif INDEXER_SOURCE == "disk":
+        records, num_files = disk_records()
+        if not num_files:
+            print("✅ No se encontraron archivos para procesar.")
+            return
+        batch_size = None
+    else:
+        print(f"❌ INDEXER_SOURCE no soportado: {INDEXER_SOURCE} (usa 'disk' o 'pipeline')")
         return
-        
-    print(f"📂 Encontrados {len(paths)} archivos.")
 
-    docs_for_embedding = []
-    payloads = []
+    # --- SINCRONIZACIÓN DELTA ---
+    try:
+        with metrics.temporizador("qdrant_scroll_seconds", collection=COLLECTION):
+            existing = fetch_existing_hashes(client, COLLECTION)
+    except Exception as e:
+        print(f"❌ Error al leer los puntos existentes en Qdrant: {e}")
+        return
 
-    for path in paths:
-        content, meta = parse_md_file(path)
-        
-        question = meta.get("question", "")
-        combined_text = f"Pregunta: {question}\nRespuesta: {content}" if question else content
-        
-        if len(combined_text) > MAX_CHARS_LIMIT:
-            print(f"⚠️  Documento '{path}' demasiado largo ({len(combined_text)} caracteres). Truncando a {MAX_CHARS_LIMIT} caracteres.")
-            combined_text = combined_text[:MAX_CHARS_LIMIT]
+    def point_vector(text, dense):
+        if not sparse:
+            return dense
+        indices, values = document_vector(text)
+        return {"": dense, SPARSE_VECTOR_NAME: SparseVector(indices=indices, values=values)} if indices else {"": dense}
 
-        docs_for_embedding.append(combined_text)
-        payloads.append({"content": content, "metadata": meta})
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_PROVIDER, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS) if EMBEDDING_CACHE else None
+    texts = {}  # point_id -> texto embebido, de todos los fragmentos vistos
+    pending = {}  # fragmentos nuevos o modificados aún sin cargar
+    stats = {"documents": 0, "changed": 0, "points": 0}
+
+    def flush():
+        """Embebe y carga los fragmentos pendientes. Sin embedding no se toca el punto guardado."""
+        with metrics.temporizador("embedding_seconds"):
+            embeddings = embed_documents(embedder, [text for text, _ in pending.values()], cache)
+        points = [
+            PointStruct(id=point_id, vector=point_vector(text, vector), payload=payload)
+            for (point_id, (text, payload)), vector in zip(pending.items(), embeddings)
+            if vector is not None
+        ]
+        if len(points) < len(pending):
+            # Se reintentarán en la próxima ejecución
+            print(f"⚠️  {len(pending) - len(points)} fragmentos sin embedding; se omiten en esta ejecución.")
+        if points:
+            print(f"⬆️ Cargando {len(points)} puntos en la colección '{COLLECTION}'...")
+            with metrics.temporizador("qdrant_upsert_total_seconds", collection=COLLECTION):
+                upsert_points_batched(client, COLLECTION, points)
+        metrics.incrementar("index_chunks_skipped", len(pending) - len(points))
+        stats["points"] += len(points)
+        pending.clear()
 
-    print(f"🧠 Generando embeddings para {len(docs_for_embedding)} documentos...")
     try:
-        embeddings = embedder.get_text_embedding_batch(docs_for_embedding, show_progress=True)
-    except Exception as e:
-        print(f"❌ Error fatal al generar embeddings: {e}")
-        return
+        try:
+            for content, meta in records:
+                stats["documents"] += 1
+                for point_id, text, payload in chunk_document(content, meta, sparse):
+                    texts[point_id] = text
+                    if existing.get(point_id, (None,))[0] != payload["content_hash"]:
+                        pending[point_id] = (text, payload)
+                        stats["changed"] += 1
+                if batch_size and len(pending) >= batch_size:
+                    flush()
+            if pending:
+                flush()
+            if not stats["documents"]:
+                print("✅ No se encontraron documentos para procesar.")
+                return
+        except Exception as e:
+            print(f"❌ Error durante la generación de embeddings o la carga a Qdrant: {e}")
+            if hasattr(e, 'response'):
+                 print(f"Raw response content:\n{e.response.content}")
+            return
 
-    points = []
-    for payload, emb in zip(payloads, embeddings):
-        truncated_vector = truncate_vector(emb, EMBEDDING_DIMENSIONS)
-        
-        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, payload["metadata"]["source_path"]))
-        
-        points.append(
-            PointStruct(id=point_id, vector=truncated_vector, payload=payload)
-        )
+        # Si algún extractor no terminó, lo que falta no son documentos borrados: no se elimina
+        # nada ni se recalcula la IDF con un corpus parcial
+        complete = not (stream and stream.failed)
+        for name, count in (stream.counts.items() if stream else ()):
+            metrics.incrementar("pipeline_records", count, producer=name)
+        for name, error in (stream.failed.items() if stream else ()):
+            print(f"⚠️  El extractor '{name}' falló: {error}. No se eliminan puntos obsoletos en esta ejecución.")
+
+        # Puntos de este indexador (tienen source_path) cuyo documento o fragmento ya no existe
+        stale = [pid for pid, (_, source_path) in existing.items() if source_path and pid not in texts] if complete else []
+        print(f"🧩 {stats['documents']} documentos divididos en {len(texts)} fragmentos (máx. {CHUNK_MAX_TOKENS} tokens, solapamiento {CHUNK_OVERLAP_TOKENS}).")
+        print(f"🔍 {stats['changed']} fragmentos nuevos o modificados, {len(texts) - stats['changed']} sin cambios, {len(stale)} obsoletos.")
+        metrics.incrementar("index_documents", stats["documents"])
+        metrics.incrementar("index_chunks", stats["changed"], estado="modificado")
+        metrics.incrementar("index_chunks", len(texts) - stats["changed"], estado="sin_cambios")
+
+        if cache and EMBEDDING_CACHE_EVICT and complete:
+            evicted = cache.evict_unreferenced(text_hash(text) for text in texts.values())
+            if evicted:
+                print(f"🗑️  Eliminadas {evicted} entradas de la caché que ya no se usan.")
+    finally:
+        if cache:
+            cache.close()
 
-    print(f"⬆️ Cargando {len(points)} puntos en la colección '{COLLECTION}'...")
     try:
-        client.upsert(collection_name=COLLECTION, points=points, wait=True)
-        print(f"✅ ¡Éxito! Se han indexado {len(points)} documentos en la colección '{COLLECTION}'.")
+        if stale:
+            print(f"🗑️  Eliminando {len(stale)} puntos obsoletos de la colección '{COLLECTION}'...")
+            with metrics.temporizador("qdrant_delete_seconds", collection=COLLECTION):
+                client.delete(collection_name=COLLECTION, points_selector=PointIdsList(points=stale), wait=True)
+            metrics.incrementar("qdrant_points_deleted", len(stale), collection=COLLECTION)
+        if stats["points"] or stale or LEGACY_INDEX_MARKER_ID in existing or read_index_marker(client, COLLECTION, ["version"]) is None:
+            extra = None
+            if sparse and complete:
+                # IDF sobre todos los fragmentos: se guarda en disco y en el punto de control
+                idf = IDFTable.from_texts(texts.values())
+                idf.save(SPARSE_IDF_PATH)
+                extra = {"sparse_idf": idf.to_dict()}
+            elif sparse and os.path.exists(SPARSE_IDF_PATH):
+                # Corpus incompleto: se vuelve a publicar la IDF de la última ejecución completa
+                extra = {"sparse_idf": IDFTable.load(SPARSE_IDF_PATH).to_dict()}
+            version = write_index_marker(client, COLLECTION, extra=extra)
+            print(f"🔖 Versión del índice: {version}")
+        print(f"✅ ¡Éxito! Colección '{COLLECTION}' sincronizada: {stats['points']} puntos actualizados, {len(stale)} eliminados.")
     except Exception as e:
         print(f"❌ Error durante la carga a Qdrant: {e}")
         if hasattr(e, 'response'):
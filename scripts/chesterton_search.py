@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+
+from qdrant_client.http.models import (
+    Filter, FieldCondition, MatchValue, MatchAny, Range, SearchParams, QuantizationSearchParams,
+    SearchRequest, NamedSparseVector, SparseVector,
+)
+
+from chesterton_qdrant import (
+    get_embedder, get_qdrant_client, postprocess_vectors,
+    read_index_marker, COLLECTION, EMBEDDING_DIMENSIONS, QDRANT_QUANTIZATION, SPARSE_VECTOR_NAME,
+)
+from sparse_bm25 import IDFTable
+
+# Caché de consultas: entradas máximas, vida de cada entrada y cada cuánto se consulta la
+# versión del índice (el punto de control que escribe el indexador al terminar)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_VERSION_CHECK_INTERVAL = float(os.getenv("SEARCH_VERSION_CHECK_INTERVAL", "30"))
+# Búsqueda híbrida: denso + BM25 fusionados con Reciprocal Rank Fusion (si el índice tiene IDF)
+SEARCH_HYBRID = os.getenv("SEARCH_HYBRID", "true").lower() in ("1", "true", "yes")
+SEARCH_RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+# Candidatos que se piden a cada búsqueda antes de fusionar (como mínimo k)
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "20"))
+
+
+class TTLCache:
+    """Caché LRU con caducidad por entrada, segura entre hilos."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.data[key]
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+def normalize_query(query):
+    """Clave de caché: mayúsculas y espacios no cambian la consulta."""
+    return " ".join(query.casefold().split())
+
+
+def rrf_fuse(rankings, k, rrf_k=SEARCH_RRF_K):
+    """Fusiona varias listas de ScoredPoint ordenadas con Reciprocal Rank Fusion."""
+    scores = {}
+    points = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits):
+            key = str(hit.id)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            points.setdefault(key, hit)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(points[key], scores[key]) for key in best]
+
+
+def build_filter(filters):
+    """
+    Convierte {campo: valor} en un filtro de Qdrant (None si no hay filtros).
+    Un valor lista se interpreta como "cualquiera de", y un dict con gt/gte/lt/lte como rango.
+    Los campos usan la ruta del payload, p. ej. {"metadata.section": "GENERAL"}.
+    """
+    must = []
+    for key, value in (filters or {}).items():
+        if isinstance(value, dict):
+            must.append(FieldCondition(key=key, range=Range(**value)))
+        elif isinstance(value, (list, tuple, set)):
+            must.append(FieldCondition(key=key, match=MatchAny(any=list(value))))
+        else:
+            must.append(FieldCondition(key=key, match=MatchValue(value=value)))
+    return Filter(must=must) if must else None
+
+
+class Searcher:
+    """
+    Búsqueda sobre la colección de documentos con caché de embeddings de consulta y de
+    resultados. Los embeddings solo dependen del texto y del modelo, así que se conservan
+    entre versiones del índice; los resultados se descartan en cuanto cambia la versión.
+
+    Si el indexador publicó la tabla IDF en el punto de control, la búsqueda es híbrida:
+    se lanzan la consulta densa y la BM25 en una sola petición y se fusionan con RRF.
+    """
+
+    def __init__(self, client=None, embedder=None, collection=COLLECTION,
+                 cache_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL, version_check=SEARCH_VERSION_CHECK_INTERVAL,
+                 hybrid=SEARCH_HYBRID):
+        self.client = client or get_qdrant_client()
+        self.embedder = embedder or get_embedder()
+        self.collection = collection
+        self.embeddings = TTLCache(cache_size, ttl)
+        self.results = TTLCache(cache_size, ttl)
+        self.version_check = version_check
+        self.version = None
+        self.version_checked_at = None
+        self.hybrid = hybrid
+        self.idf = None
+        self.lock = threading.Lock()
+
+    def index_version(self):
+        """Versión actual del índice (consultada como mucho cada `version_check` segundos)."""
+        with self.lock:
+            now = time.monotonic()
+            if self.version_checked_at is not None and now - self.version_checked_at < self.version_check:
+                return self.version
+            version = (read_index_marker(self.client, self.collection, ["version"]) or {}).get("version")
+            if version != self.version:
+                self.results.clear()
+                self.version = version
+                self.idf = self._load_idf() if self.hybrid and version else None
+            self.version_checked_at = now
+            return version
+
+    def _load_idf(self):
+        data = (read_index_marker(self.client, self.collection, ["sparse_idf"]) or {}).get("sparse_idf")
+        return IDFTable.from_dict(data) if data else None
+
+    def embed_query(self, query):
+        key = normalize_query(query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = postprocess_vectors([self.embedder.get_query_embedding(query)], EMBEDDING_DIMENSIONS)[0].tolist()
+            self.embeddings.put(key, vector)
+        return vector
+
+    def search(self, query, k=5, filters=None):
+        """
+        Devuelve los `k` fragmentos más parecidos a `query` como
+        [{"id", "score", "content", "metadata"}], opcionalmente filtrados por payload.
+        """
+        version = self.index_version()
+        key = (version, normalize_query(query), k, json.dumps(filters, sort_keys=True, default=str))
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+
+        params = None
+        if QDRANT_QUANTIZATION in ("scalar", "binary"):
+            params = SearchParams(quantization=QuantizationSearchParams(rescore=True))
+        query_filter = build_filter(filters)
+        dense = self.embed_query(query)
+        indices, values = self.idf.query_vector(query) if self.idf else ([], [])
+        if indices:
+            candidates = max(k, SEARCH_CANDIDATES)
+            dense_hits, sparse_hits = self.client.search_batch(
+                collection_name=self.collection,
+                requests=[
+                    SearchRequest(vector=dense, filter=query_filter, params=params, limit=candidates, with_payload=True),
+                    SearchRequest(
+                        vector=NamedSparseVector(name=SPARSE_VECTOR_NAME, vector=SparseVector(indices=indices, values=values)),
+                        filter=query_filter, limit=candidates, with_payload=True,
+                    ),
+                ],
+            )
+            scored = rrf_fuse([dense_hits, sparse_hits], k)
+        else:
+            hits = self.client.search(
+                collection_name=self.collection,
+                query_vector=dense,
+                query_filter=query_filter,
+                search_params=params,
+                limit=k,
+                with_payload=True,
+            )
+            scored = [(hit, hit.score) for hit in hits]
+        results = [
+            {
+                "id": str(hit.id),
+                "score": score,
+                "content": (hit.payload or {}).get("content"),
+                "metadata": (hit.payload or {}).get("metadata", {}),
+            }
+            for hit, score in scored
+        ]
+        self.results.put(key, results)
+        return results
+
+
+_default_searcher = None
+_default_lock = threading.Lock()
+
+
+def search(query, k=5, filters=None):
+    """Búsqueda con un Searcher compartido por el proceso (se crea en la primera llamada)."""
+    global _default_searcher
+    with _default_lock:
+        if _default_searcher is None:
+            _default_searcher = Searcher()
+    return _default_searcher.search(query, k, filters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca en la colección de documentos de Chesterton.")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--filtro", action="append", default=[], metavar="CAMPO=VALOR",
+                        help="Filtro por payload, p. ej. metadata.section=GENERAL (repetible)")
+    args = parser.parse_args()
+
+    filters = dict(f.split("=", 1) for f in args.filtro) or None
+    for i, result in enumerate(search(args.query, args.k, filters), 1):
+        meta = result["metadata"]
+        title = meta.get("question") or meta.get("title") or meta.get("filename")
+        print(f"{i}. [{result['score']:.3f}] {title} ({meta.get('source_path')})")
+        snippet = (result["content"] or "").replace("\n", " ")
+        print(f"   {snippet[:200]}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import re
+
+# Presupuesto por fragmento y solapamiento entre fragmentos consecutivos, en tokens aproximados
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+
+# Media aproximada de caracteres por token para texto en español con los tokenizadores BPE habituales
+CHARS_PER_TOKEN = 4
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$", re.MULTILINE)
+PARAGRAPH_SEP_RE = re.compile(r"\n\s*\n")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+WORD_START_RE = re.compile(r"(?<=\s)\S")
+
+
+def estimate_tokens(text):
+    """Estimación barata del número de tokens de `text` (sin tokenizador)."""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _sections(text):
+    """Divide el Markdown por encabezados ATX. Devuelve [(heading_path, start, end)]."""
+    sections = []
+    path = []
+    start = 0
+    current_path = []
+    for match in HEADING_RE.finditer(text):
+        if match.start() > start:
+            sections.append((list(current_path), start, match.start()))
+        level = len(match.group(1))
+        path = path[:level - 1] + [match.group(2).strip()]
+        current_path = list(path)
+        start = match.start()
+    if start < len(text):
+        sections.append((list(current_path), start, len(text)))
+    return sections
+
+
+def _word_boundary(text, pos, lo, hi):
+    """Primera posición de inicio de palabra en text[pos:hi], o `pos` si no la hay (limitada a [lo, hi])."""
+    match = WORD_START_RE.search(text, pos, hi)
+    return match.start() if match and match.start() > lo else pos
+
+
+def _split_long(text, start, end, max_chars):
+    """
+    Divide text[start:end], demasiado largo para un fragmento, por frases. Las frases que
+    siguen sin caber se parten en trozos de tamaño parecido cortando entre palabras.
+    Devuelve [(start, end)].
+    """
+    pieces = []
+    cursor = start
+    for match in SENTENCE_END_RE.finditer(text, start, end):
+        pieces.append((cursor, match.start()))
+        cursor = match.end()
+    pieces.append((cursor, end))
+
+    spans = []
+    for piece_start, piece_end in pieces:
+        length = piece_end - piece_start
+        if length <= 0:
+            continue
+        parts = -(-length // max_chars)
+        cut = piece_start
+        for n in range(1, parts):
+            target = piece_start + length * n // parts
+            # Retroceder hasta el último espacio para no partir palabras
+            space = text.rfind(" ", cut + 1, target + 1)
+            next_cut = space + 1 if space > cut else target
+            spans.append((cut, next_cut))
+            cut = next_cut
+        spans.append((cut, piece_end))
+    return spans
+
+
+def _units(text, max_chars):
+    """
+    Unidades mínimas de corte (párrafos, o frases de párrafos demasiado largos), con la
+    ruta de encabezados de su sección. Devuelve [(heading_path, start, end, starts_section)].
+    """
+    units = []
+    for heading_path, sec_start, sec_end in _sections(text):
+        first = True
+        cursor = sec_start
+        section = text[sec_start:sec_end]
+        boundaries = [m for m in PARAGRAPH_SEP_RE.finditer(section)] + [None]
+        for match in boundaries:
+            par_end = sec_start + (match.start() if match else len(section))
+            paragraph = text[cursor:par_end]
+            stripped = paragraph.strip()
+            if stripped:
+                lead = len(paragraph) - len(paragraph.lstrip())
+                par_start = cursor + lead
+                par_stop = par_start + len(stripped)
+                spans = [(par_start, par_stop)] if par_stop - par_start <= max_chars else _split_long(text, par_start, par_stop, max_chars)
+                for span_start, span_end in spans:
+                    units.append((heading_path, span_start, span_end, first))
+                    first = False
+            cursor = sec_start + match.end() if match else sec_end
+    return units
+
+
+def chunk_markdown(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Divide un documento Markdown en fragmentos de como mucho `max_tokens` tokens aproximados.
+
+    Se corta preferentemente en encabezados y entre párrafos; solo los párrafos que no caben
+    en un fragmento se dividen por frases. Dentro de una misma sección, cada fragmento repite
+    al principio hasta `overlap_tokens` del final del anterior. Devuelve una lista de diccionarios con
+    `text`, `heading_path` (encabezados de la sección donde empieza), `start` y `end`
+    (posiciones en `text`).
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    overlap_chars = max(0, overlap_tokens * CHARS_PER_TOKEN)
+    units = _units(text, max_chars)
+    if not units:
+        return []
+
+    chunks = []
+    current = []
+
+    def flush():
+        start, end = current[0][1], current[-1][2]
+        chunks.append({"text": text[start:end], "heading_path": current[0][0], "start": start, "end": end})
+
+    for unit in units:
+        heading_path, unit_start, unit_end, starts_section = unit
+        size = current[-1][2] - current[0][1] if current else 0
+        too_big = current and unit_end - current[0][1] > max_chars
+        # Un encabezado nuevo es buen punto de corte si el fragmento ya tiene un tamaño razonable
+        good_break = current and starts_section and size >= max_chars // 2
+        if too_big or good_break:
+            flush()
+            previous_end = current[-1][2]
+            current = []
+            # Solapamiento: el nuevo fragmento empieza repitiendo el final del anterior (entre
+            # palabras) si ambos están en la misma sección y el resultado sigue cabiendo
+            if not starts_section and overlap_chars:
+                overlap_start = max(previous_end - overlap_chars, unit_end - max_chars, chunks[-1]["start"] + 1)
+                overlap_start = _word_boundary(text, overlap_start, chunks[-1]["start"], previous_end)
+                if overlap_start < previous_end and unit_end - overlap_start <= max_chars:
+                    current = [(heading_path, overlap_start, previous_end, False)]
+        current.append(unit)
+
+    flush()
+    return chunks
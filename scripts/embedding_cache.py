@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import hashlib
+import time
+from array import array
+
+
+def text_hash(text):
+    """Huella SHA-256 del texto que se envía a embeber."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caché persistente de embeddings en SQLite.
+
+    Cada entrada se identifica por (proveedor, modelo, dimensiones, sha256 del texto),
+    así que cambiar de modelo o de dimensiones nunca reutiliza vectores incompatibles.
+    Los vectores se guardan como float32 empaquetados.
+    """
+
+    # Límite de parámetros por consulta IN (...) de SQLite
+    CHUNK = 500
+
+    def __init__(self, path, provider, model, dimensions):
+        self.path = path
+        self.provider = provider
+        self.model = model
+        self.dimensions = dimensions
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (provider, model, dimensions, text_hash)
+            )
+        """)
+        self.conn.commit()
+
+    def get_many(self, hashes):
+        """Devuelve {hash: vector} para los hashes presentes en la caché y actualiza las estadísticas."""
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        for start in range(0, len(hashes), self.CHUNK):
+            chunk = hashes[start:start + self.CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings "
+                f"WHERE provider = ? AND model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                (self.provider, self.model, self.dimensions, *chunk),
+            )
+            for h, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[h] = vector.tolist()
+
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE provider = ? AND model = ? AND dimensions = ? AND text_hash = ?",
+                [(now, self.provider, self.model, self.dimensions, h) for h in found],
+            )
+            self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, vectors_by_hash):
+        """Guarda {hash: vector} en la caché."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (provider, model, dimensions, text_hash, vector, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (self.provider, self.model, self.dimensions, h, array("f", vector).tobytes(), now)
+                for h, vector in vectors_by_hash.items()
+            ],
+        )
+        self.conn.commit()
+
+    def evict_unreferenced(self, referenced_hashes):
+        """
+        Borra todas las entradas que no corresponden a `referenced_hashes` con la
+        configuración actual (incluidas las de otros modelos o dimensiones).
+        Devuelve el número de entradas eliminadas.
+        """
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS referenced (text_hash TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM referenced")
+        self.conn.executemany("INSERT OR IGNORE INTO referenced VALUES (?)", [(h,) for h in referenced_hashes])
+        cursor = self.conn.execute(
+            "DELETE FROM embeddings WHERE NOT (provider = ? AND model = ? AND dimensions = ? "
+            "AND text_hash IN (SELECT text_hash FROM referenced))",
+            (self.provider, self.model, self.dimensions),
+        )
+        self.conn.commit()
+        if cursor.rowcount:
+            self.conn.execute("VACUUM")
+        return cursor.rowcount
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        self.conn.close()
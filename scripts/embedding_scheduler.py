@@ -0,0 +1,171 @@
+import os
+import time
+import random
+import asyncio
+from collections import namedtuple
+
+import metrics
+from chunking import estimate_tokens
+
+# Límites por petición de cada proveedor. Los tokens se estiman (~4 caracteres por token),
+# así que el presupuesto queda por debajo del límite real para cubrir el error de estimación.
+LimitesLote = namedtuple('LimitesLote', ['max_inputs', 'max_tokens'])
+PROVIDER_LIMITS = {
+    # OpenAI: hasta 2048 entradas y 300k tokens por petición de embeddings
+    "openai": LimitesLote(max_inputs=2048, max_tokens=200_000),
+    # Google (batchEmbedContents): hasta 100 entradas por petición
+    "google": LimitesLote(max_inputs=100, max_tokens=16_000),
+}
+DEFAULT_LIMITS = LimitesLote(max_inputs=100, max_tokens=16_000)
+
+# Peticiones de embeddings simultáneas (máximo; se reduce sola ante 429) y reintentos por lote
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+# Tope opcional de tokens por lote (0 = el del proveedor)
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "0"))
+
+
+def is_rate_limit_error(e):
+    """True si la excepción corresponde a un 429 / cuota agotada de OpenAI o Google."""
+    for attr in ("status_code", "code", "status"):
+        if getattr(e, attr, None) in (429, "429", "RESOURCE_EXHAUSTED"):
+            return True
+    msg = str(e).lower()
+    return "429" in msg or "rate limit" in msg or "resource_exhausted" in msg or "quota" in msg
+
+
+def pack_batches(texts, limits):
+    """
+    Agrupa los índices de `texts` en lotes consecutivos que respetan el máximo de entradas
+    y de tokens estimados por petición. Un texto que por sí solo supera el presupuesto va
+    en un lote propio. Devuelve una lista de listas de índices.
+    """
+    batches = []
+    current = []
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (len(current) >= limits.max_inputs or tokens + cost > limits.max_tokens):
+            batches.append(current)
+            current = []
+            tokens = 0
+        current.append(i)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingScheduler:
+    """
+    Envía los textos al embedder en lotes ajustados a los límites del proveedor, con varias
+    peticiones en vuelo a través de la API asíncrona de llama-index.
+
+    La concurrencia se adapta con AIMD: se divide a la mitad ante un 429 y sube en uno tras
+    una ronda completa de lotes correctos, sin pasar de `max_concurrency`. Cada lote fallido
+    se reintenta por separado con espera exponencial; los que agotan los reintentos se
+    devuelven como None en lugar de abortar toda la ejecución.
+    """
+
+    def __init__(self, embedder, provider, max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                 max_retries=EMBEDDING_MAX_RETRIES, batch_tokens=EMBEDDING_BATCH_TOKENS):
+        limits = PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS)
+        if batch_tokens:
+            limits = limits._replace(max_tokens=min(limits.max_tokens, batch_tokens))
+        self.embedder = embedder
+        self.provider = provider
+        self.limits = limits
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.concurrency = self.max_concurrency
+        self.retries = 0
+        self.failed_batches = 0
+        self.errors = []
+
+        # Que cada lote viaje en una sola petición: llama-index trocea por embed_batch_size
+        if hasattr(embedder, "embed_batch_size"):
+            embedder.embed_batch_size = limits.max_inputs
+
+    async def _embed_batch(self, texts, delay=0):
+        if delay:
+            await asyncio.sleep(delay)
+        start = time.perf_counter()
+        resultado = "error"
+        try:
+            aembed = getattr(self.embedder, "aget_text_embedding_batch", None)
+            if aembed is not None:
+                vectors = await aembed(texts)
+            else:
+                vectors = await asyncio.to_thread(self.embedder.get_text_embedding_batch, texts)
+            resultado = "ok"
+            return vectors
+        finally:
+            metrics.observar("embedding_request_seconds", time.perf_counter() - start, provider=self.provider, resultado=resultado)
+
+    async def _run(self, texts, batches):
+        results = [None] * len(texts)
+        pending = list(reversed(range(len(batches))))
+        attempts = [0] * len(batches)
+        delays = [0] * len(batches)
+        in_flight = {}
+        successes = 0
+
+        while pending or in_flight:
+            while pending and len(in_flight) < self.concurrency:
+                b = pending.pop()
+                task = asyncio.create_task(self._embed_batch([texts[i] for i in batches[b]], delays[b]))
+                in_flight[task] = b
+
+            finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                b = in_flight.pop(task)
+                e = task.exception()
+                if e is None:
+                    for i, vector in zip(batches[b], task.result()):
+                        results[i] = vector
+                    successes += 1
+                    if successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                        self.concurrency += 1
+                        successes = 0
+                    continue
+
+                attempts[b] += 1
+                rate_limited = is_rate_limit_error(e)
+                if rate_limited:
+                    self.concurrency = max(1, self.concurrency // 2)
+                    successes = 0
+                if attempts[b] > self.max_retries:
+                    self.failed_batches += 1
+                    metrics.incrementar("embedding_failed_batches", provider=self.provider)
+                    self.errors.append(e)
+                    print(f"❌ Lote de {len(batches[b])} textos descartado tras {self.max_retries} reintentos: {e}")
+                    continue
+                self.retries += 1
+                metrics.incrementar("embedding_retries", provider=self.provider, motivo="429" if rate_limited else "error")
+                delays[b] = min(60, 2 ** attempts[b]) + random.uniform(0, 1)
+                motivo = "límite de peticiones" if rate_limited else e.__class__.__name__
+                print(f"⚠️  Lote de {len(batches[b])} textos falló ({motivo}); reintento {attempts[b]}/{self.max_retries} en {delays[b]:.0f}s, concurrencia {self.concurrency}.")
+                pending.append(b)
+
+        return results
+
+    def embed(self, texts):
+        """
+        Devuelve los embeddings de `texts` en orden. Los textos de lotes que agotaron los
+        reintentos quedan como None (ver `failed_batches` y `errors`).
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        batches = pack_batches(texts, self.limits)
+        start = time.perf_counter()
+        results = asyncio.run(self._run(texts, batches))
+        elapsed = time.perf_counter() - start
+        metrics.incrementar("embedding_texts", len(texts), provider=self.provider)
+        metrics.incrementar("embedding_batches", len(batches), provider=self.provider)
+        metrics.fijar("embedding_concurrency", self.concurrency, provider=self.provider)
+        print(
+            f"🧠 {len(texts)} textos en {len(batches)} lotes en {elapsed:.1f}s "
+            f"(concurrencia final {self.concurrency}, {self.retries} reintentos, {self.failed_batches} lotes fallidos)."
+        )
+        return results
@@ -3,9 +3,15 @@ import os
 import re
 from dotenv import load_dotenv
 
+import metrics
+
 # Cargar variables de entorno
 load_dotenv()
 
+# Buscar el PDF en la carpeta data
+PDF_FILENAME = "data/faq_chesterton.pdf"
+OUTPUT_DIR = "faqs_markdown"
+
 def sanitize_filename(name):
     """
     Limpia una cadena de texto para que sea un nombre de archivo válido.
@@ -31,26 +37,23 @@ def find_section(question_start_index, text, sections_map):
             break
     return current_section
 
-def extract_and_save_faqs(pdf_path, output_folder="faqs_markdown"):
-    """
-    Extrae preguntas numeradas de un PDF y las guarda en archivos Markdown.
-    """
-    if not os.path.exists(pdf_path):
-        print(f"❌ Error: No se encontró el archivo '{pdf_path}'. Asegúrate de que el nombre es correcto y está en la carpeta data/.")
-        return
-
-    print(f"📖 Procesando el archivo: {pdf_path}")
-    os.makedirs(output_folder, exist_ok=True)
-
-    try:
+def read_pdf_text(pdf_path):
+    """Devuelve el texto de todas las páginas del PDF."""
+    with metrics.temporizador("faq_pdf_read_seconds"):
         doc = fitz.open(pdf_path)
         full_text = ""
         for page in doc:
             full_text += page.get_text("text")
-    except Exception as e:
-        print(f"❌ Error al leer el PDF: {e}")
-        return
+    metrics.incrementar("faq_pdf_pages", len(doc))
+    metrics.incrementar("faq_pdf_bytes", os.path.getsize(pdf_path))
+    return full_text
 
+def iter_faqs(full_text, source_name, output_folder="faqs_markdown"):
+    """
+    Recorre las preguntas numeradas del texto del PDF y devuelve, una a una, (respuesta, metadatos).
+    Los metadatos son los del front-matter de su archivo Markdown, más `filename` y `source_path`
+    (la ruta donde se escribe), igual que los que obtiene el indexador al leer el archivo.
+    """
     # 1. Encontrar las secciones para usarlas como metadatos
     section_headers = ["GENERAL", "PARA PROPIETARIOS / VENDEDORES", "PARA COMPRADORES / INVERSORES", "DOCUMENTACIÓN Y PROCESOS", "CONTACTO Y ATENCIÓN"]
     sections_map = {}
@@ -71,11 +74,7 @@ def extract_and_save_faqs(pdf_path, output_folder="faqs_markdown"):
         re.MULTILINE | re.DOTALL
     )
 
-    matches = pattern.finditer(full_text)
-    
-    count = 0
-    for match in matches:
-        count += 1
+    for match in pattern.finditer(full_text):
         question = match.group(1).replace('\n', ' ').strip()
         answer = match.group(2).strip()
         
@@ -90,30 +89,62 @@ def extract_and_save_faqs(pdf_path, output_folder="faqs_markdown"):
         # Crear el nombre del archivo
         file_id = question.split('.')[0]
         filename = f"{file_id}_{sanitize_filename(question)}.md"
-        filepath = os.path.join(output_folder, filename)
-
-        # Crear el contenido del archivo Markdown
-        markdown_content = f"""---
-id: {file_id}
-source: "{os.path.basename(pdf_path)}"
-section: "{section_name}"
-question: "{question.replace('"', '""')}"
+
+        yield answer, {
+            "id": int(file_id),
+            "source": source_name,
+            "section": section_name,
+            "question": question,
+            "filename": filename,
+            "source_path": os.path.join(output_folder, filename),
+        }
+
+def write_faq_markdown(answer, meta):
+    """Escribe la FAQ en su archivo Markdown (front-matter + respuesta)."""
+    markdown_content = f"""---
+id: {meta['id']}
+source: "{meta['source']}"
+section: "{meta['section']}"
+question: "{meta['question'].replace('"', '""')}"
 ---
 
 {answer}
 """
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        
-        print(f"✔️ Creado: {filename} (Sección: {section_name})")
+    with open(meta["source_path"], 'w', encoding='utf-8') as f:
+        f.write(markdown_content)
+
+def extract_and_save_faqs(pdf_path, output_folder="faqs_markdown"):
+    """
+    Extrae preguntas numeradas de un PDF y las guarda en archivos Markdown.
+    """
+    if not os.path.exists(pdf_path):
+        print(f"❌ Error: No se encontró el archivo '{pdf_path}'. Asegúrate de que el nombre es correcto y está en la carpeta data/.")
+        return
+
+    print(f"📖 Procesando el archivo: {pdf_path}")
+    os.makedirs(output_folder, exist_ok=True)
+
+    try:
+        full_text = read_pdf_text(pdf_path)
+    except Exception as e:
+        print(f"❌ Error al leer el PDF: {e}")
+        return
+
+    count = 0
+    for answer, meta in iter_faqs(full_text, os.path.basename(pdf_path), output_folder):
+        count += 1
+        write_faq_markdown(answer, meta)
+        metrics.incrementar("faq_written")
+        print(f"✔️ Creado: {meta['filename']} (Sección: {meta['section']})")
         
     if count == 0:
         print("⚠️ No se encontró ninguna pregunta numerada con el formato '1. ¿...?' en el PDF.")
     else:
         print(f"\n✅ Proceso finalizado. Se han creado {count} archivos en la carpeta '{output_folder}'.")
 
+@metrics.etapa("faq_to_md")
+def main():
+    extract_and_save_faqs(PDF_FILENAME, OUTPUT_DIR)
+
 if __name__ == '__main__':
-    # Buscar el PDF en la carpeta data
-    PDF_FILENAME = "data/faq_chesterton.pdf"
-    OUTPUT_DIR = "faqs_markdown"
-    extract_and_save_faqs(PDF_FILENAME, OUTPUT_DIR) 
\ No newline at end of file
+    main()
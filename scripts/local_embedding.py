@@ -0,0 +1,64 @@
+import re
+import hashlib
+import unicodedata
+from typing import List
+
+import numpy as np
+from pydantic import Field, PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedding(BaseEmbedding):
+    """
+    Embedder local y determinista para pruebas y benchmarks sin red ni coste por llamada.
+
+    Proyecta palabras y trigramas de caracteres a `dimensions` posiciones con BLAKE2b
+    (feature hashing con signo) y normaliza el resultado (norma L2 = 1). El mismo texto da
+    siempre el mismo vector, y textos con vocabulario parecido quedan cerca en coseno, así
+    que las búsquedas devuelven resultados con sentido aunque no sea un modelo semántico.
+    """
+
+    dimensions: int = Field(default=512, gt=0, description="Dimensiones del vector.")
+    _seed: bytes = PrivateAttr(default=b"")
+
+    def __init__(self, dimensions: int = 512, model_name: str = "hashing-v1", **kwargs):
+        super().__init__(dimensions=dimensions, model_name=model_name, **kwargs)
+        self._seed = model_name.encode("utf-8")[:16]
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashingEmbedding"
+
+    def _features(self, text):
+        text = unicodedata.normalize("NFKD", text.lower())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        for word in TOKEN_RE.findall(text):
+            yield word
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8, key=self._seed).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
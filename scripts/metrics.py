@@ -0,0 +1,356 @@
+"""
+Métricas por etapa: contadores, histogramas y temporizadores, con un informe por ejecución.
+
+Cada script decora su `main()` con `@etapa("nombre")`: eso activa el registro de la etapa,
+mide su duración total y, al terminar (también si falla), escribe `METRICS_DIR/<nombre>.json`
+y, con METRICS_PROMETHEUS=true, `METRICS_DIR/<nombre>.prom` (formato textfile de
+node_exporter). Si METRICS_PUSHGATEWAY_URL está definida, las mismas métricas se envían a la
+Pushgateway con job=METRICS_JOB y stage=<nombre>.
+
+El registro activo se guarda en una variable de contexto, así que dos etapas que corren a la vez
+en el mismo proceso (STAGE_EXECUTION=inprocess) no se mezclan. Las tareas de asyncio heredan el
+contexto; para hilos de un ThreadPoolExecutor hay que envolver la función con `vincular`.
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+import requests
+
+from atomic_file import write_atomic
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_DIR = os.getenv("METRICS_DIR", "output/metrics")
+METRICS_PROMETHEUS = os.getenv("METRICS_PROMETHEUS", "false").lower() in ("1", "true", "yes")
+METRICS_PUSHGATEWAY_URL = os.getenv("METRICS_PUSHGATEWAY_URL", "").rstrip("/")
+METRICS_JOB = os.getenv("METRICS_JOB", "chesterton")
+METRICS_PREFIX = "chesterton_"
+
+# Límites de los buckets de duración por defecto; +Inf se añade siempre
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Muestras que se guardan por serie para calcular percentiles en el informe JSON
+MAX_MUESTRAS = 2048
+
+
+class Histograma:
+    """Distribución de observaciones: buckets acumulables para Prometheus y una muestra para percentiles."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.conteos = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.muestras = []
+
+    def observar(self, valor):
+        self.conteos[bisect.bisect_left(self.buckets, valor)] += 1
+        self.count += 1
+        self.sum += valor
+        self.min = valor if self.min is None else min(self.min, valor)
+        self.max = valor if self.max is None else max(self.max, valor)
+        # Muestreo de reservorio: memoria acotada aunque haya millones de observaciones
+        if len(self.muestras) < MAX_MUESTRAS:
+            self.muestras.append(valor)
+        else:
+            i = random.randrange(self.count)
+            if i < MAX_MUESTRAS:
+                self.muestras[i] = valor
+
+    def percentil(self, p):
+        if not self.muestras:
+            return None
+        ordenadas = sorted(self.muestras)
+        return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+    def acumulados(self):
+        """[(límite, observaciones <= límite)], terminando en ('+Inf', count)."""
+        total = 0
+        filas = []
+        for limite, n in zip(self.buckets + ("+Inf",), self.conteos):
+            total += n
+            filas.append((limite, total))
+        return filas
+
+
+def _escapar(valor):
+    """Escapa un valor de etiqueta para el formato de texto de Prometheus."""
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+class Registro:
+    """Métricas de una etapa. Seguro entre hilos."""
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+        self.inicio = time.time()
+        self.fin = None
+        self.estado = None
+        self._lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+        self.valores = {}
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        """Suma `valor` al contador `nombre` (elementos, bytes, reintentos...)."""
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, buckets=BUCKETS_SEGUNDOS, **etiquetas):
+        """Añade una observación al histograma `nombre` (latencias, tamaños...)."""
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = self.histogramas[clave] = Histograma(buckets)
+            histograma.observar(valor)
+
+    def fijar(self, nombre, valor, **etiquetas):
+        """Guarda el último valor de `nombre` (gauge)."""
+        with self._lock:
+            self.valores[_clave(nombre, etiquetas)] = valor
+
+    @contextmanager
+    def temporizador(self, nombre, **etiquetas):
+        """Mide la duración del bloque y la registra en el histograma `nombre` (segundos)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - start, **etiquetas)
+
+    def duracion(self):
+        return (self.fin or time.time()) - self.inicio
+
+    def informe(self):
+        """Diccionario serializable con todas las métricas; los contadores incluyen su ritmo por segundo."""
+        duracion = self.duracion()
+        with self._lock:
+            contadores = {}
+            for (nombre, etiquetas), valor in sorted(self.contadores.items()):
+                contadores.setdefault(nombre, []).append({
+                    "labels": dict(etiquetas),
+                    "value": valor,
+                    "per_second": round(valor / duracion, 3) if duracion > 0 else None,
+                })
+            histogramas = {}
+            for (nombre, etiquetas), h in sorted(self.histogramas.items()):
+                histogramas.setdefault(nombre, []).append({
+                    "labels": dict(etiquetas),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "min": h.min,
+                    "max": h.max,
+                    "mean": h.sum / h.count if h.count else None,
+                    "p50": h.percentil(50),
+                    "p95": h.percentil(95),
+                    "p99": h.percentil(99),
+                })
+            valores = {}
+            for (nombre, etiquetas), valor in sorted(self.valores.items()):
+                valores.setdefault(nombre, []).append({"labels": dict(etiquetas), "value": valor})
+        return {
+            "stage": self.etapa,
+            "status": self.estado,
+            "pid": os.getpid(),
+            "started_at": datetime.fromtimestamp(self.inicio, timezone.utc).isoformat(),
+            "finished_at": datetime.fromtimestamp(self.fin, timezone.utc).isoformat() if self.fin else None,
+            "duration_seconds": round(duracion, 3),
+            "counters": contadores,
+            "histograms": histogramas,
+            "gauges": valores,
+        }
+
+    def prometheus(self):
+        """Las métricas en formato de exposición de texto de Prometheus, con la etiqueta `stage`."""
+        def nombre_prom(nombre):
+            return METRICS_PREFIX + nombre
+
+        def etiquetas_prom(etiquetas, extra=()):
+            pares = [("stage", self.etapa)] + list(etiquetas) + list(extra)
+            texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in pares)
+            return "{" + texto + "}"
+
+        lineas = []
+        with self._lock:
+            vistos = set()
+            for (nombre, etiquetas), valor in sorted(self.contadores.items()):
+                n = nombre_prom(nombre if nombre.endswith("_total") else nombre + "_total")
+                if n not in vistos:
+                    vistos.add(n)
+                    lineas.append(f"# TYPE {n} counter")
+                lineas.append(f"{n}{etiquetas_prom(etiquetas)} {valor}")
+            for (nombre, etiquetas), valor in sorted(self.valores.items()):
+                n = nombre_prom(nombre)
+                if n not in vistos:
+                    vistos.add(n)
+                    lineas.append(f"# TYPE {n} gauge")
+                lineas.append(f"{n}{etiquetas_prom(etiquetas)} {valor}")
+            for (nombre, etiquetas), h in sorted(self.histogramas.items()):
+                n = nombre_prom(nombre)
+                if n not in vistos:
+                    vistos.add(n)
+                    lineas.append(f"# TYPE {n} histogram")
+                for limite, acumulado in h.acumulados():
+                    lineas.append(f"{n}_bucket{etiquetas_prom(etiquetas, [('le', limite)])} {acumulado}")
+                lineas.append(f"{n}_sum{etiquetas_prom(etiquetas)} {h.sum}")
+                lineas.append(f"{n}_count{etiquetas_prom(etiquetas)} {h.count}")
+        n = nombre_prom("stage_duration_seconds")
+        lineas.append(f"# TYPE {n} gauge")
+        lineas.append(f"{n}{etiquetas_prom(())} {self.duracion():.3f}")
+        n = nombre_prom("stage_success")
+        lineas.append(f"# TYPE {n} gauge")
+        lineas.append(f"{n}{etiquetas_prom(())} {1 if self.estado == 'ok' else 0}")
+        n = nombre_prom("stage_last_run_timestamp_seconds")
+        lineas.append(f"# TYPE {n} gauge")
+        lineas.append(f"{n}{etiquetas_prom(())} {int(self.fin or time.time())}")
+        return "\n".join(lineas) + "\n"
+
+
+_registros = {}
+_registros_lock = threading.Lock()
+_activo = contextvars.ContextVar("metrics_registro", default=None)
+
+
+def registro(nombre):
+    """Registro de la etapa `nombre` (se crea la primera vez)."""
+    with _registros_lock:
+        if nombre not in _registros:
+            _registros[nombre] = Registro(nombre)
+        return _registros[nombre]
+
+
+def actual():
+    """Registro activo en este contexto; fuera de una etapa, el del script en ejecución."""
+    activo = _activo.get()
+    if activo is None:
+        nombre = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+        activo = registro(nombre)
+    return activo
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    actual().incrementar(nombre, valor, **etiquetas)
+
+
+def observar(nombre, valor, buckets=BUCKETS_SEGUNDOS, **etiquetas):
+    actual().observar(nombre, valor, buckets, **etiquetas)
+
+
+def fijar(nombre, valor, **etiquetas):
+    actual().fijar(nombre, valor, **etiquetas)
+
+
+def temporizador(nombre, **etiquetas):
+    return actual().temporizador(nombre, **etiquetas)
+
+
+def vincular(fn):
+    """Envuelve `fn` para que registre en el registro activo ahora, aunque se ejecute en otro hilo."""
+    reg = actual()
+
+    @wraps(fn)
+    def envuelta(*args, **kwargs):
+        token = _activo.set(reg)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _activo.reset(token)
+    return envuelta
+
+
+def escribir_json(path, datos):
+    """Escribe `datos` como JSON de forma atómica, creando el directorio si hace falta."""
+    directorio = os.path.dirname(path)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    write_atomic(path, json.dumps(datos, ensure_ascii=False, indent=2, default=str))
+
+
+def escribir_informe(reg=None, directorio=None):
+    """
+    Escribe el informe JSON (y el .prom / Pushgateway si están activados) del registro indicado
+    o del activo en `directorio` (por defecto METRICS_DIR). Los fallos al escribir o enviar se
+    avisan pero no interrumpen la etapa. Devuelve la ruta del JSON, o None si las métricas están
+    desactivadas o no se pudo escribir.
+    """
+    if not METRICS_ENABLED:
+        return None
+    reg = reg or actual()
+    directorio = directorio or METRICS_DIR
+    path = os.path.join(directorio, f"{reg.etapa}.json")
+    try:
+        escribir_json(path, reg.informe())
+        if METRICS_PROMETHEUS:
+            write_atomic(os.path.join(directorio, f"{reg.etapa}.prom"), reg.prometheus())
+    except OSError as e:
+        print(f"⚠️  No se pudo escribir el informe de métricas de {reg.etapa}: {e}")
+        path = None
+    if METRICS_PUSHGATEWAY_URL:
+        url = f"{METRICS_PUSHGATEWAY_URL}/metrics/job/{METRICS_JOB}/stage/{reg.etapa}"
+        try:
+            response = requests.put(url, data=reg.prometheus().encode("utf-8"),
+                                    headers={"Content-Type": "text/plain; version=0.0.4"}, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"⚠️  No se pudieron enviar las métricas de {reg.etapa} a la Pushgateway: {e}")
+    return path
+
+
+def etapa(nombre):
+    """
+    Decorador para el `main()` de un script: activa el registro `nombre`, mide la duración
+    total y escribe el informe al terminar, también si la etapa falla o llama a sys.exit.
+    """
+    def decorador(fn):
+        @wraps(fn)
+        def envuelta(*args, **kwargs):
+            # Registro nuevo en cada ejecución, para que el informe no arrastre la anterior
+            with _registros_lock:
+                reg = _registros[nombre] = Registro(nombre)
+            token = _activo.set(reg)
+            try:
+                resultado = fn(*args, **kwargs)
+                reg.estado = "ok"
+                return resultado
+            except SystemExit as e:
+                reg.estado = "ok" if e.code in (None, 0) else "error"
+                raise
+            except BaseException:
+                reg.estado = "error"
+                raise
+            finally:
+                reg.fin = time.time()
+                escribir_informe(reg)
+                _activo.reset(token)
+        return envuelta
+    return decorador
+
+
+def leer_informes(nombres, directorio=None):
+    """{etapa: informe} con los JSON de `nombres` que existan en `directorio` (por defecto METRICS_DIR)."""
+    directorio = directorio or METRICS_DIR
+    informes = {}
+    for nombre in nombres:
+        path = os.path.join(directorio, f"{nombre}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                informes[nombre] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return informes
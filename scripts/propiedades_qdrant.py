@@ -0,0 +1,215 @@
+import os
+import uuid
+import time
+from itertools import islice
+from decimal import Decimal
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+from qdrant_client.http.models import PointStruct, PointIdsList, PayloadSchemaType
+
+import metrics
+from xml_to_db import precio_operacion
+from embedding_cache import EmbeddingCache, text_hash
+from chesterton_qdrant import (
+    get_embedder, get_qdrant_client, ensure_collection, collection_kwargs, embed_documents,
+    content_hash, fetch_existing_hashes, upsert_points_batched, write_index_marker,
+    EMBEDDING_PROVIDER, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, EMBEDDING_CACHE, EMBEDDING_CACHE_EVICT,
+)
+
+load_dotenv()
+
+DB_URL = os.getenv("DB_URL")
+# Colección propia para los inmuebles (no se mezclan con FAQs y páginas)
+LISTINGS_COLLECTION = os.getenv("QDRANT_LISTINGS_COLLECTION", "chesterton_propiedades")
+# Filas que trae cada viaje del cursor de servidor e inmuebles que se embeben y suben por lote
+LISTINGS_FETCH_SIZE = int(os.getenv("LISTINGS_FETCH_SIZE", "1000"))
+LISTINGS_BATCH_SIZE = int(os.getenv("LISTINGS_BATCH_SIZE", "256"))
+# Longitud máxima del texto embebido por inmueble
+LISTINGS_MAX_CHARS = int(os.getenv("LISTINGS_MAX_CHARS", "6000"))
+# Caché de embeddings separada: la limpieza de cada indexador solo conoce sus propios textos
+LISTINGS_EMBEDDING_CACHE_PATH = os.getenv("LISTINGS_EMBEDDING_CACHE_PATH", "output/embedding_cache_propiedades.sqlite")
+
+SQL_PROPIEDADES = """
+    SELECT referencia, url, grupo_inmueble, estado, titulo, descripcion, descripcion_ampliada,
+           operaciones, poblacion, latitud, longitud, metros_construidos, metros_utiles,
+           metros_parcela, ano_construccion
+    FROM propiedades_min
+    ORDER BY referencia
+"""
+
+# Campos del payload con índice en Qdrant, para filtrar en la propia búsqueda vectorial
+PAYLOAD_INDEXES = {
+    "referencia": PayloadSchemaType.KEYWORD,
+    "poblacion": PayloadSchemaType.KEYWORD,
+    "grupo_inmueble": PayloadSchemaType.KEYWORD,
+    "estado": PayloadSchemaType.KEYWORD,
+    "tipos_operacion": PayloadSchemaType.KEYWORD,
+    "precio_venta": PayloadSchemaType.FLOAT,
+    "precio_alquiler": PayloadSchemaType.FLOAT,
+    "metros_construidos": PayloadSchemaType.FLOAT,
+    "location": PayloadSchemaType.GEO,
+}
+
+
+def numero(valor):
+    """NUMERIC de Postgres a float; 0 (valor ausente en el feed) se trata como desconocido."""
+    if valor is None:
+        return None
+    valor = float(valor) if isinstance(valor, Decimal) else valor
+    return valor or None
+
+
+def texto_inmueble(fila):
+    """Texto que se embebe: título, tipo y población, y las descripciones."""
+    cabecera = " · ".join(v for v in (fila["titulo"], fila["grupo_inmueble"], fila["poblacion"]) if v)
+    partes = [cabecera, fila["descripcion"], fila["descripcion_ampliada"]]
+    return "\n\n".join(p.strip() for p in partes if p and p.strip())[:LISTINGS_MAX_CHARS]
+
+
+def payload_inmueble(fila, texto):
+    """Payload estructurado (filtrable) del inmueble."""
+    operaciones = fila["operaciones"] or []
+    lat, lon = numero(fila["latitud"]), numero(fila["longitud"])
+    return {
+        "kind": "listing",
+        "referencia": fila["referencia"],
+        "url": fila["url"],
+        "titulo": fila["titulo"],
+        "grupo_inmueble": fila["grupo_inmueble"],
+        "estado": fila["estado"],
+        "poblacion": fila["poblacion"],
+        "tipos_operacion": sorted({(op.get("tipo") or "").lower() for op in operaciones if op.get("tipo")}),
+        "precio_venta": numero(precio_operacion(operaciones, "venta")),
+        "precio_alquiler": numero(precio_operacion(operaciones, "alquiler")),
+        "metros_construidos": numero(fila["metros_construidos"]),
+        "metros_utiles": numero(fila["metros_utiles"]),
+        "metros_parcela": numero(fila["metros_parcela"]),
+        "ano_construccion": fila["ano_construccion"] or None,
+        "location": {"lat": lat, "lon": lon} if lat is not None and lon is not None else None,
+        "content": texto,
+    }
+
+
+def point_id(referencia):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"propiedad:{referencia}"))
+
+
+def iterar_propiedades(conn, fetch_size=LISTINGS_FETCH_SIZE):
+    """Recorre propiedades_min con un cursor con nombre (de servidor): memoria acotada."""
+    with conn.cursor(name="propiedades_qdrant", cursor_factory=RealDictCursor) as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(SQL_PROPIEDADES)
+        yield from cursor
+
+
+def lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def ensure_payload_indexes(client, collection):
+    """Crea los índices de payload (si ya existen, Qdrant no hace nada)."""
+    for campo, tipo in PAYLOAD_INDEXES.items():
+        client.create_payload_index(collection_name=collection, field_name=campo, field_schema=tipo, wait=True)
+
+
+@metrics.etapa("propiedades_qdrant")
+def main():
+    if not DB_URL:
+        print("❌ DB_URL no está configurada.")
+        return
+
+    try:
+        embedder = get_embedder()
+        client = get_qdrant_client()
+        kwargs = collection_kwargs()
+        kwargs.pop("sparse_vectors_config", None)
+        ensure_collection(client, LISTINGS_COLLECTION, **kwargs)
+        ensure_payload_indexes(client, LISTINGS_COLLECTION)
+        existing = fetch_existing_hashes(client, LISTINGS_COLLECTION, owner_field="referencia")
+    except Exception as e:
+        print(f"❌ Error de configuración inicial: {e}")
+        return
+
+    cache = EmbeddingCache(LISTINGS_EMBEDDING_CACHE_PATH, EMBEDDING_PROVIDER, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS) if EMBEDDING_CACHE else None
+    vistos = set()
+    hashes_vistos = set()
+    actualizados = sin_cambios = sin_embedding = 0
+    inicio = time.perf_counter()
+
+    try:
+        conn = psycopg2.connect(DB_URL)
+        conn.set_session(readonly=True)
+    except psycopg2.Error as e:
+        print(f"❌ Error al conectar con la base de datos: {e}")
+        return
+
+    try:
+        for lote in lotes(iterar_propiedades(conn), LISTINGS_BATCH_SIZE):
+            cambiados = []
+            for fila in lote:
+                texto = texto_inmueble(fila)
+                payload = payload_inmueble(fila, texto)
+                payload["content_hash"] = content_hash(texto, payload)
+                pid = point_id(fila["referencia"])
+                vistos.add(pid)
+                hashes_vistos.add(text_hash(texto))
+                if existing.get(pid, (None,))[0] == payload["content_hash"]:
+                    sin_cambios += 1
+                else:
+                    cambiados.append((pid, texto, payload))
+            if not cambiados:
+                continue
+
+            with metrics.temporizador("embedding_seconds"):
+                vectores = embed_documents(embedder, [texto for _, texto, _ in cambiados], cache)
+            puntos = [
+                PointStruct(id=pid, vector=vector, payload=payload)
+                for (pid, _, payload), vector in zip(cambiados, vectores)
+                if vector is not None
+            ]
+            sin_embedding += len(cambiados) - len(puntos)
+            if puntos:
+                upsert_points_batched(client, LISTINGS_COLLECTION, puntos)
+                actualizados += len(puntos)
+
+        # Inmuebles indexados que ya no están en la tabla (tienen referencia y no se han visto)
+        obsoletos = [pid for pid, (_, referencia) in existing.items() if referencia and pid not in vistos]
+        if obsoletos:
+            print(f"🗑️  Eliminando {len(obsoletos)} inmuebles que ya no están en propiedades_min...")
+            with metrics.temporizador("qdrant_delete_seconds", collection=LISTINGS_COLLECTION):
+                client.delete(collection_name=LISTINGS_COLLECTION, points_selector=PointIdsList(points=obsoletos), wait=True)
+            metrics.incrementar("qdrant_points_deleted", len(obsoletos), collection=LISTINGS_COLLECTION)
+        if actualizados or obsoletos:
+            write_index_marker(client, LISTINGS_COLLECTION)
+        if cache and EMBEDDING_CACHE_EVICT:
+            cache.evict_unreferenced(hashes_vistos)
+    except psycopg2.Error as e:
+        print(f"❌ Error leyendo propiedades_min: {e}")
+        return
+    except Exception as e:
+        print(f"❌ Error durante la indexación de inmuebles: {e}")
+        return
+    finally:
+        conn.close()
+        if cache:
+            cache.close()
+
+    metrics.incrementar("index_documents", len(vistos))
+    metrics.incrementar("index_chunks", actualizados, estado="modificado")
+    metrics.incrementar("index_chunks", sin_cambios, estado="sin_cambios")
+    metrics.incrementar("index_chunks_skipped", sin_embedding)
+    if sin_embedding:
+        print(f"⚠️  {sin_embedding} inmuebles sin embedding; se reintentarán en la próxima ejecución.")
+    print(
+        f"✅ Colección '{LISTINGS_COLLECTION}' sincronizada en {time.perf_counter() - inicio:.1f}s: "
+        f"{actualizados} inmuebles actualizados, {sin_cambios} sin cambios, {len(obsoletos)} eliminados."
+    )
+
+
+if __name__ == "__main__":
+    main()
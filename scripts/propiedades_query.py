@@ -0,0 +1,205 @@
+"""
+Consultas rápidas sobre `propiedades` por zona y precio.
+
+Todas usan los índices que crea xml_to_db.crear_esquema_db: GiST sobre `ubicacion` para
+radio y caja, B-tree parcial sobre `precio_venta` / `precio_alquiler` para rangos de precio,
+B-tree (text_pattern_ops) sobre `geohash` para búsquedas por prefijo y el de
+`propiedad_caracteristicas` (caracteristica_id, propiedad_referencia) para filtrar por varias
+características a la vez.
+
+Uso: python scripts/propiedades_query.py --cerca 36.51,-4.88 --radio 5 --precio-max 300000 --con piscina_privada,ascensor
+"""
+
+import os
+import math
+import argparse
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+from xml_to_db import codificar_geohash, CARACTERISTICAS
+
+load_dotenv()
+
+DB_URL = os.getenv("DB_URL")
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO_LAT = 111.32
+
+COLUMNAS_RESULTADO = ['referencia', 'titulo', 'poblacion', 'grupo_inmueble', 'precio_venta', 'precio_alquiler',
+                      'metros_construidos', 'latitud', 'longitud', 'url']
+COLUMNAS_PRECIO = {'venta': 'precio_venta', 'alquiler': 'precio_alquiler'}
+# nombre de la característica -> bit en caracteristicas_bits (id en la tabla `caracteristicas`)
+BITS_CARACTERISTICAS = {c.nombre: i for i, c in enumerate(CARACTERISTICAS)}
+
+# Distancia de círculo máximo (haversine) entre `ubicacion` y el centro, en km
+SQL_DISTANCIA = sql.SQL(
+    "2 * {radio} * asin(sqrt(power(sin(radians((ubicacion[1] - %(lat)s) / 2)), 2) + "
+    "cos(radians(%(lat)s)) * cos(radians(ubicacion[1])) * power(sin(radians((ubicacion[0] - %(lon)s) / 2)), 2)))"
+).format(radio=sql.Literal(RADIO_TIERRA_KM))
+
+
+def caja_alrededor(lat, lon, radio_km):
+    """Caja (lat_min, lon_min, lat_max, lon_max) que contiene el círculo de `radio_km` alrededor del centro."""
+    dlat = radio_km / KM_POR_GRADO_LAT
+    dlon = radio_km / (KM_POR_GRADO_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, max(lon - dlon, -180.0), lat + dlat, min(lon + dlon, 180.0)
+
+
+def ids_caracteristicas(nombres):
+    """Ids en la tabla `caracteristicas` de `nombres` (p. ej. ['piscina_privada', 'ascensor']), sin repetir."""
+    desconocidas = [n for n in nombres if n not in BITS_CARACTERISTICAS]
+    if desconocidas:
+        raise ValueError(f"Características desconocidas: {', '.join(desconocidas)}")
+    return sorted({BITS_CARACTERISTICAS[nombre] for nombre in nombres})
+
+
+def mascara_caracteristicas(nombres):
+    """Máscara de bits con las características `nombres`, comparable con caracteristicas_bits."""
+    mascara = 0
+    for bit in ids_caracteristicas(nombres):
+        mascara |= 1 << bit
+    return mascara
+
+
+def caracteristicas_de(bits):
+    """Nombres de las características activas en un valor de caracteristicas_bits."""
+    return [c.nombre for i, c in enumerate(CARACTERISTICAS) if bits and bits >> i & 1]
+
+
+def buscar(cursor, centro=None, radio_km=None, caja=None, geohash=None,
+           precio_min=None, precio_max=None, operacion='venta', caracteristicas=None, limite=50):
+    """
+    Busca inmuebles combinando filtros opcionales:
+      - centro=(lat, lon) y radio_km: a menos de `radio_km`, ordenados por distancia
+      - caja=(lat_min, lon_min, lat_max, lon_max): dentro del rectángulo
+      - geohash: prefijo de geohash (celda)
+      - precio_min / precio_max: rango sobre el precio de `operacion` ('venta' o 'alquiler')
+      - caracteristicas: nombres que el inmueble debe tener todos (ver CARACTERISTICAS)
+    Devuelve una lista de dicts con COLUMNAS_RESULTADO (y `distancia_km` si hay centro).
+    """
+    columna_precio = COLUMNAS_PRECIO.get(operacion)
+    if columna_precio is None:
+        raise ValueError(f"Operación no soportada: {operacion} (usa 'venta' o 'alquiler')")
+
+    condiciones = []
+    params = {}
+    columnas = [sql.Identifier(c) for c in COLUMNAS_RESULTADO]
+    orden = sql.SQL("{} ASC").format(sql.Identifier(columna_precio))
+
+    if centro is not None and radio_km is not None:
+        params['lat'], params['lon'] = centro
+        params['radio'] = radio_km
+        # La caja usa el índice GiST; la distancia exacta descarta las esquinas
+        caja_centro = caja_alrededor(centro[0], centro[1], radio_km)
+        condiciones.append(sql.SQL("ubicacion <@ box(point(%(c_lon_min)s, %(c_lat_min)s), point(%(c_lon_max)s, %(c_lat_max)s))"))
+        params.update(zip(('c_lat_min', 'c_lon_min', 'c_lat_max', 'c_lon_max'), caja_centro))
+        condiciones.append(sql.SQL("{} <= %(radio)s").format(SQL_DISTANCIA))
+        columnas.append(sql.SQL("{} AS distancia_km").format(SQL_DISTANCIA))
+        orden = sql.SQL("distancia_km ASC")
+
+    if caja is not None:
+        condiciones.append(sql.SQL("ubicacion <@ box(point(%(lon_min)s, %(lat_min)s), point(%(lon_max)s, %(lat_max)s))"))
+        params.update(zip(('lat_min', 'lon_min', 'lat_max', 'lon_max'), caja))
+
+    if geohash:
+        condiciones.append(sql.SQL("geohash LIKE %(geohash)s"))
+        params['geohash'] = geohash.lower().replace('%', '').replace('_', '') + '%'
+
+    if precio_min is not None:
+        condiciones.append(sql.SQL("{} >= %(precio_min)s").format(sql.Identifier(columna_precio)))
+        params['precio_min'] = precio_min
+    if precio_max is not None:
+        condiciones.append(sql.SQL("{} <= %(precio_max)s").format(sql.Identifier(columna_precio)))
+        params['precio_max'] = precio_max
+    if caracteristicas:
+        # Una sola subconsulta sobre el índice de propiedad_caracteristicas en lugar de una condición
+        # por columna booleana: los inmuebles que aparecen con todas las características pedidas
+        condiciones.append(sql.SQL(
+            "referencia IN (SELECT propiedad_referencia FROM propiedad_caracteristicas"
+            " WHERE caracteristica_id = ANY(%(caracteristicas)s::smallint[])"
+            " GROUP BY propiedad_referencia HAVING count(*) = %(num_caracteristicas)s)"
+        ))
+        params['caracteristicas'] = ids_caracteristicas(caracteristicas)
+        params['num_caracteristicas'] = len(params['caracteristicas'])
+    if precio_min is None and precio_max is None and centro is None and caja is None and not geohash and not caracteristicas:
+        # Sin filtros: inmuebles con esa operación, del más barato al más caro
+        condiciones.append(sql.SQL("{} IS NOT NULL").format(sql.Identifier(columna_precio)))
+
+    consulta = sql.SQL("SELECT {} FROM propiedades WHERE {} ORDER BY {} LIMIT %(limite)s").format(
+        sql.SQL(', ').join(columnas),
+        sql.SQL(' AND ').join(condiciones),
+        orden,
+    )
+    params['limite'] = limite
+    cursor.execute(consulta, params)
+    return cursor.fetchall()
+
+
+def cercanos(cursor, lat, lon, radio_km, **filtros):
+    """Inmuebles a menos de `radio_km` de (lat, lon), del más cercano al más lejano."""
+    return buscar(cursor, centro=(lat, lon), radio_km=radio_km, **filtros)
+
+
+def en_caja(cursor, lat_min, lon_min, lat_max, lon_max, **filtros):
+    """Inmuebles dentro del rectángulo indicado."""
+    return buscar(cursor, caja=(lat_min, lon_min, lat_max, lon_max), **filtros)
+
+
+def por_precio(cursor, precio_min=None, precio_max=None, operacion='venta', **filtros):
+    """Inmuebles con el precio de `operacion` en el rango indicado."""
+    return buscar(cursor, precio_min=precio_min, precio_max=precio_max, operacion=operacion, **filtros)
+
+
+def en_celda(cursor, lat, lon, precision=5, **filtros):
+    """Inmuebles en la misma celda geohash que (lat, lon); precisión 5 ≈ 5 km, 6 ≈ 1 km."""
+    return buscar(cursor, geohash=codificar_geohash(lat, lon, precision), **filtros)
+
+
+def con_caracteristicas(cursor, nombres, **filtros):
+    """Inmuebles que tienen todas las características `nombres`."""
+    return buscar(cursor, caracteristicas=nombres, **filtros)
+
+
+def _coordenadas(texto):
+    lat, lon = (float(v) for v in texto.split(','))
+    return lat, lon
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta inmuebles por zona y precio.")
+    parser.add_argument("--cerca", type=_coordenadas, metavar="LAT,LON")
+    parser.add_argument("--radio", type=float, default=5.0, help="Radio en km (con --cerca)")
+    parser.add_argument("--caja", type=float, nargs=4, metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"))
+    parser.add_argument("--geohash", help="Prefijo de geohash")
+    parser.add_argument("--precio-min", type=float)
+    parser.add_argument("--precio-max", type=float)
+    parser.add_argument("--operacion", choices=list(COLUMNAS_PRECIO), default="venta")
+    parser.add_argument("--con", type=lambda t: [n.strip() for n in t.split(',') if n.strip()], metavar="CARACTERISTICA,...",
+                        help="Características que debe tener, p. ej. piscina_privada,ascensor")
+    parser.add_argument("--limite", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DB_URL)
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            filas = buscar(
+                cursor, centro=args.cerca, radio_km=args.radio if args.cerca else None, caja=args.caja,
+                geohash=args.geohash, precio_min=args.precio_min, precio_max=args.precio_max,
+                operacion=args.operacion, caracteristicas=args.con, limite=args.limite,
+            )
+    finally:
+        conn.close()
+
+    for fila in filas:
+        precio = fila[COLUMNAS_PRECIO[args.operacion]]
+        precio = f"{precio:,.0f} €" if precio is not None else "sin precio"
+        distancia = f" a {fila['distancia_km']:.1f} km" if 'distancia_km' in fila else ""
+        print(f"{fila['referencia']}: {fila['titulo']} ({fila['poblacion']}) {precio}{distancia}")
+    print(f"{len(filas)} inmuebles.")
+
+
+if __name__ == "__main__":
+    main()
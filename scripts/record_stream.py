@@ -0,0 +1,78 @@
+import queue
+import threading
+
+import metrics
+
+# Marcador de fin de un productor en la cola
+_DONE = object()
+
+
+class RecordStream:
+    """
+    Ejecuta cada productor (una función sin argumentos que devuelve un iterable de registros)
+    en su propio hilo y entrega sus registros a un único consumidor a través de una cola
+    acotada: el consumidor empieza a trabajar con el primer registro, y si va más lento que
+    los productores, estos esperan en lugar de acumular en memoria.
+
+    Al terminar de iterar, `failed` contiene {nombre: excepción} de los productores que
+    fallaron (sus registros anteriores al fallo sí se han entregado).
+    """
+
+    def __init__(self, producers, maxsize=256):
+        self.producers = producers
+        self.queue = queue.Queue(maxsize=max(1, maxsize))
+        self.stop = threading.Event()
+        self.failed = {}
+        self.counts = {name: 0 for name in producers}
+
+    def _put(self, item):
+        # Con timeout para poder salir si el consumidor abandona la iteración
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, name, producer):
+        error = None
+        try:
+            records = iter(producer())
+            try:
+                for record in records:
+                    if not self._put(record):
+                        break
+                    self.counts[name] += 1
+            finally:
+                # Si el consumidor abandona, cerrar el generador ejecuta su limpieza (sesiones, pools)
+                close = getattr(records, "close", None)
+                if close is not None:
+                    close()
+        except BaseException as e:
+            error = e
+        finally:
+            # Siempre se marca el fin, o el consumidor esperaría para siempre a este productor
+            self._put((_DONE, name, error))
+
+    def __iter__(self):
+        # Los productores registran sus métricas en la etapa del consumidor
+        threads = [
+            threading.Thread(target=metrics.vincular(self._run), args=(name, producer), name=f"producer-{name}", daemon=True)
+            for name, producer in self.producers.items()
+        ]
+        for thread in threads:
+            thread.start()
+        pending = len(threads)
+        try:
+            while pending:
+                item = self.queue.get()
+                if isinstance(item, tuple) and len(item) == 3 and item[0] is _DONE:
+                    _, name, error = item
+                    if error is not None:
+                        self.failed[name] = error
+                    pending -= 1
+                    continue
+                yield item
+        finally:
+            self.stop.set()
@@ -5,11 +5,20 @@ Se ejecuta una vez, procesa todos los datos, y termina.
 Ideal para cron externo o ejecución manual.
 """
 
+import io
 import os
 import sys
+import time
+import importlib
+import threading
+import traceback
 import subprocess
 import logging
-from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+
+import metrics
 
 # Configurar logging
 logging.basicConfig(
@@ -22,35 +31,245 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def run_script(script_name, description):
-    """Ejecuta un script individual y maneja errores."""
+# Etapas que pueden ejecutarse a la vez (las que no dependen unas de otras)
+STAGE_MAX_WORKERS = int(os.getenv("STAGE_MAX_WORKERS", "3"))
+# Tiempo máximo por etapa, en segundos
+STAGE_TIMEOUT = int(os.getenv("STAGE_TIMEOUT", "1800"))
+# "subprocess": un intérprete nuevo por etapa. "inprocess": cada etapa importa su script y llama
+# a su main() en este mismo proceso (un solo arranque; las dependencias comunes se importan una vez)
+STAGE_EXECUTION = os.getenv("STAGE_EXECUTION", "subprocess").lower()
+# Directorio de trabajo de las etapas (las rutas de los scripts son relativas a él)
+APP_DIR = os.getenv("APP_DIR", "/app")
+# Informes de métricas de cada etapa y resumen de la ejecución (METRICS_DIR es relativo a APP_DIR)
+METRICS_DIR = os.path.join(APP_DIR, metrics.METRICS_DIR)
+RUN_METRICS = metrics.registro("run_once")
+
+Stage = namedtuple('Stage', ['script', 'description', 'depends_on'])
+
+# Grafo de etapas: cada una arranca en cuanto terminan todas las de `depends_on`
+STAGES = [
+    Stage("faq_to_md.py", "Extracción de FAQs del PDF", ()),
+    Stage("wp_chesterton.py", "Scraping de WordPress", ()),
+    Stage("xml_to_db.py", "Procesamiento de XML y carga a base de datos", ()),
+    Stage("chesterton_qdrant.py", "Indexación en Qdrant", ("faq_to_md.py", "wp_chesterton.py")),
+    Stage("propiedades_qdrant.py", "Indexación de inmuebles en Qdrant", ("xml_to_db.py",)),
+]
+
+# Con INDEXER_SOURCE=pipeline el indexador ejecuta él mismo los extractores y recibe sus
+# documentos en memoria: las etapas de extracción a disco sobran
+if os.getenv("INDEXER_SOURCE", "disk").lower() == "pipeline":
+    PIPELINE_EXTRACTORS = ("faq_to_md.py", "wp_chesterton.py")
+    STAGES = [
+        stage._replace(depends_on=tuple(dep for dep in stage.depends_on if dep not in PIPELINE_EXTRACTORS))
+        for stage in STAGES if stage.script not in PIPELINE_EXTRACTORS
+    ]
+
+class StageOutput(io.TextIOBase):
+    """
+    Sustituto de sys.stdout en el modo en proceso: antepone "[script]" a cada línea que
+    escribe el hilo de una etapa (las etapas se ejecutan a la vez) y anota cuándo escribió
+    la primera. El resto de hilos escriben sin cambios.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def begin(self, script_name):
+        self.local.prefix = f"[{script_name}] "
+        self.local.at_line_start = True
+        self.local.first_output = None
+
+    def end(self):
+        self.local.prefix = None
+        return self.local.first_output
+
+    def write(self, text):
+        prefix = getattr(self.local, "prefix", None)
+        if prefix and text:
+            if self.local.first_output is None:
+                self.local.first_output = time.perf_counter()
+            pieces = []
+            for line in text.splitlines(keepends=True):
+                if self.local.at_line_start:
+                    pieces.append(prefix)
+                pieces.append(line)
+                self.local.at_line_start = line.endswith("\n")
+            text = "".join(pieces)
+        with self.lock:
+            self.stream.write(text)
+            self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def run_script_subprocess(script_name, description, timeout=STAGE_TIMEOUT):
+    """Ejecuta un script en un intérprete nuevo, mostrando su salida a medida que la escribe."""
     logger.info(f"🚀 Ejecutando: {description}")
+    start = time.perf_counter()
+    first_output = None
+    timed_out = threading.Event()
     
     try:
-        result = subprocess.run(
+        process = subprocess.Popen(
             [sys.executable, f"scripts/{script_name}"],
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             text=True,
-            cwd="/app",
-            timeout=1800  # 30 minutos máximo por script
+            cwd=APP_DIR,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"}
         )
-        
-        if result.returncode == 0:
-            logger.info(f"✅ {description} completado exitosamente")
-            if result.stdout.strip():
-                logger.info(f"📤 Output: {result.stdout.strip()}")
-            return True
-        else:
-            logger.error(f"❌ {description} falló")
-            logger.error(f"📤 Error: {result.stderr}")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        logger.error(f"⏰ {description} excedió el tiempo límite (30 min)")
-        return False
     except Exception as e:
         logger.error(f"❌ Error ejecutando {script_name}: {e}")
         return False
+    
+    def kill():
+        timed_out.set()
+        process.kill()
+    
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        for line in process.stdout:
+            if first_output is None:
+                first_output = time.perf_counter() - start
+            logger.info(f"[{script_name}] {line.rstrip()}")
+        returncode = process.wait()
+    finally:
+        timer.cancel()
+    
+    elapsed = time.perf_counter() - start
+    startup = f", primera salida a los {first_output:.2f}s" if first_output is not None else ""
+    if timed_out.is_set():
+        logger.error(f"⏰ {description} excedió el tiempo límite ({timeout}s)")
+        return False
+    if returncode == 0:
+        logger.info(f"✅ {description} completado exitosamente en {elapsed:.1f}s{startup}")
+        return True
+    logger.error(f"❌ {description} falló (código {returncode}) en {elapsed:.1f}s")
+    return False
+
+def run_script_inprocess(script_name, description, timeout=STAGE_TIMEOUT):
+    """
+    Importa el script y llama a su main() en un hilo de este proceso. Un fallo (excepción o
+    sys.exit con código distinto de 0) solo marca la etapa como fallida. Un hilo no se puede
+    matar: si vence el tiempo límite la etapa se da por fallida y sigue en segundo plano.
+    """
+    logger.info(f"🚀 Ejecutando en proceso: {description}")
+    start = time.perf_counter()
+    output = sys.stdout if isinstance(sys.stdout, StageOutput) else None
+    outcome = {"ok": False}
+    
+    def target():
+        if output:
+            output.begin(script_name)
+        try:
+            module = importlib.import_module(os.path.splitext(script_name)[0])
+            outcome["imported"] = time.perf_counter() - start
+            module.main()
+            outcome["ok"] = True
+        except SystemExit as e:
+            outcome["ok"] = e.code in (None, 0)
+            outcome["error"] = f"sys.exit({e.code})"
+        except Exception:
+            outcome["error"] = traceback.format_exc()
+        finally:
+            outcome["first_output"] = output.end() if output else None
+    
+    thread = threading.Thread(target=target, name=script_name, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    
+    elapsed = time.perf_counter() - start
+    if thread.is_alive():
+        logger.error(f"⏰ {description} excedió el tiempo límite ({timeout}s); sigue en segundo plano")
+        return False
+    if outcome["ok"]:
+        startup = f"importación {outcome['imported']:.2f}s"
+        if outcome["first_output"] is not None:
+            startup += f", primera salida a los {outcome['first_output'] - start:.2f}s"
+        logger.info(f"✅ {description} completado exitosamente en {elapsed:.1f}s ({startup})")
+        return True
+    logger.error(f"❌ {description} falló en {elapsed:.1f}s")
+    logger.error(f"📤 Error: {outcome.get('error')}")
+    return False
+
+def run_script(script_name, description, timeout=STAGE_TIMEOUT):
+    """Ejecuta una etapa según STAGE_EXECUTION y devuelve si terminó bien."""
+    if STAGE_EXECUTION == "inprocess":
+        return run_script_inprocess(script_name, description, timeout)
+    return run_script_subprocess(script_name, description, timeout)
+
+def stage_name(script_name):
+    """Nombre de la etapa en las métricas: el del script sin extensión."""
+    return os.path.splitext(script_name)[0]
+
+def run_stage(stage):
+    """Ejecuta una etapa y registra su duración y resultado en las métricas de la ejecución."""
+    start = time.perf_counter()
+    ok = run_script(stage.script, stage.description)
+    name = stage_name(stage.script)
+    RUN_METRICS.observar("stage_seconds", time.perf_counter() - start, etapa=name, resultado="ok" if ok else "error")
+    RUN_METRICS.fijar("stage_success", int(ok), etapa=name)
+    return ok
+
+def write_metrics_report(stages, results):
+    """
+    Escribe el informe de run_once (duración de cada etapa) y `run.json`, que reúne en un solo
+    archivo ese informe y los que ha escrito cada etapa en esta ejecución, tanto en subproceso
+    como en proceso. Los informes de etapas que no llegaron a escribirlo se ignoran.
+    """
+    if not metrics.METRICS_ENABLED:
+        return
+    RUN_METRICS.fin = time.time()
+    RUN_METRICS.estado = "ok" if all(results.values()) else "error"
+    metrics.escribir_informe(RUN_METRICS, METRICS_DIR)
+    started = datetime.fromtimestamp(RUN_METRICS.inicio, timezone.utc).isoformat()
+    reports = {
+        name: report
+        for name, report in metrics.leer_informes([stage_name(stage.script) for stage in stages], METRICS_DIR).items()
+        if (report.get("started_at") or "") >= started
+    }
+    path = os.path.join(METRICS_DIR, "run.json")
+    try:
+        metrics.escribir_json(path, {"run": RUN_METRICS.informe(), "stages": reports})
+        logger.info(f"📊 Métricas de la ejecución en {path}")
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo escribir {path}: {e}")
+
+def run_stages(stages, max_workers=STAGE_MAX_WORKERS):
+    """
+    Ejecuta las etapas en paralelo respetando sus dependencias y devuelve {script: éxito}.
+    Una etapa arranca aunque alguna de sus dependencias haya fallado: trabaja con lo que
+    dejó la ejecución anterior, igual que cuando las etapas iban en secuencia.
+    """
+    pending = {stage.script: stage for stage in stages}
+    for stage in stages:
+        unknown = set(stage.depends_on) - pending.keys()
+        if unknown:
+            raise ValueError(f"La etapa {stage.script} depende de etapas desconocidas: {sorted(unknown)}")
+
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while pending or running:
+            ready = [stage for stage in pending.values() if all(dep in results for dep in stage.depends_on)]
+            for stage in ready:
+                del pending[stage.script]
+                failed = [dep for dep in stage.depends_on if not results[dep]]
+                if failed:
+                    logger.warning(f"⚠️ {stage.description}: fallaron {', '.join(failed)}; se ejecuta con los datos anteriores")
+                running[executor.submit(run_stage, stage)] = stage
+            if not running:
+                raise ValueError(f"Dependencias circulares entre etapas: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                results[stage.script] = future.result()
+    return results
 
 def verify_environment():
     """Verifica que las variables de entorno críticas estén configuradas."""
@@ -94,6 +313,7 @@ def verify_pdf_exists():
 def main():
     """Función principal para ejecución única."""
     start_time = datetime.now()
+    RUN_METRICS.inicio = time.time()
     
     logger.info("🚀 Iniciando Microservicio Chesterton (Ejecución Única)")
     logger.info(f"⏰ Inicio: {start_time.isoformat()}")
@@ -108,26 +328,23 @@ def main():
         logger.error("❌ Error: PDF no encontrado. Terminando...")
         sys.exit(1)
     
-    # Lista de scripts a ejecutar en orden
-    scripts_to_run = [
-        ("faq_to_md.py", "Extracción de FAQs del PDF"),
-        ("wp_chesterton.py", "Scraping de WordPress"),
-        ("xml_to_db.py", "Procesamiento de XML y carga a base de datos"),
-        ("chesterton_qdrant.py", "Indexación en Qdrant")
-    ]
-    
-    success_count = 0
-    total_scripts = len(scripts_to_run)
+    if STAGE_EXECUTION not in ("subprocess", "inprocess"):
+        logger.error(f"❌ STAGE_EXECUTION no válido: {STAGE_EXECUTION} (usa 'subprocess' o 'inprocess')")
+        sys.exit(1)
+    if STAGE_EXECUTION == "inprocess":
+        # Las etapas usan rutas relativas y sus print() se identifican por etapa
+        os.chdir(APP_DIR)
+        sys.stdout = StageOutput(sys.stdout)
     
-    logger.info(f"📋 Ejecutando {total_scripts} scripts en secuencia...")
+    total_scripts = len(STAGES)
+    logger.info(f"📋 Ejecutando {total_scripts} scripts (hasta {STAGE_MAX_WORKERS} en paralelo, modo {STAGE_EXECUTION})...")
     
-    for i, (script_name, description) in enumerate(scripts_to_run, 1):
-        logger.info(f"📝 [{i}/{total_scripts}] {description}")
-        
-        if run_script(script_name, description):
-            success_count += 1
-        else:
-            logger.warning(f"⚠️ Script falló, pero continuando...")
+    results = run_stages(STAGES)
+    write_metrics_report(STAGES, results)
+    success_count = sum(results.values())
+    for stage in STAGES:
+        if not results[stage.script]:
+            logger.warning(f"⚠️ Falló: {stage.description} ({stage.script})")
     
     # Resumen final
     end_time = datetime.now()
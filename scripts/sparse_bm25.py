@@ -0,0 +1,115 @@
+import os
+import re
+import json
+import math
+import hashlib
+import unicodedata
+from collections import Counter
+
+from atomic_file import write_atomic
+
+# Parámetros BM25. La longitud de referencia es fija (no la media del corpus) para que el
+# vector de cada fragmento dependa solo de su texto y la sincronización delta siga valiendo;
+# los fragmentos ya tienen un tamaño acotado (CHUNK_MAX_TOKENS), así que la aproximación es buena.
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_AVG_DOC_LEN = float(os.getenv("BM25_AVG_DOC_LEN", "120"))
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Palabras vacías del español (ya sin tildes, como quedan tras normalizar)
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes asi aun bajo bien cada como con contra cual cuales
+cuando de del desde donde dos el ella ellas ello ellos en entre era eran es esa esas ese eso esos esta estaba
+estan estar este esto estos fue fueron ha habia han hasta hay la las le les lo los mas me mi mis mucho muy
+nada ni no nos nosotros o os otra otras otro otros para pero poco por porque que quien se sea ser si sin
+sobre son su sus tambien tan te tiene tienen todo todos tu tus un una unas uno unos usted ustedes vosotros
+vuestra vuestras vuestro vuestros y ya yo
+""".split())
+
+
+def fold(text):
+    """Minúsculas y sin tildes ("Plusvalía" -> "plusvalia"); la ñ se conserva."""
+    text = unicodedata.normalize("NFKD", text.casefold().replace("ñ", "\0"))
+    return "".join(c for c in text if not unicodedata.combining(c)).replace("\0", "ñ")
+
+
+def stem(token):
+    """Reducción mínima de plurales ("naves" -> "nave", "locales" -> "local")."""
+    if len(token) > 4 and token.endswith("es") and token[-3] in "lrndzj":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and token[-2] in "aeiou":
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Tokens normalizados de `text`, sin palabras vacías."""
+    return [stem(t) for t in TOKEN_RE.findall(fold(text)) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def term_id(token):
+    """Índice estable (uint32) del término en el vector disperso."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def document_vector(text, k1=BM25_K1, b=BM25_B, avg_len=BM25_AVG_DOC_LEN):
+    """
+    Componente de frecuencia de BM25 de cada término del documento. Devuelve
+    (indices, values); el producto escalar con `query_vector` da la puntuación BM25.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    norm = k1 * (1 - b + b * len(tokens) / avg_len)
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        index = term_id(token)
+        weights[index] = weights.get(index, 0.0) + tf * (k1 + 1) / (tf + norm)
+    indices = sorted(weights)
+    return indices, [weights[i] for i in indices]
+
+
+class IDFTable:
+    """Frecuencias de documento del corpus, para ponderar los términos de la consulta."""
+
+    def __init__(self, num_docs=0, df=None):
+        self.num_docs = num_docs
+        self.df = df or {}
+
+    @classmethod
+    def from_texts(cls, texts):
+        df = Counter()
+        num_docs = 0
+        for text in texts:
+            num_docs += 1
+            df.update({term_id(t) for t in tokenize(text)})
+        return cls(num_docs, dict(df))
+
+    def idf(self, index):
+        n = self.df.get(index, 0)
+        return math.log(1 + (self.num_docs - n + 0.5) / (n + 0.5))
+
+    def query_vector(self, text):
+        """Vector disperso de la consulta: IDF de cada término distinto (términos desconocidos fuera)."""
+        indices = sorted({term_id(t) for t in tokenize(text)} & self.df.keys())
+        return indices, [self.idf(i) for i in indices]
+
+    def to_dict(self):
+        return {"num_docs": self.num_docs, "df": {str(k): v for k, v in self.df.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(data.get("num_docs", 0), {int(k): v for k, v in (data.get("df") or {}).items()})
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        write_atomic(path, json.dumps(self.to_dict()))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
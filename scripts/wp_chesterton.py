@@ -4,8 +4,16 @@ from markdownify import markdownify as md
 from bs4 import BeautifulSoup
 import json
 import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+import metrics
+from atomic_file import write_atomic
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -13,70 +21,317 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
-def fetch_wp_items(api_base, endpoint, per_page=25, max_retries=3):
+# WordPress caps per_page at 100
+WP_PER_PAGE = int(os.getenv("WP_PER_PAGE", "100"))
+# Maximum number of page requests in flight at once
+WP_MAX_WORKERS = int(os.getenv("WP_MAX_WORKERS", "4"))
+# Token bucket: sustained requests per second and burst size
+WP_RATE_LIMIT = float(os.getenv("WP_RATE_LIMIT", "4"))
+WP_RATE_BURST = int(os.getenv("WP_RATE_BURST", "4"))
+
+# Incremental sync state (last modified timestamp, known slugs, HTTP validators) per endpoint
+WP_SYNC_STATE = os.getenv("WP_SYNC_STATE", "wp_sync_state.json")
+# Ignore the stored state and fetch/write everything
+WP_FULL_SYNC = os.getenv("WP_FULL_SYNC", "false").lower() in ("1", "true", "yes")
+
+# Worker processes for the HTML -> Markdown conversion (1 = convert in the main process)
+WP_CONVERT_WORKERS = int(os.getenv("WP_CONVERT_WORKERS", str(os.cpu_count() or 1)))
+
+TIMEOUT_CONFIG = (30, 60)
+
+
+class TokenBucket:
     """
-    Fetch all items from a WordPress REST API endpoint, handling pagination robustly.
-    Stops when an empty list of items is returned.
+    Thread-safe token bucket rate limiter. Allows bursts of up to `capacity`
+    requests and refills at `rate` tokens per second.
     """
-    url = f"{api_base.rstrip('/')}/{endpoint}"
-    page = 1
-    all_items = []
 
-    while True:
-        params = {'per_page': per_page, 'page': page}
-        
-        resp = None
-        for attempt in range(max_retries):
-            try:
-                print(f"Fetching {endpoint} page {page} (attempt {attempt + 1}/{max_retries})...")
-                timeout_config = (30, 60)
-                resp = requests.get(url, params=params, timeout=timeout_config, headers=HEADERS)
-                resp.raise_for_status()
-                break
-            except requests.exceptions.RequestException as e:
-                print(f"[WARN] Failed to fetch {endpoint} page {page} (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    print(f"[ERROR] All retries failed for {endpoint} page {page}")
-                    return all_items # Devuelve lo que ha podido recoger
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
-        if resp is None:
-            break # Si todas las peticiones fallaron
+def create_session(max_workers=WP_MAX_WORKERS):
+    """Create a requests.Session whose connection pool is sized for `max_workers` threads."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
-        data = None
+
+def get_with_retries(session, url, params, label, max_retries=3, rate_limiter=None, headers=None):
+    """
+    GET with exponential backoff. Returns the response, or None if every attempt failed.
+    4xx responses other than 429 are returned as-is without retrying.
+    """
+    endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+    for attempt in range(max_retries):
+        if attempt:
+            metrics.incrementar("wp_request_retries", endpoint=endpoint)
+        if rate_limiter:
+            rate_limiter.acquire()
+        start = time.perf_counter()
         try:
-            data = resp.json()
-        except requests.exceptions.JSONDecodeError:
-            print(f"[WARN] Response for '{endpoint}' is not valid JSON. Attempting to clean it...")
-            response_text = resp.text
-            json_start_index = response_text.find('[')
-
-            if json_start_index != -1:
-                clean_json_str = response_text[json_start_index:]
-                try:
-                    data = json.loads(clean_json_str)
-                    print(f"[INFO] Successfully cleaned and parsed JSON for '{endpoint}'.")
-                except json.JSONDecodeError:
-                    print(f"[ERROR] Failed to parse JSON for '{endpoint}' even after cleaning.")
-                    break
-            else:
-                print(f"[ERROR] Could not find start of JSON array ('[') in the response for '{endpoint}'.")
+            print(f"Fetching {label} (attempt {attempt + 1}/{max_retries})...")
+            resp = session.get(url, params=params, timeout=TIMEOUT_CONFIG, headers=headers)
+            metrics.observar("wp_request_seconds", time.perf_counter() - start, endpoint=endpoint, status=resp.status_code)
+            metrics.incrementar("wp_response_bytes", len(resp.content), endpoint=endpoint)
+            if resp.status_code == 429:
+                retry_after = resp.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+                print(f"[WARN] Rate limited on {label}, retrying in {delay}s")
+                if attempt < max_retries - 1:
+                    time.sleep(delay)
+                    continue
+            if 400 <= resp.status_code < 500 and resp.status_code != 429:
+                return resp
+            resp.raise_for_status()
+            return resp
+        except requests.exceptions.RequestException as e:
+            metrics.observar("wp_request_seconds", time.perf_counter() - start, endpoint=endpoint, status="error")
+            print(f"[WARN] Failed to fetch {label} (attempt {attempt + 1}): {e}")
+            if attempt < max_retries - 1:
+                time.sleep(2 ** attempt)
+    print(f"[ERROR] All retries failed for {label}")
+    metrics.incrementar("wp_request_failures", endpoint=endpoint)
+    return None
+
+
+def parse_items(resp, endpoint):
+    """
+    Parse a WordPress list response. Some hosts prepend PHP notices to the JSON body,
+    so fall back to parsing from the first '['. Returns None if nothing usable was found.
+    """
+    try:
+        return resp.json()
+    except requests.exceptions.JSONDecodeError:
+        print(f"[WARN] Response for '{endpoint}' is not valid JSON. Attempting to clean it...")
+        response_text = resp.text
+        json_start_index = response_text.find('[')
+
+        if json_start_index != -1:
+            clean_json_str = response_text[json_start_index:]
+            try:
+                data = json.loads(clean_json_str)
+                print(f"[INFO] Successfully cleaned and parsed JSON for '{endpoint}'.")
+                return data
+            except json.JSONDecodeError:
+                print(f"[ERROR] Failed to parse JSON for '{endpoint}' even after cleaning.")
+        else:
+            print(f"[ERROR] Could not find start of JSON array ('[') in the response for '{endpoint}'.")
+    return None
+
+
+class ConditionalCache:
+    """
+    ETag / Last-Modified validators per request, together with the items they validated,
+    so that a 304 Not Modified can be answered from the previous run. Only entries used
+    during this run are kept in `current`, which is what gets persisted.
+    """
+
+    def __init__(self, previous=None):
+        self.previous = previous or {}
+        self.current = {}
+
+    def headers_for(self, key):
+        entry = self.previous.get(key) or {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def not_modified(self, key):
+        entry = self.previous.get(key)
+        if entry is not None:
+            self.current[key] = entry
+        return entry
+
+    def store(self, key, resp, items):
+        etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.current[key] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'total_pages': resp.headers.get('X-WP-TotalPages'),
+                'items': items,
+            }
+
+
+def iter_wp_pages(api_base, endpoint, per_page=WP_PER_PAGE, max_retries=3, session=None, rate_limiter=None,
+                  max_workers=WP_MAX_WORKERS, params=None, http_cache=None):
+    """
+    Yield (page, items) for every page of a WordPress REST API endpoint, in page order and
+    as soon as each page is available; `items` is None for a page that could not be fetched.
+
+    The first page is fetched on its own to read X-WP-Total / X-WP-TotalPages; the
+    remaining pages are then downloaded concurrently (at most `max_workers` in flight,
+    paced by `rate_limiter`). If the pagination headers are missing, pages are walked one
+    after another until an empty page is returned.
+
+    Extra query `params` (e.g. modified_after, _fields) are sent with every page. With an
+    `http_cache` (ConditionalCache), requests are made conditional on the validators of
+    the previous run and 304 responses reuse the cached items.
+    """
+    url = f"{api_base.rstrip('/')}/{endpoint}"
+    session = session or create_session(max_workers)
+    rate_limiter = rate_limiter or TokenBucket(WP_RATE_LIMIT, WP_RATE_BURST)
+    base_params = dict(params or {}, per_page=per_page)
+
+    def fetch_page(page):
+        """Returns (total_pages header or None, items or None)."""
+        page_params = dict(base_params, page=page)
+        key = f"{endpoint}?{urlencode(sorted(page_params.items()))}"
+        headers = http_cache.headers_for(key) if http_cache else None
+        resp = get_with_retries(session, url, page_params, f"{endpoint} page {page}", max_retries, rate_limiter, headers)
+        if resp is not None and resp.status_code == 304 and http_cache:
+            cached = http_cache.not_modified(key)
+            if cached is not None:
+                print(f"[INFO] {endpoint} page {page} not modified")
+                metrics.incrementar("wp_pages_not_modified", endpoint=endpoint)
+                return cached.get('total_pages'), cached['items']
+        if resp is not None and resp.status_code == 400 and 'rest_post_invalid_page_number' in resp.text:
+            # WordPress answers past the last page with this error: it is the end, not a failure
+            return None, []
+        if resp is None or resp.status_code >= 300:
+            return None, None
+        data = parse_items(resp, endpoint)
+        if not isinstance(data, list):
+            return None, None
+        if http_cache:
+            http_cache.store(key, resp, data)
+        metrics.incrementar("wp_items_fetched", len(data), endpoint=endpoint)
+        return resp.headers.get('X-WP-TotalPages'), data
+
+    total_pages, first_items = fetch_page(1)
+    yield 1, first_items
+    if first_items is None:
+        return
+
+    if total_pages is None or not str(total_pages).isdigit():
+        # Without pagination headers, fall back to walking pages until one comes back empty
+        page = 2
+        items = first_items
+        while items:
+            _, items = fetch_page(page)
+            if items is None:
+                # A failed page is not the end of content: report it so the listing is marked incomplete
+                yield page, None
+                return
+            if not items:
+                print(f"[INFO] Reached the end of content for {endpoint} at page {page}.")
                 break
+            yield page, items
+            page += 1
+        return
+
+    total_pages = int(total_pages)
+    print(f"[INFO] {endpoint}: {total_pages} pages")
+    if total_pages > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map preserves page order
+            pages = range(2, total_pages + 1)
+            for page, (_, items) in zip(pages, executor.map(metrics.vincular(fetch_page), pages)):
+                yield page, items
+
+
+def fetch_wp_pages(api_base, endpoint, per_page=WP_PER_PAGE, max_retries=3, session=None, rate_limiter=None,
+                   max_workers=WP_MAX_WORKERS, params=None, http_cache=None):
+    """
+    Fetch all items from a WordPress REST API endpoint. Returns (items, complete), where
+    `complete` is False if any page could not be fetched. See iter_wp_pages.
+    """
+    all_items = []
+    complete = True
+    for page, items in iter_wp_pages(api_base, endpoint, per_page, max_retries, session, rate_limiter,
+                                     max_workers, params, http_cache):
+        if items is None:
+            if page == 1:
+                return [], False
+            print(f"[ERROR] Skipping {endpoint} page {page}: no usable data")
+            complete = False
+            continue
+        all_items.extend(items)
+        print(f"[INFO] Fetched {len(items)} items from {endpoint} page {page}")
+    return all_items, complete
+
+
+def fetch_wp_items(api_base, endpoint, per_page=WP_PER_PAGE, max_retries=3, session=None, rate_limiter=None,
+                   max_workers=WP_MAX_WORKERS, params=None, http_cache=None):
+    """
+    Fetch all items from a WordPress REST API endpoint, concurrently after the first page.
+    Pages that fail after every retry are skipped; see fetch_wp_pages.
+    """
+    items, _ = fetch_wp_pages(api_base, endpoint, per_page, max_retries, session, rate_limiter,
+                              max_workers, params, http_cache)
+    return items
 
-        # --- LÓGICA MEJORADA ---
-        # Si la API devuelve algo que no es una lista, o una lista vacía, hemos terminado.
-        if not isinstance(data, list) or not data:
-            print(f"[INFO] Reached the end of content for {endpoint} at page {page}.")
-            break
 
-        all_items.extend(data)
-        print(f"[INFO] Fetched {len(data)} items from {endpoint} page {page}")
-        
-        page += 1
-        time.sleep(1) # Pausa entre páginas
+def front_matter_fields(obj):
+    """Front matter fields of a WordPress object dict, in the order they are written."""
+    fields = {}
+    if title := obj.get('title', {}).get('rendered'):
+        fields['title'] = title
+    if slug := obj.get('slug'):
+        fields['slug'] = slug
+    if obj.get('id') is not None:
+        fields['id'] = obj['id']
+    if date := obj.get('date'):
+        fields['date'] = date
+    if modified := obj.get('modified'):
+        fields['modified'] = modified
+    if link := obj.get('link'):
+        fields['url'] = link
+    return fields
 
-    return all_items
+
+def render_front_matter(obj):
+    """Front matter lines (including the --- delimiters) of a WordPress object dict."""
+    lines = ["---"]
+    for key, value in front_matter_fields(obj).items():
+        if key == 'title':
+            safe_title = value.replace('"', '\\"')
+            lines.append(f'title: "{safe_title}"')
+        else:
+            lines.append(f"{key}: {value}")
+    lines.append("---")
+    return lines
+
+
+def render_body(obj):
+    """Convert the rendered HTML content of a WordPress object dict to Markdown."""
+    raw_html = obj.get('content', {}).get('rendered', '')
+    return md(raw_html, heading_style="ATX")
+
+
+def render_markdown(obj, front_matter=True):
+    """
+    Render a WordPress object dict to Markdown text (front matter + converted HTML).
+    Pure function so it can run in worker processes.
+    """
+    lines = render_front_matter(obj) if front_matter else []
+    lines.append(render_body(obj))
+    return "\n".join(lines)
 
 
 def save_markdown(obj, folder, filename=None, front_matter=True):
@@ -86,50 +341,201 @@ def save_markdown(obj, folder, filename=None, front_matter=True):
     os.makedirs(folder, exist_ok=True)
     fname = filename or obj.get('slug') or str(obj.get('id', 'unknown_id'))
     filepath = os.path.join(folder, f"{fname}.md")
+    write_atomic(filepath, render_markdown(obj, front_matter))
 
-    lines = []
-    if front_matter:
-        lines.append("---")
-        if title := obj.get('title', {}).get('rendered'):
-            safe_title = title.replace('"', '\\"')
-            lines.append(f'title: "{safe_title}"')
-        if slug := obj.get('slug'):
-            lines.append(f"slug: {slug}")
-        if obj.get('id') is not None:
-            lines.append(f"id: {obj['id']}")
-        if date := obj.get('date'):
-            lines.append(f"date: {date}")
-        if modified := obj.get('modified'):
-            lines.append(f"modified: {modified}")
-        if link := obj.get('link'):
-            lines.append(f"url: {link}")
-        lines.append("---")
 
-    raw_html = obj.get('content', {}).get('rendered', '')
-    md_content = md(raw_html, heading_style="ATX")
-    lines.append(md_content)
+def convert_items(items, folder, pool=None):
+    """
+    Convert items to Markdown and write them to `folder`. With a process `pool` the
+    CPU-bound HTML -> Markdown conversion runs in parallel while this process writes the
+    results (atomically) as they come back, in order.
+    """
+    if pool is None or len(items) < 2:
+        for item in items:
+            save_markdown(item, folder)
+        return
 
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write("\n".join(lines))
+    os.makedirs(folder, exist_ok=True)
+    chunksize = max(1, len(items) // (WP_CONVERT_WORKERS * 4))
+    for item, text in zip(items, pool.map(render_markdown, items, chunksize=chunksize)):
+        write_atomic(markdown_path(folder, item), text)
 
 
-if __name__ == '__main__':
+def load_sync_state(path=WP_SYNC_STATE):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[WARN] Ignoring unreadable sync state {path}: {e}")
+        return {}
+
+
+def save_sync_state(state, path=WP_SYNC_STATE):
+    write_atomic(path, json.dumps(state, indent=2, sort_keys=True))
+
+
+def markdown_path(folder, obj):
+    """Path save_markdown writes `obj` to."""
+    fname = obj.get('slug') or str(obj.get('id', 'unknown_id'))
+    return os.path.join(folder, f"{fname}.md")
+
+
+def sync_endpoint(api_base, endpoint, folder, endpoint_state, session, rate_limiter, pool=None):
+    """
+    Incrementally sync one endpoint into `folder` and return its new state.
+
+    1. List every item's id/slug/modified with conditional requests (ETag / Last-Modified),
+       which is cheap and usually answered with 304 when nothing changed.
+    2. Fetch full content only for items modified after the last sync (modified_after=),
+       plus any known item whose Markdown file is missing or whose slug changed.
+    3. Remove the Markdown files of items that no longer exist.
+
+    Without previous state (or with WP_FULL_SYNC=1) everything is fetched and written.
+    """
+    known = {} if WP_FULL_SYNC else endpoint_state.get('items', {})
+    http_cache = ConditionalCache(None if WP_FULL_SYNC else endpoint_state.get('http_cache'))
+
+    index, complete = fetch_wp_pages(api_base, endpoint, session=session, rate_limiter=rate_limiter,
+                                     params={'_fields': 'id,slug,modified'}, http_cache=http_cache)
+    if not complete:
+        # A partial listing can't tell deleted items apart from missing pages
+        print(f"[WARN] Incomplete listing for '{endpoint}'; skipping sync to keep the previous state.")
+        return endpoint_state, 0, 0
+    current = {str(item['id']): {'slug': item.get('slug'), 'modified': item.get('modified')} for item in index}
+
+    last_modified = endpoint_state.get('last_modified') if known else None
+    if last_modified:
+        changed, ok = fetch_wp_pages(api_base, endpoint, session=session, rate_limiter=rate_limiter,
+                                     params={'modified_after': last_modified})
+    else:
+        changed, ok = fetch_wp_pages(api_base, endpoint, session=session, rate_limiter=rate_limiter)
+    if not ok:
+        print(f"[WARN] Some changed '{endpoint}' items could not be fetched; they will be retried next run.")
+        return endpoint_state, 0, 0
+
+    # Items not returned by modified_after but still needing a write: new to us (e.g. published
+    # with an older modified date), renamed, or whose Markdown file went missing
+    changed_ids = {str(item['id']) for item in changed}
+    refetch = [
+        item_id for item_id, meta in current.items()
+        if item_id not in changed_ids and (
+            item_id not in known
+            or known[item_id].get('slug') != meta['slug']
+            or not os.path.exists(markdown_path(folder, {'id': item_id, **meta}))
+        )
+    ]
+    for start in range(0, len(refetch), WP_PER_PAGE):
+        extra, ok = fetch_wp_pages(api_base, endpoint, session=session, rate_limiter=rate_limiter,
+                                   params={'include': ','.join(refetch[start:start + WP_PER_PAGE])})
+        if not ok:
+            print(f"[WARN] Could not re-fetch some '{endpoint}' items; they will be retried next run.")
+            return endpoint_state, 0, 0
+        changed.extend(extra)
+
+    with metrics.temporizador("wp_markdown_seconds", endpoint=endpoint):
+        convert_items(changed, folder, pool)
+    metrics.incrementar("wp_items_written", len(changed), endpoint=endpoint)
+
+    # Remove files of deleted items, and the old file of items whose slug changed
+    removed = 0
+    for item_id, meta in known.items():
+        new_meta = current.get(item_id)
+        if new_meta is None or new_meta['slug'] != meta.get('slug'):
+            path = markdown_path(folder, {'id': item_id, **meta})
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+    metrics.incrementar("wp_items_removed", removed, endpoint=endpoint)
+
+    modified_values = [meta['modified'] for meta in current.values() if meta.get('modified')]
+    new_state = {
+        'last_modified': max(modified_values) if modified_values else None,
+        'items': current,
+        'http_cache': http_cache.current,
+    }
+    return new_state, len(changed), removed
+
+
+def iter_wp_records(api_base, endpoint, folder, session=None, rate_limiter=None, pool=None, write_markdown=False):
+    """
+    Yield (content, metadata) for every item of `endpoint`, page by page as the pages arrive,
+    for consumers that index the content directly instead of reading the Markdown files.
+    `metadata` holds the front matter fields plus `filename` / `source_path` (where
+    save_markdown would write the item), i.e. what the indexer gets from the file.
+
+    Always fetches the full content (there is no sync state to compare against). With
+    `write_markdown` the files are also written, as a debugging sink. Raises RuntimeError
+    after the last item if any page could not be fetched, so the consumer can tell a
+    partial listing apart from deleted items.
+    """
+    failed = []
+    for page, items in iter_wp_pages(api_base, endpoint, session=session, rate_limiter=rate_limiter):
+        if items is None:
+            failed.append(page)
+            continue
+        print(f"[INFO] Fetched {len(items)} items from {endpoint} page {page}")
+        with metrics.temporizador("wp_markdown_seconds", endpoint=endpoint):
+            if pool is not None and len(items) > 1:
+                chunksize = max(1, len(items) // (WP_CONVERT_WORKERS * 4))
+                bodies = list(pool.map(render_body, items, chunksize=chunksize))
+            else:
+                bodies = [render_body(item) for item in items]
+        for item, body in zip(items, bodies):
+            path = markdown_path(folder, item)
+            if write_markdown:
+                os.makedirs(folder, exist_ok=True)
+                write_atomic(path, "\n".join(render_front_matter(item) + [body]))
+            metadata = dict(front_matter_fields(item), filename=os.path.basename(path), source_path=path)
+            yield body.strip(), metadata
+    if failed:
+        raise RuntimeError(f"Could not fetch '{endpoint}' pages {failed}")
+
+
+def wp_api_base():
     site_url = os.getenv("WORDPRESS_SITE_URL", "https://chestertons-atomiun.com")
-    api_base = f"{site_url.rstrip('/')}/wp-json/wp/v2"
+    return f"{site_url.rstrip('/')}/wp-json/wp/v2"
+
+
+@metrics.etapa("wp_chesterton")
+def main():
+    api_base = wp_api_base()
 
     endpoints = {
         'posts': 'posts',
         'pages': 'pages',
     }
 
+    # One pooled session and one rate limiter shared by every endpoint, fetched in parallel
+    session = create_session(WP_MAX_WORKERS * len(endpoints))
+    rate_limiter = TokenBucket(WP_RATE_LIMIT, WP_RATE_BURST)
+    state = load_sync_state()
+    # HTML -> Markdown conversion is CPU-bound: one process pool shared by every endpoint.
+    # spawn, not fork: in in-process stage mode this runs alongside other stages' threads
+    pool = None
+    if WP_CONVERT_WORKERS > 1:
+        pool = ProcessPoolExecutor(max_workers=WP_CONVERT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+    print(f"Syncing {', '.join(endpoints)}...")
+    try:
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+            futures = {
+                endpoint: executor.submit(metrics.vincular(sync_endpoint), api_base, endpoint, folder, state.get(endpoint, {}),
+                                          session, rate_limiter, pool)
+                for endpoint, folder in endpoints.items()
+            }
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
     for endpoint, folder in endpoints.items():
-        print(f"Fetching {endpoint}...")
-        items = fetch_wp_items(api_base, endpoint)
-        if items:
-            for item in items:
-                save_markdown(item, folder)
-            print(f"Saved {len(items)} items to ./{folder}/")
-        else:
-            print(f"No items found or failed to fetch for endpoint '{endpoint}'.")
+        state[endpoint], written, removed = futures[endpoint].result()
+        print(f"{endpoint}: {written} items written and {removed} removed in ./{folder}/")
 
+    save_sync_state(state)
     print("All done.")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,33 @@ import requests
 import psycopg2
 import xml.etree.ElementTree as ET
 import json
+import time
+import hashlib
+from collections import namedtuple
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 from datetime import datetime
 from dotenv import load_dotenv
 
+import metrics
+
 # Cargar variables de entorno
 load_dotenv()
 
 # --- CONFIGURACIÓN ---
 XML_URL = os.getenv("XML_URL", "https://atomiunservices.mobiliagestion.es/ExportarInmueblesMobilia/fa557043af982e6b3a5a4e53f86b3724.xml")
 DB_URL = os.getenv("DB_URL")
+# Modo streaming: el XML se parsea a medida que llega por HTTP, sin cargarlo entero en memoria
+XML_STREAMING = os.getenv("XML_STREAMING", "true").lower() in ("1", "true", "yes")
+XML_CHUNK_SIZE = int(os.getenv("XML_CHUNK_SIZE", str(64 * 1024)))
+# Modo de carga: "lotes" (execute_values a tablas staging + merge) o "filas" (una sentencia por fila)
+XML_MODO_CARGA = os.getenv("XML_MODO_CARGA", "lotes").lower()
+XML_BATCH_SIZE = int(os.getenv("XML_BATCH_SIZE", "500"))
+# En el modo "filas", ejecutar los upserts como sentencias preparadas en el servidor (PREPARE/EXECUTE)
+XML_SENTENCIAS_PREPARADAS = os.getenv("XML_SENTENCIAS_PREPARADAS", "true").lower() in ("1", "true", "yes")
+# Modo de sincronización: "incremental" (conserva el esquema y solo escribe lo que ha cambiado)
+# o "completo" (borra y recrea las tablas en cada ejecución)
+XML_MODO_SYNC = os.getenv("XML_MODO_SYNC", "incremental").lower()
 
 # --- FUNCIONES AUXILIARES ---
 
@@ -44,374 +61,873 @@ def obtener_timestamp_safe(elemento, default=None):
     except (ValueError, TypeError):
         return default
 
-def crear_esquema_db(cursor):
-    """Crea las tablas necesarias en la base de datos, borrándolas si ya existen."""
-    print("Borrando tablas antiguas si existen...")
-    cursor.execute("""
-        DROP TABLE IF EXISTS propiedad_caracteristicas CASCADE;
-        DROP TABLE IF EXISTS caracteristicas CASCADE;
-        DROP TABLE IF EXISTS fotos CASCADE;
-        DROP TABLE IF EXISTS propiedades CASCADE;
-        DROP TABLE IF EXISTS propiedades_min CASCADE; 
-    """)
+def conversor_lista_json(etiqueta_hijo, mapear):
+    """
+    Devuelve un conversor que serializa a JSON los hijos `etiqueta_hijo` de una lista de
+    contenedores. Si el contenedor aparece repetido se juntan los hijos de todos, en orden
+    de documento, igual que findall('Contenedor/Hijo').
+    """
+    def convertir(contenedores):
+        if contenedores is None:
+            return None
+        data_list = [mapear(el) for contenedor in contenedores for el in contenedor.findall(etiqueta_hijo)]
+        return json.dumps(data_list) if data_list else None
+    convertir.acumula = True
+    return convertir
+
+def mapear_operacion(op):
+    return {'tipo': obtener_texto_safe(op.find('Tipo')), 'precio': obtener_numeric_safe(op.find('Precio'))}
+
+def mapear_superficie(s):
+    return {'nombre': obtener_texto_safe(s.find('Nombre')), 'superficie': obtener_numeric_safe(s.find('Superficie')), 'altura': obtener_numeric_safe(s.find('Altura')), 'observaciones': obtener_texto_safe(s.find('Observaciones'))}
+
+# --- ESPECIFICACIÓN DE COLUMNAS ---
+# Única fuente de verdad para el DDL, el upsert y la extracción de cada <Inmueble>.
+# (columna, etiqueta XML, tipo SQL, en propiedades_min). El conversor se deduce del tipo
+# salvo que se indique otro; las columnas sin etiqueta se calculan durante la ingesta.
+Columna = namedtuple('Columna', ['nombre', 'etiqueta', 'tipo', 'en_min', 'conversor', 'restriccion'], defaults=(False, None, ''))
+
+CONVERSORES_POR_TIPO = {
+    'TEXT': obtener_texto_safe,
+    'INTEGER': obtener_int_safe,
+    'NUMERIC': obtener_numeric_safe,
+    'BOOLEAN': obtener_bool_safe,
+    'TIMESTAMP WITH TIME ZONE': obtener_timestamp_safe,
+}
+
+COLUMNAS = [
+    # IDs y Referencias
+    Columna('id', 'Id', 'NUMERIC', conversor=obtener_int_safe, restriccion='PRIMARY KEY'),
+    Columna('referencia', 'Referencia', 'TEXT', en_min=True, restriccion='UNIQUE NOT NULL'),
+    Columna('agencia_id', 'AgenciaId', 'TEXT'),
+    Columna('url', 'UrlPublica', 'TEXT', en_min=True),
+
+    # Fechas
+    Columna('fecha_creacion', 'FechaCreacion', 'TIMESTAMP WITH TIME ZONE'),
+    Columna('fecha_publicacion', 'Fecha', 'TIMESTAMP WITH TIME ZONE'),
+    Columna('fecha_modificacion', 'FechaModificacion', 'TIMESTAMP WITH TIME ZONE'),
+
+    # Clasificación del Inmueble
+    Columna('grupo_inmueble', 'GrupoInmueble', 'TEXT', en_min=True),
+    Columna('familia', 'Familia', 'TEXT'),
+    Columna('tipo', 'Tipo', 'TEXT'),
+    Columna('subtipo', 'Subtipo', 'TEXT'),
+    Columna('destacado', 'Destacado', 'BOOLEAN'),
+    Columna('estado', 'Estado', 'TEXT', en_min=True),
+    Columna('uso_inmueble', 'UsoInmueble', 'TEXT'),
+    Columna('ultima_actividad', 'UltimaActividad', 'TEXT'),
+
+    # Descripciones y Títulos
+    Columna('titulo', 'Titulo', 'TEXT', en_min=True),
+    Columna('descripcion', 'Descripcion', 'TEXT', en_min=True),
+    Columna('descripcion_ampliada', 'DescripcionAmpliada', 'TEXT', en_min=True),
+
+    # Operaciones y Datos Financieros
+    Columna('operaciones', 'Operaciones', 'JSONB', en_min=True, conversor=conversor_lista_json('Operacion', mapear_operacion)),
+    Columna('ibi', 'Ibi', 'NUMERIC'),
+    Columna('gastos_comunidad', 'GastosComunidad', 'NUMERIC'),
+
+    # Localización
+    Columna('provincia', 'Provincia', 'TEXT'),
+    Columna('poblacion', 'Poblacion', 'TEXT', en_min=True),
+    Columna('zona', 'Zona', 'TEXT'),
+    Columna('subzona', 'Subzona', 'TEXT'),
+    Columna('urbanizacion', 'Urbanizacion', 'TEXT'),
+    Columna('direccion', 'Direccion', 'TEXT'),
+    Columna('numero', 'Numero', 'TEXT'),
+    Columna('escalera', 'Escalera', 'TEXT'),
+    Columna('planta', 'Planta', 'TEXT'),
+    Columna('letra', 'Letra', 'TEXT'),
+    Columna('codigo_postal', 'CodigoPostal', 'TEXT'),
+    Columna('parcela', 'Parcela', 'TEXT'),
+    Columna('latitud', 'Latitud', 'NUMERIC', en_min=True),
+    Columna('longitud', 'Longitud', 'NUMERIC', en_min=True),
+    Columna('zoom', 'Zoom', 'INTEGER'),
+    Columna('tipo_localizacion', 'TipoLocalizacion', 'INTEGER'),
+    Columna('latitud_zona', 'LatitudZona', 'NUMERIC'),
+    Columna('longitud_zona', 'LongitudZona', 'NUMERIC'),
+    Columna('radio_zona', 'RadioZona', 'NUMERIC'),
+
+    # Dimensiones y Superficies
+    Columna('metros_construidos', 'MetrosConstruidos', 'NUMERIC', en_min=True),
+    Columna('metros_utiles', 'MetrosUtiles', 'NUMERIC', en_min=True),
+    Columna('metros_parcela', 'MetrosParcela', 'NUMERIC', en_min=True),
+    Columna('metros_edificables', 'MetrosEdificables', 'NUMERIC', en_min=True),
+    Columna('metros_oficinas', 'MetrosOficinas', 'NUMERIC', en_min=True),
+    Columna('metros_jardin', 'MetrosJardin', 'NUMERIC'),
+    Columna('metros_terrazas', 'MetrosTerrazas', 'NUMERIC'),
+    Columna('metros_fachada', 'MetrosFachada', 'NUMERIC'),
+    Columna('metros_fachada_secundaria', 'MetrosFachadaSecundaria', 'NUMERIC'),
+    Columna('altura_techo', 'AlturaTecho', 'NUMERIC', en_min=True),
+    Columna('ano_construccion', 'AnoConstruccion', 'INTEGER', en_min=True),
+    Columna('superficies', 'Superficies', 'JSONB', conversor=conversor_lista_json('Superficie', mapear_superficie)),
+
+    # Características numéricas (Conteos)
+    Columna('habitaciones', 'Habitaciones', 'INTEGER'),
+    Columna('banos', 'Banos', 'INTEGER'),
+    Columna('aseos', 'Aseos', 'INTEGER'),
+    Columna('despachos', 'Despachos', 'INTEGER'),
+    Columna('salas_reunion', 'SalasReunion', 'INTEGER'),
+    Columna('sala_descanso', 'SalaDescanso', 'INTEGER'),
+    Columna('cocina', 'Cocina', 'INTEGER'),
+    Columna('comedor', 'Comedor', 'INTEGER'),
+    Columna('plazas_garaje', 'PlazasGaraje', 'INTEGER'),
+    Columna('plazas_parking', 'PlazasParking', 'INTEGER'),
+    Columna('armarios', 'Armarios', 'INTEGER'),
+    Columna('num_terrazas', 'NumTerrazas', 'INTEGER'),
+    Columna('entradas_nave_tir', 'EntradasNaveTir', 'INTEGER'),
+    Columna('plantas_del_edificio', 'PlantasDelEdificio', 'INTEGER'),
+    Columna('chimeneas', 'Chimeneas', 'INTEGER'),
+    Columna('trasteros', 'Trasteros', 'INTEGER'),
+
+    # Características Cualitativas (Texto)
+    Columna('calificacion_suelo', 'CalificacionSuelo', 'TEXT'),
+    Columna('tipo_configuracion', 'TipoConfiguracion', 'TEXT'),
+    Columna('orientacion', 'Orientacion', 'TEXT'),
+    Columna('calificacion_energetica', 'CalificacionEnergetica', 'TEXT'),
+    Columna('consumo', 'Consumo', 'TEXT'),
+    Columna('calificacion_emisiones', 'CalificacionEmisiones', 'TEXT'),
+    Columna('emisiones', 'Emisiones', 'TEXT'),
+    Columna('carpinteria', 'Carpinteria', 'TEXT'),
+    Columna('suelo', 'Suelo', 'TEXT'),
+    Columna('luminoso', 'Luminoso', 'TEXT'),
+    Columna('ruido', 'Ruido', 'TEXT'),
+    Columna('vistas', 'Vistas', 'TEXT'),
+
+    # Características Booleanas (0/1)
+    Columna('en_esquina', 'EnEsquina', 'BOOLEAN'),
+    Columna('interior', 'Interior', 'BOOLEAN'),
+    Columna('exterior', 'Exterior', 'BOOLEAN'),
+    Columna('salida_emergencia', 'SalidaEmergencia', 'BOOLEAN'),
+    Columna('salida_humos', 'SalidaHumos', 'BOOLEAN'),
+    Columna('divisiones', 'Divisiones', 'BOOLEAN'),
+    Columna('vestuarios', 'Vestuarios', 'BOOLEAN'),
+    Columna('escaparate', 'Escaparate', 'BOOLEAN'),
+    Columna('tiene_oficinas', 'TieneOficinas', 'BOOLEAN'),
+    Columna('altillo', 'Altillo', 'BOOLEAN'),
+    Columna('patio', 'Patio', 'BOOLEAN'),
+    Columna('muelle_carga', 'MuelleCarga', 'BOOLEAN'),
+    Columna('cubierta', 'Cubierta', 'BOOLEAN'),
+    Columna('vado', 'Vado', 'BOOLEAN'),
+    Columna('buhardilla', 'Buhardilla', 'BOOLEAN'),
+    Columna('amueblado', 'Amueblado', 'BOOLEAN'),
+    Columna('cocina_amueblada', 'CocinaAmueblada', 'BOOLEAN'),
+    Columna('asfaltado', 'Asfaltado', 'BOOLEAN'),
+    Columna('alumbrado', 'Alumbrado', 'BOOLEAN'),
+    Columna('vallado', 'Vallado', 'BOOLEAN'),
+    Columna('urbanizado', 'Urbanizado', 'BOOLEAN'),
+    Columna('acometidas', 'Acometidas', 'BOOLEAN'),
+    Columna('aire_acondicionado', 'AireAcondicionado', 'BOOLEAN'),
+    Columna('luz', 'Luz', 'BOOLEAN'),
+    Columna('gas', 'Gas', 'BOOLEAN'),
+    Columna('agua', 'Agua', 'BOOLEAN'),
+    Columna('telefono', 'Telefono', 'BOOLEAN'),
+    Columna('internet', 'Internet', 'BOOLEAN'),
+    Columna('intranet', 'Intranet', 'BOOLEAN'),
+    Columna('tratamiento_ignifugo', 'TratamientoIgnifugo', 'BOOLEAN'),
+    Columna('sistema_antiincendios', 'SistemaAntiincendios', 'BOOLEAN'),
+    Columna('camara_frigorifica', 'CamaraFrigorifica', 'BOOLEAN'),
+    Columna('pozo', 'Pozo', 'BOOLEAN'),
+    Columna('piscina_privada', 'PiscinaPrivada', 'BOOLEAN'),
+    Columna('piscina_comunitaria', 'PiscinaComunitaria', 'BOOLEAN'),
+    Columna('zonas_comunes', 'ZonasComunes', 'BOOLEAN'),
+    Columna('zona_infantil', 'ZonaInfantil', 'BOOLEAN'),
+    Columna('zonas_verdes', 'ZonasVerdes', 'BOOLEAN'),
+    Columna('pista_multiusos', 'PistaMultiusos', 'BOOLEAN'),
+    Columna('gimnasio', 'Gimnasio', 'BOOLEAN'),
+    Columna('pista_padel', 'PistaPadel', 'BOOLEAN'),
+    Columna('pista_tenis', 'PistaTenis', 'BOOLEAN'),
+    Columna('bodega', 'Bodega', 'BOOLEAN'),
+    Columna('barbacoa', 'Barbacoa', 'BOOLEAN'),
+    Columna('solarium', 'Solarium', 'BOOLEAN'),
+    Columna('lavadero', 'Lavadero', 'BOOLEAN'),
+    Columna('alarma', 'Alarma', 'BOOLEAN'),
+    Columna('alarma_perimetral', 'AlarmaPerimetral', 'BOOLEAN'),
+    Columna('cerrado', 'Cerrado', 'BOOLEAN'),
+    Columna('puerta_blindad', 'PuertaBlindad', 'BOOLEAN'),
+    Columna('caja_fuerte', 'CajaFuerte', 'BOOLEAN'),
+    Columna('conserje', 'Conserje', 'BOOLEAN'),
+    Columna('vigilancia_24h', 'Vigilancia24h', 'BOOLEAN'),
+    Columna('rejas', 'Rejas', 'BOOLEAN'),
+    Columna('adaptado', 'Adaptado', 'BOOLEAN'),
+    Columna('acceso_discapacitados', 'AccesoDiscapacitados', 'BOOLEAN'),
+    Columna('admite_mascotas', 'AdmiteMascotas', 'BOOLEAN'),
+    Columna('ascensor', 'Ascensor', 'BOOLEAN'),
+    Columna('montacargas', 'Montacargas', 'BOOLEAN'),
+    Columna('puente_grua', 'PuenteGrua', 'BOOLEAN'),
+    Columna('bascula', 'Bascula', 'BOOLEAN'),
+    Columna('primera_linea_playa', 'PrimeraLineaPlaya', 'BOOLEAN'),
+    Columna('segunda_linea_playa', 'SegundaLineaPlaya', 'BOOLEAN'),
+
+    # Contenido Multimedia y otros (JSONB)
+    Columna('grupos', 'Grupos', 'JSONB', conversor=conversor_lista_json('Grupo', obtener_texto_safe)),
+    Columna('fotos360', 'Fotos360', 'JSONB', conversor=conversor_lista_json('Foto360', obtener_texto_safe)),
+    Columna('videos', 'Videos', 'JSONB', conversor=conversor_lista_json('Video', obtener_texto_safe)),
+    Columna('archivos', 'Archivos', 'JSONB', conversor=conversor_lista_json('Archivo', obtener_texto_safe)),
+
+    # Campos para completitud (posiblemente vacíos)
+    Columna('cuentas', 'Cuentas', 'TEXT'),
+    Columna('mandatos', 'Mandatos', 'TEXT'),
+
+    # Derivadas para consultas por precio y zona (calculadas, ver calcular_derivadas)
+    Columna('precio_venta', None, 'NUMERIC'),
+    Columna('precio_alquiler', None, 'NUMERIC'),
+    Columna('geohash', None, 'TEXT'),
+    Columna('ubicacion', None, 'POINT'),
+    # Características booleanas empaquetadas en un entero (bit i = CARACTERISTICAS[i])
+    Columna('caracteristicas_bits', None, 'BIGINT'),
+
+    # Control de sincronización incremental (calculado, no viene del XML)
+    Columna('hash_contenido', None, 'TEXT'),
+]
+
+COLUMNAS_PROPIEDADES = [c.nombre for c in COLUMNAS]
+COLUMNAS_MIN = [c.nombre for c in COLUMNAS if c.en_min]
+
+# etiqueta XML -> (columna, conversor), para extraer todos los campos en una sola pasada
+CONVERSORES_POR_ETIQUETA = {
+    c.etiqueta: (c.nombre, c.conversor or CONVERSORES_POR_TIPO[c.tipo]) for c in COLUMNAS if c.etiqueta
+}
+# Etiquetas contenedoras de listas: se convierten todas sus apariciones, no solo la primera
+ETIQUETAS_ACUMULADAS = {etiqueta for etiqueta, (_, conversor) in CONVERSORES_POR_ETIQUETA.items() if getattr(conversor, 'acumula', False)}
+# Valor de cada columna cuando su etiqueta no aparece en el inmueble
+VALORES_AUSENTES = {
+    c.nombre: (c.conversor or CONVERSORES_POR_TIPO[c.tipo])(None) if c.etiqueta else None for c in COLUMNAS
+}
+
+# Características (columnas BOOLEAN salvo `destacado`) en el orden de la especificación: su posición
+# es el id en la tabla `caracteristicas` y el bit en `caracteristicas_bits`. Si cambia el orden, el
+# hash de contenido cambia también y la siguiente sincronización recalcula todos los inmuebles.
+CARACTERISTICAS = [c for c in COLUMNAS if c.tipo == 'BOOLEAN' and c.nombre != 'destacado']
+# El bit de signo de BIGINT no se usa
+assert len(CARACTERISTICAS) <= 63, "caracteristicas_bits solo admite 63 características"
+
+# Índices de consulta (ver propiedades_query.py). Los de precio son parciales: los inmuebles
+# sin esa operación no ocupan espacio y cualquier filtro por rango ya implica NOT NULL.
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS propiedades_precio_venta_idx ON propiedades (precio_venta) WHERE precio_venta IS NOT NULL;",
+    "CREATE INDEX IF NOT EXISTS propiedades_precio_alquiler_idx ON propiedades (precio_alquiler) WHERE precio_alquiler IS NOT NULL;",
+    "CREATE INDEX IF NOT EXISTS propiedades_ubicacion_idx ON propiedades USING gist (ubicacion);",
+    "CREATE INDEX IF NOT EXISTS propiedades_geohash_idx ON propiedades (geohash text_pattern_ops);",
+    # Filtro por características: inmuebles de cada característica pedida, con un index-only scan
+    "CREATE INDEX IF NOT EXISTS propiedad_caracteristicas_caracteristica_idx ON propiedad_caracteristicas (caracteristica_id, propiedad_referencia);",
+    # Versiones anteriores indexaban caracteristicas_bits, pero bits & máscara no puede usar un B-tree
+    "DROP INDEX IF EXISTS propiedades_caracteristicas_bits_idx;",
+]
+
+GEOHASH_ALFABETO = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5 m
+
+def codificar_geohash(latitud, longitud, precision=GEOHASH_PRECISION):
+    """Geohash estándar (base 32) de unas coordenadas."""
+    rango_lat, rango_lon = [-90.0, 90.0], [-180.0, 180.0]
+    resultado = []
+    bits = valor = 0
+    par = True
+    while len(resultado) < precision:
+        rango, coordenada = (rango_lon, longitud) if par else (rango_lat, latitud)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coordenada >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        par = not par
+        bits += 1
+        if bits == 5:
+            resultado.append(GEOHASH_ALFABETO[valor])
+            bits = valor = 0
+    return "".join(resultado)
+
+def precio_operacion(operaciones, tipo):
+    """
+    Precio más bajo de las operaciones de `tipo` ('venta', 'alquiler'); None si no hay.
+    Da valor a las columnas derivadas precio_venta y precio_alquiler de `propiedades`, y
+    propiedades_qdrant lo usa para los mismos campos del payload.
+    """
+    precios = [op.get('precio') for op in operaciones or [] if (op.get('tipo') or '').lower() == tipo]
+    precios = [p for p in precios if p]
+    return min(precios) if precios else None
+
+def empaquetar_caracteristicas(propiedad_data):
+    """Entero con el bit i activo si el inmueble tiene CARACTERISTICAS[i]."""
+    return sum(1 << i for i, c in enumerate(CARACTERISTICAS) if propiedad_data[c.nombre])
+
+def calcular_derivadas(propiedad_data):
+    """
+    Rellena las columnas derivadas: precios por operación a partir del JSON de operaciones,
+    geohash/punto a partir de latitud y longitud (0,0 = sin coordenadas en el feed) y el
+    entero de características.
+    """
+    operaciones = json.loads(propiedad_data['operaciones']) if propiedad_data['operaciones'] else []
+    propiedad_data['precio_venta'] = precio_operacion(operaciones, 'venta')
+    propiedad_data['precio_alquiler'] = precio_operacion(operaciones, 'alquiler')
 
-    print("Creando nuevas tablas...")
-    # --- MODIFICADO: Esquema definitivo con TODOS los campos ---
+    latitud, longitud = propiedad_data['latitud'], propiedad_data['longitud']
+    if latitud and longitud and -90 <= latitud <= 90 and -180 <= longitud <= 180:
+        propiedad_data['geohash'] = codificar_geohash(latitud, longitud)
+        # Los puntos de PostgreSQL son (x, y) = (longitud, latitud)
+        propiedad_data['ubicacion'] = f"({longitud},{latitud})"
+    else:
+        propiedad_data['geohash'] = None
+        propiedad_data['ubicacion'] = None
+
+    propiedad_data['caracteristicas_bits'] = empaquetar_caracteristicas(propiedad_data)
+    return propiedad_data
+
+def ddl_columnas(columnas, restricciones):
+    return sql.SQL(',\n').join(
+        sql.SQL("{} {}{}").format(
+            sql.Identifier(c.nombre), sql.SQL(c.tipo),
+            sql.SQL(' ' + restricciones[c.nombre]) if restricciones.get(c.nombre) else sql.SQL('')
+        )
+        for c in columnas
+    )
+
+def crear_esquema_db(cursor, recrear=True):
+    """
+    Crea las tablas necesarias en la base de datos. Con `recrear=True` las borra
+    antes si ya existen; si no, conserva las existentes y sus datos.
+    """
+    if recrear:
+        print("Borrando tablas antiguas si existen...")
+        cursor.execute("""
+            DROP TABLE IF EXISTS propiedad_caracteristicas CASCADE;
+            DROP TABLE IF EXISTS caracteristicas CASCADE;
+            DROP TABLE IF EXISTS fotos CASCADE;
+            DROP TABLE IF EXISTS propiedades CASCADE;
+            DROP TABLE IF EXISTS propiedades_min CASCADE; 
+        """)
+
+    print("Creando tablas (si no existen)...")
+    restricciones = {c.nombre: c.restriccion for c in COLUMNAS if c.restriccion}
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS propiedades (\n{}\n);").format(ddl_columnas(COLUMNAS, restricciones)))
     cursor.execute("""
-        CREATE TABLE propiedades (
-            -- IDs y Referencias
-            id NUMERIC PRIMARY KEY,
-            referencia TEXT UNIQUE NOT NULL,
-            agencia_id TEXT,
-            url TEXT,
-
-            -- Fechas
-            fecha_creacion TIMESTAMP WITH TIME ZONE,
-            fecha_publicacion TIMESTAMP WITH TIME ZONE, -- <-- AÑADIDO (para <Fecha>)
-            fecha_modificacion TIMESTAMP WITH TIME ZONE,
-            
-            -- Clasificación del Inmueble
-            grupo_inmueble TEXT,
-            familia TEXT,
-            tipo TEXT,
-            subtipo TEXT,
-            destacado BOOLEAN,
-            estado TEXT,
-            uso_inmueble TEXT,
-            ultima_actividad TEXT,
-            
-            -- Descripciones y Títulos
-            titulo TEXT,
-            descripcion TEXT,
-            descripcion_ampliada TEXT,
-            
-            -- Operaciones y Datos Financieros
-            operaciones JSONB,
-            ibi NUMERIC,
-            gastos_comunidad NUMERIC,
-            
-            -- Localización
-            provincia TEXT,
-            poblacion TEXT,
-            zona TEXT,
-            subzona TEXT,
-            urbanizacion TEXT,
-            direccion TEXT,
-            numero TEXT,
-            escalera TEXT,
-            planta TEXT,
-            letra TEXT,
-            codigo_postal TEXT,
-            parcela TEXT,
-            latitud NUMERIC,
-            longitud NUMERIC,
-            zoom INTEGER,
-            tipo_localizacion INTEGER,          -- <-- AÑADIDO
-            latitud_zona NUMERIC,               -- <-- AÑADIDO
-            longitud_zona NUMERIC,              -- <-- AÑADIDO
-            radio_zona NUMERIC,                 -- <-- AÑADIDO
-            
-            -- Dimensiones y Superficies
-            metros_construidos NUMERIC,
-            metros_utiles NUMERIC,
-            metros_parcela NUMERIC,
-            metros_edificables NUMERIC,
-            metros_oficinas NUMERIC,
-            metros_jardin NUMERIC,
-            metros_terrazas NUMERIC,
-            metros_fachada NUMERIC,
-            metros_fachada_secundaria NUMERIC,
-            altura_techo NUMERIC,
-            ano_construccion INTEGER,
-            superficies JSONB,
-            
-            -- Características numéricas (Conteos)
-            habitaciones INTEGER,
-            banos INTEGER,
-            aseos INTEGER,
-            despachos INTEGER,
-            salas_reunion INTEGER,
-            sala_descanso INTEGER,              -- <-- AÑADIDO
-            cocina INTEGER,                     -- <-- AÑADIDO
-            comedor INTEGER,                    -- <-- AÑADIDO
-            plazas_garaje INTEGER,
-            plazas_parking INTEGER,
-            armarios INTEGER,
-            num_terrazas INTEGER,
-            entradas_nave_tir INTEGER,
-            plantas_del_edificio INTEGER,
-            chimeneas INTEGER,                  -- <-- AÑADIDO
-            trasteros INTEGER,
-            
-            -- Características Cualitativas (Texto)
-            calificacion_suelo TEXT,
-            tipo_configuracion TEXT,            -- <-- AÑADIDO
-            orientacion TEXT,
-            calificacion_energetica TEXT,
-            consumo TEXT,
-            calificacion_emisiones TEXT,
-            emisiones TEXT,
-            carpinteria TEXT,
-            suelo TEXT,
-            luminoso TEXT,                      -- <-- AÑADIDO
-            ruido TEXT,                         -- <-- AÑADIDO
-            vistas TEXT,                        -- <-- AÑADIDO
-
-            -- Características Booleanas (0/1)
-            en_esquina BOOLEAN,
-            interior BOOLEAN,
-            exterior BOOLEAN,
-            salida_emergencia BOOLEAN,
-            salida_humos BOOLEAN,
-            divisiones BOOLEAN,
-            vestuarios BOOLEAN,
-            escaparate BOOLEAN,
-            tiene_oficinas BOOLEAN,
-            altillo BOOLEAN,
-            patio BOOLEAN,
-            muelle_carga BOOLEAN,
-            cubierta BOOLEAN,
-            vado BOOLEAN,
-            buhardilla BOOLEAN,
-            amueblado BOOLEAN,
-            cocina_amueblada BOOLEAN,
-            asfaltado BOOLEAN,
-            alumbrado BOOLEAN,
-            vallado BOOLEAN,
-            urbanizado BOOLEAN,
-            acometidas BOOLEAN,                 -- <-- AÑADIDO
-            aire_acondicionado BOOLEAN,         -- <-- AÑADIDO
-            luz BOOLEAN,
-            gas BOOLEAN,
-            agua BOOLEAN,
-            telefono BOOLEAN,
-            internet BOOLEAN,
-            intranet BOOLEAN,                   -- <-- AÑADIDO
-            tratamiento_ignifugo BOOLEAN,       -- <-- AÑADIDO
-            sistema_antiincendios BOOLEAN,
-            camara_frigorifica BOOLEAN,
-            pozo BOOLEAN,                       -- <-- AÑADIDO
-            piscina_privada BOOLEAN,
-            piscina_comunitaria BOOLEAN,
-            zonas_comunes BOOLEAN,              -- <-- AÑADIDO
-            zona_infantil BOOLEAN,              -- <-- AÑADIDO
-            zonas_verdes BOOLEAN,               -- <-- AÑADIDO
-            pista_multiusos BOOLEAN,            -- <-- AÑADIDO
-            gimnasio BOOLEAN,                   -- <-- AÑADIDO
-            pista_padel BOOLEAN,                -- <-- AÑADIDO
-            pista_tenis BOOLEAN,                -- <-- AÑADIDO
-            bodega BOOLEAN,                     -- <-- AÑADIDO
-            barbacoa BOOLEAN,                   -- <-- AÑADIDO
-            solarium BOOLEAN,                   -- <-- AÑADIDO
-            lavadero BOOLEAN,                   -- <-- AÑADIDO
-            alarma BOOLEAN,
-            alarma_perimetral BOOLEAN,          -- <-- AÑADIDO
-            cerrado BOOLEAN,                    -- <-- AÑADIDO
-            puerta_blindad BOOLEAN,             -- <-- AÑADIDO (respeta la errata del XML)
-            caja_fuerte BOOLEAN,                -- <-- AÑADIDO
-            conserje BOOLEAN,                   -- <-- AÑADIDO
-            vigilancia_24h BOOLEAN,
-            rejas BOOLEAN,                      -- <-- AÑADIDO
-            adaptado BOOLEAN,                   -- <-- AÑADIDO
-            acceso_discapacitados BOOLEAN,
-            admite_mascotas BOOLEAN,            -- <-- AÑADIDO
-            ascensor BOOLEAN,
-            montacargas BOOLEAN,
-            puente_grua BOOLEAN,
-            bascula BOOLEAN,                    -- <-- AÑADIDO
-            primera_linea_playa BOOLEAN,        -- <-- AÑADIDO
-            segunda_linea_playa BOOLEAN,        -- <-- AÑADIDO
-            
-            -- Contenido Multimedia y otros (JSONB)
-            grupos JSONB,
-            fotos360 JSONB,                     -- <-- AÑADIDO
-            videos JSONB,                       -- <-- AÑADIDO
-            archivos JSONB,                     -- <-- AÑADIDO
-            
-            -- Campos para completitud (posiblemente vacíos)
-            cuentas TEXT,                       -- <-- AÑADIDO
-            mandatos TEXT                       -- <-- AÑADIDO
-        );
-        
-        CREATE TABLE fotos (
+        CREATE TABLE IF NOT EXISTS fotos (
             id SERIAL PRIMARY KEY,
             propiedad_referencia TEXT NOT NULL REFERENCES propiedades(referencia) ON DELETE CASCADE,
             url_foto TEXT,
             orden INTEGER
         );
+        CREATE TABLE IF NOT EXISTS caracteristicas (
+            id SMALLINT PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            etiqueta TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS propiedad_caracteristicas (
+            propiedad_referencia TEXT NOT NULL REFERENCES propiedades(referencia) ON DELETE CASCADE,
+            caracteristica_id SMALLINT NOT NULL REFERENCES caracteristicas(id),
+            PRIMARY KEY (propiedad_referencia, caracteristica_id)
+        );
     """)
+    # Catálogo de características: id = posición del bit en caracteristicas_bits
+    execute_values(cursor, """
+        INSERT INTO caracteristicas (id, nombre, etiqueta) VALUES %s
+        ON CONFLICT (id) DO UPDATE SET nombre = EXCLUDED.nombre, etiqueta = EXCLUDED.etiqueta;
+    """, [(i, c.nombre, c.etiqueta) for i, c in enumerate(CARACTERISTICAS)])
 
     print("Creando tabla minimalista 'propiedades_min'...")
-    cursor.execute("""
-        CREATE TABLE propiedades_min (
-            referencia TEXT PRIMARY KEY,
-            url TEXT,
-            titulo TEXT,
-            descripcion TEXT,
-            descripcion_ampliada TEXT,
-            estado TEXT,
-            operaciones JSONB,
-            altura_techo NUMERIC,
-            metros_parcela NUMERIC,
-            metros_utiles NUMERIC,
-            metros_edificables NUMERIC,
-            metros_construidos NUMERIC,
-            metros_oficinas NUMERIC,
-            grupo_inmueble TEXT,
-            latitud NUMERIC,
-            longitud NUMERIC,
-            poblacion TEXT,
-            ano_construccion INTEGER
-        );
-    """)
+    columnas_min = [c for c in COLUMNAS if c.en_min]
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS propiedades_min (\n{}\n);").format(ddl_columnas(columnas_min, {'referencia': 'PRIMARY KEY'})))
     print("Tabla 'propiedades_min' creada.")
 
+    # Tablas creadas por versiones anteriores del script: añadir las columnas nuevas de la especificación
+    for tabla, columnas in (('propiedades', COLUMNAS), ('propiedades_min', columnas_min)):
+        cursor.execute(sql.SQL("ALTER TABLE {} {};").format(
+            sql.Identifier(tabla),
+            sql.SQL(', ').join(
+                sql.SQL("ADD COLUMN IF NOT EXISTS {} {}").format(sql.Identifier(c.nombre), sql.SQL(c.tipo))
+                for c in columnas if not c.restriccion and c.nombre != 'referencia'
+            )
+        ))
+
+    for indice in INDICES:
+        cursor.execute(indice)
+
     print("Esquema de base de datos creado exitosamente.")
 
 
-def procesar_xml_e_insertar(cursor, xml_content):
+def extraer_inmueble(inmueble):
+    """
+    Extrae todos los campos escalares y JSON de un <Inmueble> en una sola pasada por sus hijos,
+    y calcula las columnas derivadas. Si una etiqueta escalar aparece repetida se usa la primera,
+    igual que con Element.find; los contenedores de listas repetidos se juntan.
+    """
+    propiedad_data = dict(VALORES_AUSENTES)
+    contenedores = {}
+    # Recorriendo en orden inverso, la primera aparición de cada etiqueta es la que queda escrita
+    for hijo in reversed(inmueble):
+        entrada = CONVERSORES_POR_ETIQUETA.get(hijo.tag)
+        if entrada is None:
+            continue
+        if hijo.tag in ETIQUETAS_ACUMULADAS:
+            contenedores.setdefault(hijo.tag, []).append(hijo)
+        else:
+            columna, conversor = entrada
+            propiedad_data[columna] = conversor(hijo)
+    for etiqueta, elementos in contenedores.items():
+        columna, conversor = CONVERSORES_POR_ETIQUETA[etiqueta]
+        propiedad_data[columna] = conversor(elementos[::-1])
+    return calcular_derivadas(propiedad_data)
+
+
+def calcular_hash_contenido(propiedad_data, fotos):
+    """Huella SHA-256 del contenido de un inmueble (datos y fotos) para detectar cambios."""
+    contenido = json.dumps({'propiedad': propiedad_data, 'fotos': fotos}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def cargar_hashes_existentes(cursor):
+    """Devuelve {referencia: hash_contenido} de los inmuebles ya guardados."""
+    cursor.execute("SELECT referencia, hash_contenido FROM propiedades;")
+    return dict(cursor.fetchall())
+
+
+def eliminar_ausentes(cursor, referencias):
+    """Borra los inmuebles que ya no aparecen en el feed (las fotos se borran en cascada)."""
+    if not referencias:
+        return 0
+    referencias = list(referencias)
+    cursor.execute("DELETE FROM propiedades_min WHERE referencia = ANY(%s);", (referencias,))
+    cursor.execute("DELETE FROM propiedades WHERE referencia = ANY(%s);", (referencias,))
+    return len(referencias)
+
+
+def sincronizar_caracteristicas(cursor, referencias):
+    """Rehace las filas de propiedad_caracteristicas de `referencias` a partir de caracteristicas_bits."""
+    referencias = list(referencias)
+    cursor.execute("DELETE FROM propiedad_caracteristicas WHERE propiedad_referencia = ANY(%s);", (referencias,))
+    cursor.execute("""
+        INSERT INTO propiedad_caracteristicas (propiedad_referencia, caracteristica_id)
+        SELECT p.referencia, c.id
+        FROM propiedades p JOIN caracteristicas c ON p.caracteristicas_bits & (1::bigint << c.id) <> 0
+        WHERE p.referencia = ANY(%s);
+    """, (referencias,))
+
+
+def sql_upsert(tabla, columnas, origen=None):
+    """
+    Compone un INSERT ... ON CONFLICT (referencia) DO UPDATE para `tabla`.
+    Si se indica `origen`, las filas se toman de esa tabla (INSERT ... SELECT) en lugar de VALUES.
+    """
+    lista_columnas = sql.SQL(', ').join(map(sql.Identifier, columnas))
+    updates = sql.SQL(', ').join([sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(k), sql.Identifier(k)) for k in columnas if k != 'referencia'])
+    if origen is None:
+        valores = sql.SQL("VALUES ({})").format(sql.SQL(', ').join(map(sql.Placeholder, columnas)))
+    else:
+        valores = sql.SQL("SELECT {} FROM {}").format(lista_columnas, sql.Identifier(origen))
+    return sql.SQL("INSERT INTO {} ({}) {} ON CONFLICT (referencia) DO UPDATE SET {}").format(
+        sql.Identifier(tabla), lista_columnas, valores, updates
+    )
+
+
+class EscritorFilas:
+    """
+    Escribe cada inmueble con sentencias individuales: una ida y vuelta por fila y por foto.
+    Las características se sincronizan por grupos de `tamano_lote` inmuebles, como en el modo por lotes.
+    """
+
+    def __init__(self, cursor, tamano_lote=XML_BATCH_SIZE):
+        self.cursor = cursor
+        self.tamano_lote = max(1, tamano_lote)
+        self.pendientes_caracteristicas = []
+        # Se renderizan una sola vez por ejecución en lugar de componerse en cada fila
+        self.sql_propiedades = sql_upsert('propiedades', COLUMNAS_PROPIEDADES).as_string(cursor)
+        self.sql_propiedades_min = sql_upsert('propiedades_min', COLUMNAS_MIN).as_string(cursor)
+
+    def _anotar_caracteristicas(self, ref):
+        self.pendientes_caracteristicas.append(ref)
+        if len(self.pendientes_caracteristicas) >= self.tamano_lote:
+            self._sincronizar_caracteristicas()
+
+    def _sincronizar_caracteristicas(self):
+        if self.pendientes_caracteristicas:
+            sincronizar_caracteristicas(self.cursor, self.pendientes_caracteristicas)
+            self.pendientes_caracteristicas = []
+
+    def escribir(self, propiedad_data, propiedad_min_data, fotos):
+        self.cursor.execute(self.sql_propiedades, propiedad_data)
+        self.cursor.execute(self.sql_propiedades_min, propiedad_min_data)
+        self._anotar_caracteristicas(propiedad_data['referencia'])
+
+        # Las fotos solo se reemplazan si el inmueble trae el bloque <Fotos>
+        if fotos is not None:
+            ref = propiedad_data['referencia']
+            self.cursor.execute("DELETE FROM fotos WHERE propiedad_referencia = %s;", (ref,))
+            for orden, url_foto in enumerate(fotos):
+                self.cursor.execute("INSERT INTO fotos (propiedad_referencia, url_foto, orden) VALUES (%s, %s, %s);", (ref, url_foto, orden))
+
+    def cerrar(self):
+        self._sincronizar_caracteristicas()
+
+
+def sql_prepare_upsert(nombre, tabla, columnas):
+    """
+    Compone un PREPARE del upsert de `tabla` con parámetros posicionales tipados
+    según la especificación, para que el servidor lo planifique una sola vez por sesión.
+    """
+    tipos = sql.SQL(', ').join(sql.SQL(c.tipo) for c in columnas)
+    nombres = [c.nombre for c in columnas]
+    lista_columnas = sql.SQL(', ').join(map(sql.Identifier, nombres))
+    parametros = sql.SQL(', ').join(sql.SQL(f"${i}") for i in range(1, len(columnas) + 1))
+    updates = sql.SQL(', ').join([sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(k), sql.Identifier(k)) for k in nombres if k != 'referencia'])
+    return sql.SQL("PREPARE {} ({}) AS INSERT INTO {} ({}) VALUES ({}) ON CONFLICT (referencia) DO UPDATE SET {}").format(
+        sql.Identifier(nombre), tipos, sql.Identifier(tabla), lista_columnas, parametros, updates
+    )
+
+
+def sql_execute(nombre, num_parametros):
+    return sql.SQL("EXECUTE {} ({})").format(
+        sql.Identifier(nombre), sql.SQL(', ').join([sql.Placeholder()] * num_parametros)
+    )
+
+
+class EscritorFilasPreparadas(EscritorFilas):
+    """
+    Variante del modo por filas que ejecuta los upserts mediante sentencias preparadas
+    en el servidor (PREPARE una vez, EXECUTE por fila): ni se recompone el SQL en Python
+    ni el servidor vuelve a parsear y planificar la sentencia en cada inmueble.
+    """
+
+    SENTENCIAS = ('upsert_propiedades', 'upsert_propiedades_min', 'insert_foto')
+
+    def __init__(self, cursor, tamano_lote=XML_BATCH_SIZE):
+        super().__init__(cursor, tamano_lote)
+        columnas_min = [c for c in COLUMNAS if c.en_min]
+        cursor.execute(sql_prepare_upsert('upsert_propiedades', 'propiedades', COLUMNAS))
+        cursor.execute(sql_prepare_upsert('upsert_propiedades_min', 'propiedades_min', columnas_min))
+        cursor.execute("PREPARE insert_foto (TEXT, TEXT, INTEGER) AS INSERT INTO fotos (propiedad_referencia, url_foto, orden) VALUES ($1, $2, $3);")
+        # Sustituyen a los upserts de la clase base; por fila solo se interpolan los valores
+        self.sql_propiedades = sql_execute('upsert_propiedades', len(COLUMNAS_PROPIEDADES)).as_string(cursor)
+        self.sql_propiedades_min = sql_execute('upsert_propiedades_min', len(COLUMNAS_MIN)).as_string(cursor)
+
+    def escribir(self, propiedad_data, propiedad_min_data, fotos):
+        self.cursor.execute(self.sql_propiedades, [propiedad_data[c] for c in COLUMNAS_PROPIEDADES])
+        self.cursor.execute(self.sql_propiedades_min, [propiedad_min_data[c] for c in COLUMNAS_MIN])
+        self._anotar_caracteristicas(propiedad_data['referencia'])
+
+        if fotos is not None:
+            ref = propiedad_data['referencia']
+            self.cursor.execute("DELETE FROM fotos WHERE propiedad_referencia = %s;", (ref,))
+            for orden, url_foto in enumerate(fotos):
+                self.cursor.execute("EXECUTE insert_foto (%s, %s, %s);", (ref, url_foto, orden))
+
+    def cerrar(self):
+        super().cerrar()
+        for nombre in self.SENTENCIAS:
+            self.cursor.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(nombre)))
+
+
+class CargadorLotes:
+    """
+    Acumula inmuebles en memoria y los vuelca por lotes: las filas se cargan con
+    execute_values en tablas staging temporales y se fusionan con las tablas reales
+    mediante un único INSERT ... SELECT ... ON CONFLICT por tabla y lote.
+    """
+
+    def __init__(self, cursor, tamano_lote=XML_BATCH_SIZE):
+        self.cursor = cursor
+        self.tamano_lote = max(1, tamano_lote)
+        # Indexados por referencia: si un inmueble se repite en el lote gana la última versión,
+        # igual que con el modo por filas (y evita que ON CONFLICT afecte dos veces a la misma fila).
+        self.propiedades = {}
+        self.propiedades_min = {}
+        self.fotos = {}
+        self.staging_creado = False
+        self.lotes_volcados = 0
+        self.sql_merge_propiedades = sql_upsert('propiedades', COLUMNAS_PROPIEDADES, origen='staging_propiedades')
+        self.sql_merge_propiedades_min = sql_upsert('propiedades_min', COLUMNAS_MIN, origen='staging_propiedades_min')
+
+    def _crear_staging(self):
+        self.cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS staging_propiedades (LIKE propiedades INCLUDING DEFAULTS);
+            CREATE TEMP TABLE IF NOT EXISTS staging_propiedades_min (LIKE propiedades_min INCLUDING DEFAULTS);
+            CREATE TEMP TABLE IF NOT EXISTS staging_fotos (propiedad_referencia TEXT, url_foto TEXT, orden INTEGER);
+        """)
+
+    def escribir(self, propiedad_data, propiedad_min_data, fotos):
+        if not self.staging_creado:
+            self._crear_staging()
+            self.staging_creado = True
+
+        ref = propiedad_data['referencia']
+        self.propiedades[ref] = propiedad_data
+        self.propiedades_min[ref] = propiedad_min_data
+        if fotos is not None:
+            self.fotos[ref] = fotos
+
+        if len(self.propiedades) >= self.tamano_lote:
+            self.volcar()
+
+    def _cargar_staging(self, tabla, columnas, filas):
+        consulta = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            sql.Identifier(tabla), sql.SQL(', ').join(map(sql.Identifier, columnas))
+        )
+        execute_values(self.cursor, consulta, filas, page_size=self.tamano_lote)
+
+    def volcar(self):
+        """Envía el lote acumulado a la base de datos y vacía los buffers."""
+        if not self.propiedades:
+            return
+
+        start = time.perf_counter()
+        self._cargar_staging('staging_propiedades', COLUMNAS_PROPIEDADES,
+                             [tuple(d[c] for c in COLUMNAS_PROPIEDADES) for d in self.propiedades.values()])
+        self._cargar_staging('staging_propiedades_min', COLUMNAS_MIN,
+                             [tuple(d[c] for c in COLUMNAS_MIN) for d in self.propiedades_min.values()])
+        self.cursor.execute(self.sql_merge_propiedades)
+        self.cursor.execute(self.sql_merge_propiedades_min)
+        sincronizar_caracteristicas(self.cursor, self.propiedades.keys())
+
+        if self.fotos:
+            self.cursor.execute("DELETE FROM fotos WHERE propiedad_referencia = ANY(%s);", (list(self.fotos.keys()),))
+            filas_fotos = [(ref, url_foto, orden) for ref, urls in self.fotos.items() for orden, url_foto in enumerate(urls)]
+            if filas_fotos:
+                self._cargar_staging('staging_fotos', ['propiedad_referencia', 'url_foto', 'orden'], filas_fotos)
+                self.cursor.execute("""
+                    INSERT INTO fotos (propiedad_referencia, url_foto, orden)
+                    SELECT propiedad_referencia, url_foto, orden FROM staging_fotos ORDER BY propiedad_referencia, orden;
+                """)
+
+        self.cursor.execute("TRUNCATE staging_propiedades, staging_propiedades_min, staging_fotos;")
+        self.lotes_volcados += 1
+        metrics.observar("xml_db_batch_seconds", time.perf_counter() - start)
+        metrics.incrementar("xml_db_rows", len(self.propiedades), tabla='propiedades')
+        metrics.incrementar("xml_db_rows", sum(len(urls) for urls in self.fotos.values()), tabla='fotos')
+        print(f"Lote {self.lotes_volcados} volcado: {len(self.propiedades)} inmuebles.")
+        self.propiedades.clear()
+        self.propiedades_min.clear()
+        self.fotos.clear()
+
+    def cerrar(self):
+        self.volcar()
+
+
+def crear_escritor(cursor, modo=None):
+    """Devuelve el escritor correspondiente al modo de carga configurado ('lotes' o 'filas')."""
+    modo = (modo or XML_MODO_CARGA).lower()
+    if modo == 'filas':
+        return EscritorFilasPreparadas(cursor) if XML_SENTENCIAS_PREPARADAS else EscritorFilas(cursor)
+    if modo == 'lotes':
+        return CargadorLotes(cursor)
+    raise ValueError(f"Modo de carga no soportado: {modo}")
+
+
+def iterar_inmuebles_stream(chunks):
+    """
+    Parsea el XML de forma incremental a partir de trozos de bytes y emite cada
+    <Inmueble> en cuanto se cierra. Tras procesarlo, el elemento se libera del
+    árbol, así que la memoria se mantiene plana sea cual sea el tamaño del feed.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    raiz = None
+    profundidad = 0
+
+    def leer_eventos():
+        nonlocal raiz, profundidad
+        for evento, elem in parser.read_events():
+            if evento == 'start':
+                if raiz is None:
+                    raiz = elem
+                profundidad += 1
+                continue
+            profundidad -= 1
+            # Solo los <Inmueble> hijos directos de la raíz
+            if profundidad == 1 and elem.tag == 'Inmueble':
+                yield elem
+                elem.clear()
+                raiz.remove(elem)
+
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+            yield from leer_eventos()
+    parser.close()
+    yield from leer_eventos()
+
+
+def contar_descarga(chunks):
+    """Reenvía los trozos de la descarga registrando los bytes recibidos y el tiempo de espera de red."""
+    espera = 0.0
+    recibidos = 0
+    iterador = iter(chunks)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterador)
+            except StopIteration:
+                return
+            finally:
+                espera += time.perf_counter() - start
+            recibidos += len(chunk)
+            yield chunk
+    finally:
+        metrics.observar("xml_download_seconds", espera)
+        metrics.incrementar("xml_download_bytes", recibidos)
+
+
+def procesar_xml_e_insertar(cursor, xml_content, escritor=None, existentes=None):
+    """Parsea un XML completo en memoria e inserta sus inmuebles."""
     print("Parseando el XML...")
-    root = ET.fromstring(xml_content)
-    total_inmuebles = len(root.findall('Inmueble'))
-    print(f"Se encontraron {total_inmuebles} inmuebles para procesar.")
+    with metrics.temporizador("xml_parse_seconds"):
+        root = ET.fromstring(xml_content)
+    inmuebles = root.findall('Inmueble')
+    print(f"Se encontraron {len(inmuebles)} inmuebles para procesar.")
+    return procesar_inmuebles(cursor, inmuebles, total=len(inmuebles), escritor=escritor, existentes=existentes)
+
 
-    for i, inmueble in enumerate(root.findall('Inmueble')):
-        ref = obtener_texto_safe(inmueble.find('Referencia'))
+def procesar_inmuebles(cursor, inmuebles, total=None, escritor=None, existentes=None):
+    """
+    Inserta en la base de datos cada <Inmueble> de un iterable de elementos.
+
+    Si se pasa `existentes` ({referencia: hash_contenido}, ver cargar_hashes_existentes),
+    la sincronización es incremental: solo se escriben los inmuebles nuevos o con
+    contenido distinto y, al terminar, se borran los que ya no están en el feed.
+    Devuelve un resumen con los contadores de insertados, actualizados, sin cambios y eliminados.
+    """
+    escritor = escritor or crear_escritor(cursor)
+    resumen = {'insertados': 0, 'actualizados': 0, 'sin_cambios': 0, 'eliminados': 0}
+    vistas = set()
+    # Tiempos acumulados por fase; se registran una vez al final para no medir cada inmueble por separado
+    tiempos = {'lectura': 0.0, 'extraccion': 0.0, 'escritura': 0.0}
+    iterador = enumerate(inmuebles)
+    while True:
+        start = time.perf_counter()
+        siguiente = next(iterador, None)
+        fin_lectura = time.perf_counter()
+        tiempos['lectura'] += fin_lectura - start
+        if siguiente is None:
+            break
+        i, inmueble = siguiente
+        propiedad_data = extraer_inmueble(inmueble)
+        ref = propiedad_data['referencia']
         if not ref:
             print(f"Saltando inmueble sin referencia en la posición {i+1}")
             continue
 
-        print(f"Procesando inmueble {i+1}/{total_inmuebles} (Ref: {ref})...")
-
-        # --- Extracción de datos anidados a JSON ---
-        def extract_json_list(xpath, mapping_func):
-            elements = inmueble.findall(xpath)
-            if not elements: return None
-            data_list = [mapping_func(el) for el in elements]
-            return json.dumps(data_list) if data_list else None
-
-        operaciones_json = extract_json_list('Operaciones/Operacion', lambda op: {'tipo': obtener_texto_safe(op.find('Tipo')), 'precio': obtener_numeric_safe(op.find('Precio'))})
-        superficies_json = extract_json_list('Superficies/Superficie', lambda s: {'nombre': obtener_texto_safe(s.find('Nombre')), 'superficie': obtener_numeric_safe(s.find('Superficie')), 'altura': obtener_numeric_safe(s.find('Altura')), 'observaciones': obtener_texto_safe(s.find('Observaciones'))})
-        grupos_json = extract_json_list('Grupos/Grupo', obtener_texto_safe)
-        fotos360_json = extract_json_list('Fotos360/Foto360', obtener_texto_safe) # Asumo estructura similar a Fotos
-        videos_json = extract_json_list('Videos/Video', obtener_texto_safe)
-        archivos_json = extract_json_list('Archivos/Archivo', obtener_texto_safe)
-
-        # --- Diccionario de datos completo y definitivo ---
-        propiedad_data = {
-            'id': obtener_int_safe(inmueble.find('Id')), 'referencia': ref, 'agencia_id': obtener_texto_safe(inmueble.find('AgenciaId')), 'url': obtener_texto_safe(inmueble.find('UrlPublica')),
-            'fecha_creacion': obtener_timestamp_safe(inmueble.find('FechaCreacion')), 'fecha_publicacion': obtener_timestamp_safe(inmueble.find('Fecha')), 'fecha_modificacion': obtener_timestamp_safe(inmueble.find('FechaModificacion')),
-            'grupo_inmueble': obtener_texto_safe(inmueble.find('GrupoInmueble')), 'familia': obtener_texto_safe(inmueble.find('Familia')), 'tipo': obtener_texto_safe(inmueble.find('Tipo')), 'subtipo': obtener_texto_safe(inmueble.find('Subtipo')),
-            'destacado': obtener_bool_safe(inmueble.find('Destacado')), 'estado': obtener_texto_safe(inmueble.find('Estado')), 'uso_inmueble': obtener_texto_safe(inmueble.find('UsoInmueble')), 'ultima_actividad': obtener_texto_safe(inmueble.find('UltimaActividad')),
-            'titulo': obtener_texto_safe(inmueble.find('Titulo')), 'descripcion': obtener_texto_safe(inmueble.find('Descripcion')), 'descripcion_ampliada': obtener_texto_safe(inmueble.find('DescripcionAmpliada')),
-            'operaciones': operaciones_json, 'ibi': obtener_numeric_safe(inmueble.find('Ibi')), 'gastos_comunidad': obtener_numeric_safe(inmueble.find('GastosComunidad')),
-            'provincia': obtener_texto_safe(inmueble.find('Provincia')), 'poblacion': obtener_texto_safe(inmueble.find('Poblacion')), 'zona': obtener_texto_safe(inmueble.find('Zona')), 'subzona': obtener_texto_safe(inmueble.find('Subzona')), 'urbanizacion': obtener_texto_safe(inmueble.find('Urbanizacion')),
-            'direccion': obtener_texto_safe(inmueble.find('Direccion')), 'numero': obtener_texto_safe(inmueble.find('Numero')), 'escalera': obtener_texto_safe(inmueble.find('Escalera')), 'planta': obtener_texto_safe(inmueble.find('Planta')), 'letra': obtener_texto_safe(inmueble.find('Letra')), 'codigo_postal': obtener_texto_safe(inmueble.find('CodigoPostal')), 'parcela': obtener_texto_safe(inmueble.find('Parcela')),
-            'latitud': obtener_numeric_safe(inmueble.find('Latitud')), 'longitud': obtener_numeric_safe(inmueble.find('Longitud')), 'zoom': obtener_int_safe(inmueble.find('Zoom')),
-            'tipo_localizacion': obtener_int_safe(inmueble.find('TipoLocalizacion')), 'latitud_zona': obtener_numeric_safe(inmueble.find('LatitudZona')), 'longitud_zona': obtener_numeric_safe(inmueble.find('LongitudZona')), 'radio_zona': obtener_numeric_safe(inmueble.find('RadioZona')),
-            'metros_construidos': obtener_numeric_safe(inmueble.find('MetrosConstruidos')), 'metros_utiles': obtener_numeric_safe(inmueble.find('MetrosUtiles')), 'metros_parcela': obtener_numeric_safe(inmueble.find('MetrosParcela')), 'metros_edificables': obtener_numeric_safe(inmueble.find('MetrosEdificables')),
-            'metros_oficinas': obtener_numeric_safe(inmueble.find('MetrosOficinas')), 'metros_jardin': obtener_numeric_safe(inmueble.find('MetrosJardin')), 'metros_terrazas': obtener_numeric_safe(inmueble.find('MetrosTerrazas')), 'metros_fachada': obtener_numeric_safe(inmueble.find('MetrosFachada')), 'metros_fachada_secundaria': obtener_numeric_safe(inmueble.find('MetrosFachadaSecundaria')),
-            'altura_techo': obtener_numeric_safe(inmueble.find('AlturaTecho')), 'ano_construccion': obtener_int_safe(inmueble.find('AnoConstruccion')), 'superficies': superficies_json,
-            'habitaciones': obtener_int_safe(inmueble.find('Habitaciones')), 'banos': obtener_int_safe(inmueble.find('Banos')), 'aseos': obtener_int_safe(inmueble.find('Aseos')), 'despachos': obtener_int_safe(inmueble.find('Despachos')), 'salas_reunion': obtener_int_safe(inmueble.find('SalasReunion')),
-            'sala_descanso': obtener_int_safe(inmueble.find('SalaDescanso')), 'cocina': obtener_int_safe(inmueble.find('Cocina')), 'comedor': obtener_int_safe(inmueble.find('Comedor')),
-            'plazas_garaje': obtener_int_safe(inmueble.find('PlazasGaraje')), 'plazas_parking': obtener_int_safe(inmueble.find('PlazasParking')), 'armarios': obtener_int_safe(inmueble.find('Armarios')), 'num_terrazas': obtener_int_safe(inmueble.find('NumTerrazas')), 'entradas_nave_tir': obtener_int_safe(inmueble.find('EntradasNaveTir')),
-            'plantas_del_edificio': obtener_int_safe(inmueble.find('PlantasDelEdificio')), 'chimeneas': obtener_int_safe(inmueble.find('Chimeneas')), 'trasteros': obtener_int_safe(inmueble.find('Trasteros')),
-            'calificacion_suelo': obtener_texto_safe(inmueble.find('CalificacionSuelo')), 'tipo_configuracion': obtener_texto_safe(inmueble.find('TipoConfiguracion')), 'orientacion': obtener_texto_safe(inmueble.find('Orientacion')), 'calificacion_energetica': obtener_texto_safe(inmueble.find('CalificacionEnergetica')),
-            'consumo': obtener_texto_safe(inmueble.find('Consumo')), 'calificacion_emisiones': obtener_texto_safe(inmueble.find('CalificacionEmisiones')), 'emisiones': obtener_texto_safe(inmueble.find('Emisiones')), 'carpinteria': obtener_texto_safe(inmueble.find('Carpinteria')),
-            'suelo': obtener_texto_safe(inmueble.find('Suelo')), 'luminoso': obtener_texto_safe(inmueble.find('Luminoso')), 'ruido': obtener_texto_safe(inmueble.find('Ruido')), 'vistas': obtener_texto_safe(inmueble.find('Vistas')),
-            'en_esquina': obtener_bool_safe(inmueble.find('EnEsquina')), 'interior': obtener_bool_safe(inmueble.find('Interior')), 'exterior': obtener_bool_safe(inmueble.find('Exterior')), 'salida_emergencia': obtener_bool_safe(inmueble.find('SalidaEmergencia')),
-            'salida_humos': obtener_bool_safe(inmueble.find('SalidaHumos')), 'divisiones': obtener_bool_safe(inmueble.find('Divisiones')), 'vestuarios': obtener_bool_safe(inmueble.find('Vestuarios')), 'escaparate': obtener_bool_safe(inmueble.find('Escaparate')), 'tiene_oficinas': obtener_bool_safe(inmueble.find('TieneOficinas')),
-            'altillo': obtener_bool_safe(inmueble.find('Altillo')), 'patio': obtener_bool_safe(inmueble.find('Patio')), 'muelle_carga': obtener_bool_safe(inmueble.find('MuelleCarga')), 'cubierta': obtener_bool_safe(inmueble.find('Cubierta')), 'vado': obtener_bool_safe(inmueble.find('Vado')), 'buhardilla': obtener_bool_safe(inmueble.find('Buhardilla')),
-            'amueblado': obtener_bool_safe(inmueble.find('Amueblado')), 'cocina_amueblada': obtener_bool_safe(inmueble.find('CocinaAmueblada')), 'asfaltado': obtener_bool_safe(inmueble.find('Asfaltado')), 'alumbrado': obtener_bool_safe(inmueble.find('Alumbrado')), 'vallado': obtener_bool_safe(inmueble.find('Vallado')), 'urbanizado': obtener_bool_safe(inmueble.find('Urbanizado')),
-            'acometidas': obtener_bool_safe(inmueble.find('Acometidas')), 'aire_acondicionado': obtener_bool_safe(inmueble.find('AireAcondicionado')), 'luz': obtener_bool_safe(inmueble.find('Luz')), 'gas': obtener_bool_safe(inmueble.find('Gas')), 'agua': obtener_bool_safe(inmueble.find('Agua')), 'telefono': obtener_bool_safe(inmueble.find('Telefono')),
-            'internet': obtener_bool_safe(inmueble.find('Internet')), 'intranet': obtener_bool_safe(inmueble.find('Intranet')), 'tratamiento_ignifugo': obtener_bool_safe(inmueble.find('TratamientoIgnifugo')), 'sistema_antiincendios': obtener_bool_safe(inmueble.find('SistemaAntiincendios')),
-            'camara_frigorifica': obtener_bool_safe(inmueble.find('CamaraFrigorifica')), 'pozo': obtener_bool_safe(inmueble.find('Pozo')), 'piscina_privada': obtener_bool_safe(inmueble.find('PiscinaPrivada')), 'piscina_comunitaria': obtener_bool_safe(inmueble.find('PiscinaComunitaria')),
-            'zonas_comunes': obtener_bool_safe(inmueble.find('ZonasComunes')), 'zona_infantil': obtener_bool_safe(inmueble.find('ZonaInfantil')), 'zonas_verdes': obtener_bool_safe(inmueble.find('ZonasVerdes')), 'pista_multiusos': obtener_bool_safe(inmueble.find('PistaMultiusos')), 'gimnasio': obtener_bool_safe(inmueble.find('Gimnasio')),
-            'pista_padel': obtener_bool_safe(inmueble.find('PistaPadel')), 'pista_tenis': obtener_bool_safe(inmueble.find('PistaTenis')), 'bodega': obtener_bool_safe(inmueble.find('Bodega')), 'barbacoa': obtener_bool_safe(inmueble.find('Barbacoa')), 'solarium': obtener_bool_safe(inmueble.find('Solarium')), 'lavadero': obtener_bool_safe(inmueble.find('Lavadero')),
-            'alarma': obtener_bool_safe(inmueble.find('Alarma')), 'alarma_perimetral': obtener_bool_safe(inmueble.find('AlarmaPerimetral')), 'cerrado': obtener_bool_safe(inmueble.find('Cerrado')), 'puerta_blindad': obtener_bool_safe(inmueble.find('PuertaBlindad')), 'caja_fuerte': obtener_bool_safe(inmueble.find('CajaFuerte')), 'conserje': obtener_bool_safe(inmueble.find('Conserje')),
-            'vigilancia_24h': obtener_bool_safe(inmueble.find('Vigilancia24h')), 'rejas': obtener_bool_safe(inmueble.find('Rejas')), 'adaptado': obtener_bool_safe(inmueble.find('Adaptado')), 'acceso_discapacitados': obtener_bool_safe(inmueble.find('AccesoDiscapacitados')), 'admite_mascotas': obtener_bool_safe(inmueble.find('AdmiteMascotas')),
-            'ascensor': obtener_bool_safe(inmueble.find('Ascensor')), 'montacargas': obtener_bool_safe(inmueble.find('Montacargas')), 'puente_grua': obtener_bool_safe(inmueble.find('PuenteGrua')), 'bascula': obtener_bool_safe(inmueble.find('Bascula')), 'primera_linea_playa': obtener_bool_safe(inmueble.find('PrimeraLineaPlaya')), 'segunda_linea_playa': obtener_bool_safe(inmueble.find('SegundaLineaPlaya')),
-            'grupos': grupos_json, 'fotos360': fotos360_json, 'videos': videos_json, 'archivos': archivos_json,
-            'cuentas': obtener_texto_safe(inmueble.find('Cuentas')), 'mandatos': obtener_texto_safe(inmueble.find('Mandatos'))
-        }
-        
-        columnas = sql.SQL(', ').join(map(sql.Identifier, propiedad_data.keys()))
-        placeholders = sql.SQL(', ').join(map(sql.Placeholder, propiedad_data.keys()))
-        updates = sql.SQL(', ').join([sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(k), sql.Identifier(k)) for k in propiedad_data.keys() if k != 'referencia'])
-        insert_propiedad = sql.SQL("INSERT INTO propiedades ({}) VALUES ({}) ON CONFLICT (referencia) DO UPDATE SET {}").format(columnas, placeholders, updates)
-        cursor.execute(insert_propiedad, propiedad_data)
-
-               # --- INICIO: LÓGICA PARA LA TABLA propiedades_min ---
-        # 1. Crear un diccionario solo con los datos para la tabla minimalista.
-        #    Reutilizamos los datos ya procesados del diccionario principal.
-        propiedad_min_data = {
-            'referencia':           propiedad_data['referencia'],
-            'url':                  propiedad_data['url'],
-            'titulo':               propiedad_data['titulo'],
-            'descripcion':          propiedad_data['descripcion'],
-            'descripcion_ampliada': propiedad_data['descripcion_ampliada'],
-            'estado':               propiedad_data['estado'],
-            'operaciones':          propiedad_data['operaciones'],
-            'altura_techo':         propiedad_data['altura_techo'],
-            'metros_parcela':       propiedad_data['metros_parcela'],
-            'metros_utiles':        propiedad_data['metros_utiles'],
-            'metros_edificables':   propiedad_data['metros_edificables'],
-            'metros_construidos':   propiedad_data['metros_construidos'],
-            'metros_oficinas':      propiedad_data['metros_oficinas'],
-            'grupo_inmueble':       propiedad_data['grupo_inmueble'],
-            'latitud':              propiedad_data['latitud'],
-            'longitud':             propiedad_data['longitud'],
-            'poblacion':            propiedad_data['poblacion'],
-            'ano_construccion':     propiedad_data['ano_construccion']
-        }
-
-        # 2. Generar y ejecutar la sentencia SQL para 'propiedades_min'
-        columnas_min = sql.SQL(', ').join(map(sql.Identifier, propiedad_min_data.keys()))
-        placeholders_min = sql.SQL(', ').join(map(sql.Placeholder, propiedad_min_data.keys()))
-        updates_min = sql.SQL(', ').join([sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(k), sql.Identifier(k)) for k in propiedad_min_data.keys() if k != 'referencia'])
-        insert_propiedad_min = sql.SQL("INSERT INTO propiedades_min ({}) VALUES ({}) ON CONFLICT (referencia) DO UPDATE SET {}").format(columnas_min, placeholders_min, updates_min)
-        cursor.execute(insert_propiedad_min, propiedad_min_data)
-        # --- FIN: LÓGICA PARA LA TABLA propiedades_min ---
-
-        # Insertar en 'fotos'
+        progreso = f"{i+1}/{total}" if total is not None else f"{i+1}"
+        print(f"Procesando inmueble {progreso} (Ref: {ref})...")
+        vistas.add(ref)
+
+        propiedad_min_data = {columna: propiedad_data[columna] for columna in COLUMNAS_MIN}
+
+        fotos = None
         fotos_element = inmueble.find('Fotos')
         if fotos_element is not None:
-            cursor.execute("DELETE FROM fotos WHERE propiedad_referencia = %s;", (ref,))
-            orden = 0
-            for foto in fotos_element.findall('Foto'):
-                url_foto = obtener_texto_safe(foto)
-                if url_foto:
-                    cursor.execute("INSERT INTO fotos (propiedad_referencia, url_foto, orden) VALUES (%s, %s, %s);", (ref, url_foto, orden))
-                    orden += 1
+            fotos = [url_foto for url_foto in (obtener_texto_safe(foto) for foto in fotos_element.findall('Foto')) if url_foto]
 
+        hash_contenido = calcular_hash_contenido(propiedad_data, fotos)
+        hash_anterior = existentes.get(ref) if existentes is not None else None
+        inicio_escritura = time.perf_counter()
+        tiempos['extraccion'] += inicio_escritura - fin_lectura
+        if hash_anterior == hash_contenido:
+            resumen['sin_cambios'] += 1
+            continue
+        resumen['actualizados' if existentes is not None and ref in existentes else 'insertados'] += 1
+        propiedad_data['hash_contenido'] = hash_contenido
+
+        escritor.escribir(propiedad_data, propiedad_min_data, fotos)
+        tiempos['escritura'] += time.perf_counter() - inicio_escritura
+
+    start = time.perf_counter()
+    escritor.cerrar()
+    tiempos['escritura'] += time.perf_counter() - start
+    # Lectura: esperar al siguiente <Inmueble> (en streaming incluye la descarga y el parseo incremental)
+    metrics.observar("xml_read_seconds", tiempos['lectura'])
+    metrics.observar("xml_extract_seconds", tiempos['extraccion'])
+    metrics.observar("xml_db_write_seconds", tiempos['escritura'])
+
+    if existentes is not None:
+        if vistas:
+            resumen['eliminados'] = eliminar_ausentes(cursor, set(existentes) - vistas)
+        else:
+            print("⚠️ El feed no contiene inmuebles; no se elimina ninguno de la base de datos.")
+    for resultado, cantidad in resumen.items():
+        metrics.incrementar("xml_properties", cantidad, resultado=resultado)
+    return resumen
+
+
+def imprimir_resumen(resumen):
+    print(
+        f"Resumen: {resumen['insertados']} insertados, {resumen['actualizados']} actualizados, "
+        f"{resumen['sin_cambios']} sin cambios, {resumen['eliminados']} eliminados."
+    )
+
+def preparar_esquema(cursor):
+    """
+    Prepara el esquema según XML_MODO_SYNC. En modo incremental devuelve los hashes
+    de los inmuebles ya guardados; en modo completo recrea las tablas y devuelve None.
+    """
+    if XML_MODO_SYNC == 'completo':
+        crear_esquema_db(cursor, recrear=True)
+        return None
+    if XML_MODO_SYNC != 'incremental':
+        raise ValueError(f"Modo de sincronización no soportado: {XML_MODO_SYNC}")
+    crear_esquema_db(cursor, recrear=False)
+    existentes = cargar_hashes_existentes(cursor)
+    print(f"Sincronización incremental: {len(existentes)} inmuebles ya existentes en la base de datos.")
+    return existentes
+
+
+@metrics.etapa("xml_to_db")
 def main():
     """Función principal del script."""
     conn = None
     try:
-        print(f"Descargando XML desde {XML_URL}...")
-        response = requests.get(XML_URL)
-        response.raise_for_status()
-        xml_content = response.content
-        print("XML descargado exitosamente.")
+        if XML_STREAMING:
+            # En modo streaming la descarga y el parseo ocurren mientras se escribe en la base de datos,
+            # así que la conexión se abre antes.
+            print("Conectando a la base de datos PostgreSQL...")
+            conn = psycopg2.connect(DB_URL)
+            cursor = conn.cursor()
+            print("Conexión exitosa.")
 
-        print("Conectando a la base de datos PostgreSQL...")
-        conn = psycopg2.connect(DB_URL)
-        cursor = conn.cursor()
-        print("Conexión exitosa.")
+            print(f"Descargando y procesando XML en streaming desde {XML_URL}...")
+            with requests.get(XML_URL, stream=True, timeout=(30, 300)) as response:
+                response.raise_for_status()
+                existentes = preparar_esquema(cursor)
+                chunks = contar_descarga(response.iter_content(chunk_size=XML_CHUNK_SIZE))
+                resumen = procesar_inmuebles(cursor, iterar_inmuebles_stream(chunks), existentes=existentes)
+        else:
+            print(f"Descargando XML desde {XML_URL}...")
+            with metrics.temporizador("xml_download_seconds"):
+                response = requests.get(XML_URL)
+                response.raise_for_status()
+                xml_content = response.content
+            metrics.incrementar("xml_download_bytes", len(xml_content))
+            print("XML descargado exitosamente.")
 
-        crear_esquema_db(cursor)
-        procesar_xml_e_insertar(cursor, xml_content)
+            print("Conectando a la base de datos PostgreSQL...")
+            conn = psycopg2.connect(DB_URL)
+            cursor = conn.cursor()
+            print("Conexión exitosa.")
+
+            existentes = preparar_esquema(cursor)
+            resumen = procesar_xml_e_insertar(cursor, xml_content, existentes=existentes)
 
         conn.commit()
+        imprimir_resumen(resumen)
         print("\n¡Proceso completado! Todos los datos han sido importados y guardados en la base de datos.")
 
     except requests.exceptions.RequestException as e:
+        metrics.incrementar("xml_errors", tipo='descarga')
         print(f"Error al descargar el XML: {e}")
+        if conn:
+            conn.rollback()
+    except ET.ParseError as e:
+        metrics.incrementar("xml_errors", tipo='parseo')
+        print(f"Error al parsear el XML: {e}")
+        if conn:
+            conn.rollback()
     except psycopg2.Error as e:
+        metrics.incrementar("xml_errors", tipo='base_de_datos')
         print(f"Error de base de datos: {e}")
         if conn:
             conn.rollback()
     except Exception as e:
+        metrics.incrementar("xml_errors", tipo='inesperado')
         print(f"Ocurrió un error inesperado: {e}")
         if conn:
             conn.rollback()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los scripts se importan entre sí por nombre, como cuando se ejecutan desde /app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
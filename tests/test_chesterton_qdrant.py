@@ -0,0 +1,65 @@
+import threading
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    VectorParams, Distance, PointStruct, CollectionConfig, CollectionParams, HnswConfig, OptimizersConfig, WalConfig,
+)
+
+import chesterton_qdrant
+
+
+def test_upsert_paralelo_en_modo_local_no_pierde_puntos():
+    client = QdrantClient(":memory:")
+    client.create_collection("prueba", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    puntos = [PointStruct(id=i, vector=[1.0, i % 7, i % 5, 1.0], payload={"n": i}) for i in range(2000)]
+
+    # Registra cuántos upserts llegan a la vez al cliente local
+    upsert = client.upsert
+    activos = [0]
+    maximo = [0]
+    lock = threading.Lock()
+
+    def upsert_contando(*args, **kwargs):
+        with lock:
+            activos[0] += 1
+            maximo[0] = max(maximo[0], activos[0])
+        try:
+            return upsert(*args, **kwargs)
+        finally:
+            with lock:
+                activos[0] -= 1
+
+    client.upsert = upsert_contando
+    subidos = chesterton_qdrant.upsert_points_batched(client, "prueba", puntos, batch_size=10, parallel=8)
+
+    assert subidos == len(puntos)
+    assert client.count("prueba").count == len(puntos)
+    assert maximo[0] == 1
+
+
+def configuracion(on_disk=None, m=16, cuantizacion=None):
+    return CollectionConfig(
+        params=CollectionParams(vectors=VectorParams(size=4, distance=Distance.COSINE, on_disk=on_disk)),
+        hnsw_config=HnswConfig(m=m, ef_construct=100, full_scan_threshold=10000),
+        optimizer_config=OptimizersConfig(
+            deleted_threshold=0.2, vacuum_min_vector_number=1000, default_segment_number=0,
+            indexing_threshold=20000, flush_interval_sec=5, max_optimization_threads=1,
+        ),
+        wal_config=WalConfig(wal_capacity_mb=32, wal_segments_ahead=0),
+        quantization_config=cuantizacion,
+    )
+
+
+def test_opciones_de_coleccion_solo_cambia_lo_que_difiere(monkeypatch):
+    monkeypatch.setattr(chesterton_qdrant, "QDRANT_ON_DISK", "true")
+    monkeypatch.setattr(chesterton_qdrant, "QDRANT_HNSW_M", "32")
+    monkeypatch.setattr(chesterton_qdrant, "QDRANT_QUANTIZATION", "scalar")
+    escalar = chesterton_qdrant.quantization_config()
+
+    assert chesterton_qdrant.collection_option_changes(configuracion(on_disk=True, m=32, cuantizacion=escalar)) == {}
+    cambios = chesterton_qdrant.collection_option_changes(configuracion(on_disk=False, m=16))
+    assert set(cambios) == {"vectors_config", "hnsw_config", "quantization_config"}
+
+    monkeypatch.setattr(chesterton_qdrant, "QDRANT_QUANTIZATION", "none")
+    assert chesterton_qdrant.collection_option_changes(configuracion(on_disk=True, m=32)) == {}
+    assert set(chesterton_qdrant.collection_option_changes(configuracion(on_disk=True, m=32, cuantizacion=escalar))) == {"quantization_config"}